@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Directorio de estado compartido entre procesos del mismo host
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+
+try:
+    CACHE_DOCUMENTOS_TTL = int(os.getenv('CACHE_DOCUMENTOS_TTL', str(6 * 3600)))
+except ValueError:
+    CACHE_DOCUMENTOS_TTL = 6 * 3600
+
+try:
+    CACHE_LLM_TTL = int(os.getenv('CACHE_LLM_TTL', str(24 * 3600)))
+except ValueError:
+    CACHE_LLM_TTL = 24 * 3600
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    espacio TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    expira REAL,
+    PRIMARY KEY (espacio, clave)
+);
+CREATE TABLE IF NOT EXISTS candados (
+    nombre TEXT PRIMARY KEY,
+    dueno TEXT NOT NULL,
+    expira REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turnos_host (
+    host TEXT PRIMARY KEY,
+    proximo REAL NOT NULL
+);
+"""
+
+
+class AlmacenCompartido:
+    """
+    Caché clave/valor (JSON) con TTL, candados con expiración y turnos por host,
+    sobre SQLite en modo WAL: lo comparten todos los hilos y procesos del host.
+    Cada hilo (y cada proceso tras el fork) abre su propia conexión.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or os.path.join(CACHE_DIR, 'estado.db')
+        self._local = threading.local()
+
+    def _conexion(self):
+        con = getattr(self._local, 'con', None)
+        if con is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.executescript(_ESQUEMA)
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    # --- Caché ---
+
+    def obtener(self, espacio, clave, defecto=None):
+        fila = self._conexion().execute(
+            "SELECT valor, expira FROM cache WHERE espacio = ? AND clave = ?", (espacio, clave)
+        ).fetchone()
+        if fila is None or (fila[1] is not None and fila[1] < time.time()):
+            return defecto
+        return json.loads(fila[0])
+
+    def guardar(self, espacio, clave, valor, ttl=None):
+        expira = time.time() + ttl if ttl else None
+        self._conexion().execute(
+            "INSERT OR REPLACE INTO cache (espacio, clave, valor, expira) VALUES (?, ?, ?, ?)",
+            (espacio, clave, json.dumps(valor, ensure_ascii=False, default=str), expira)
+        )
+
+    def eliminar(self, espacio, clave):
+        self._conexion().execute("DELETE FROM cache WHERE espacio = ? AND clave = ?", (espacio, clave))
+
+    def vaciar(self, espacio):
+        """Elimina todas las entradas de un espacio (p. ej. respuestas del LLM al evaluar sin caché)"""
+        self._conexion().execute("DELETE FROM cache WHERE espacio = ?", (espacio,))
+
+    def entradas(self, espacio):
+        """[(clave, valor)] vigentes de un espacio (p. ej. la ocupación que publica cada proceso)"""
+        filas = self._conexion().execute(
+            "SELECT clave, valor FROM cache WHERE espacio = ? AND (expira IS NULL OR expira >= ?)", (espacio, time.time())
+        ).fetchall()
+        return [(clave, json.loads(valor)) for clave, valor in filas]
+
+    def limpiar_expirados(self):
+        ahora = time.time()
+        con = self._conexion()
+        con.execute("DELETE FROM cache WHERE expira IS NOT NULL AND expira < ?", (ahora,))
+        con.execute("DELETE FROM candados WHERE expira < ?", (ahora,))
+
+    # --- Candados entre procesos ---
+
+    def _dueno(self):
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    def adquirir_candado(self, nombre, ttl=300):
+        """Intenta tomar el candado (no bloqueante). Expira solo si el dueño muere"""
+        ahora = time.time()
+        con = self._conexion()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            fila = con.execute("SELECT dueno, expira FROM candados WHERE nombre = ?", (nombre,)).fetchone()
+            if fila is not None and fila[1] > ahora and fila[0] != self._dueno():
+                con.execute("COMMIT")
+                return False
+            con.execute(
+                "INSERT OR REPLACE INTO candados (nombre, dueno, expira) VALUES (?, ?, ?)",
+                (nombre, self._dueno(), ahora + ttl)
+            )
+            con.execute("COMMIT")
+            return True
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    def liberar_candado(self, nombre):
+        self._conexion().execute(
+            "DELETE FROM candados WHERE nombre = ? AND dueno = ?", (nombre, self._dueno())
+        )
+
+    def calcular_una_vez(self, nombre, leer, calcular, espera_max=300, deadline=None):
+        """
+        Single-flight entre procesos: `leer()` consulta el resultado ya disponible;
+        si no está, quien toma el candado `nombre` ejecuta `calcular()` (que debe
+        dejarlo disponible para `leer`) y el resto espera a que aparezca.
+        """
+        valor = leer()
+        if valor is not None:
+            return valor
+
+        limite = time.monotonic() + espera_max
+        while not self.adquirir_candado(nombre, ttl=espera_max):
+            if time.monotonic() > limite:
+                break
+            if deadline is not None:
+                deadline.verificar("espera de caché compartida")
+            time.sleep(0.5)
+            valor = leer()
+            if valor is not None:
+                return valor
+
+        try:
+            valor = leer()
+            if valor is None:
+                valor = calcular()
+            return valor
+        finally:
+            self.liberar_candado(nombre)
+
+    def memoizar(self, espacio, clave, ttl, calcular, espera_max=300, deadline=None):
+        """
+        Devuelve el valor en caché o lo calcula UNA sola vez entre todos los procesos.
+        Los valores None no se guardan (se reintenta la próxima vez).
+        """
+        def _calcular_y_guardar():
+            valor = calcular()
+            if valor is not None:
+                self.guardar(espacio, clave, valor, ttl=ttl)
+            return valor
+
+        return self.calcular_una_vez(
+            f"{espacio}:{clave}", lambda: self.obtener(espacio, clave), _calcular_y_guardar,
+            espera_max=espera_max, deadline=deadline
+        )
+
+    # --- Limitador de tasa por host ---
+
+    def reservar_turno(self, host, intervalo):
+        """
+        Reserva el siguiente turno para `host` respetando `intervalo` segundos
+        entre solicitudes de TODOS los procesos. Devuelve cuánto hay que esperar.
+        """
+        ahora = time.time()
+        con = self._conexion()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            fila = con.execute("SELECT proximo FROM turnos_host WHERE host = ?", (host,)).fetchone()
+            turno = max(ahora, fila[0]) if fila else ahora
+            con.execute(
+                "INSERT OR REPLACE INTO turnos_host (host, proximo) VALUES (?, ?)", (host, turno + intervalo)
+            )
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return turno - ahora
+
+
+almacen = AlmacenCompartido()
@@ -1,15 +1,17 @@
-import ollama
 import json
+import llm
 import re
 from datetime import datetime
 
+MODOS_NARRATIVA = ('none', 'template', 'llm')
+
 class AIAnalyzer:
     def __init__(self):
-        self.model = "llama3.1:8b"
+        self.model = llm.MODELO_PRINCIPAL
 
-    def verificar_ollama(self):
+    def verificar_ollama(self, deadline=None):
         try:
-            ollama.chat(model=self.model, messages=[{'role': 'user', 'content': 'ping'}])
+            llm.chat(model=self.model, messages=[{'role': 'user', 'content': 'ping'}], deadline=deadline, timeout=30)
             return True
         except:
             return False
@@ -246,8 +248,63 @@ class AIAnalyzer:
                     bloques.append(d["contexto"])
         return "\n".join(bloques)
 
-    def analizar_indicador(self, eje, indicador, meta, valor_inicial, valor_actual, datos_scraping, contexto):
-        """Análisis completo del indicador"""
+    def generar_analisis_plantilla(self, info_indicador, val_ini, val_act, progreso):
+        """Narrativa determinística de 4 oraciones (sin IA)"""
+        if info_indicador['direccion'] == "reducir":
+            if val_act < val_ini:
+                return f"El indicador muestra una reducción de {val_ini} a {val_act}{info_indicador['unidad']}, avanzando hacia la meta. Con un progreso del {progreso}%, se requiere mantener políticas activas. El riesgo es perder momentum. Se recomienda monitoreo trimestral y ajustes según necesidad."
+            return f"El indicador aumentó de {val_ini} a {val_act}{info_indicador['unidad']}, contradiciendo el objetivo de reducción. El progreso del {progreso}% refleja retroceso. Riesgo crítico de no alcanzar meta. Se requiere revisión urgente de estrategias."
+        if val_act > val_ini:
+            return f"El indicador creció de {val_ini} a {val_act}{info_indicador['unidad']}, mostrando avance positivo. El progreso del {progreso}% indica necesidad de acelerar. Riesgo de no sostener crecimiento. Se recomienda continuar políticas actuales con optimizaciones."
+        return f"El indicador disminuyó de {val_ini} a {val_act}{info_indicador['unidad']}, contradiciendo el objetivo de incremento. Progreso del {progreso}% indica retroceso. Riesgo grave de alejarse de meta. Requiere redefinición inmediata de estrategias."
+
+    def generar_analisis_ia(self, indicador, info_indicador, val_ini, val_act, meta_num, progreso, texto_fuentes, deadline=None):
+        """Narrativa de 4 oraciones con Ollama. None si Ollama no respondió (el llamador decide el respaldo)"""
+        verbo = "reducir" if info_indicador['direccion'] == "reducir" else "incrementar"
+        
+        prompt = f"""
+Analiza este indicador de política pública ecuatoriana:
+
+DATOS:
+- Indicador: {indicador}
+- Objetivo: {verbo.upper()} de {val_ini} a {meta_num} {info_indicador['unidad']}
+- Valor actual: {val_act} {info_indicador['unidad']}
+- Progreso: {progreso}%
+
+CONTEXTO DE FUENTES:
+{texto_fuentes[:3000]}
+
+Genera un análisis en EXACTAMENTE 4 oraciones:
+1. Compara valor actual vs inicial
+2. Evalúa si el progreso es suficiente
+3. Identifica el principal riesgo
+4. Da una recomendación específica
+
+Sin viñetas, solo texto corrido.
+"""
+        
+        try:
+            resp = llm.chat(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "Analista técnico de políticas públicas. Conciso y objetivo."},
+                    {"role": "user", "content": prompt}
+                ],
+                deadline=deadline
+            )
+        except Exception as e:
+            print(f"⚠️ Error Ollama: {e}")
+            return None
+        return resp.get("message", {}).get("content", "").strip() or None
+
+    def analizar_indicador(self, eje, indicador, meta, valor_inicial, valor_actual, datos_scraping, contexto, narrativa="llm", deadline=None):
+        """
+        Análisis completo del indicador
+        narrativa: 'llm' (Ollama), 'template' (plantilla determinística) o 'none' (solo cifras)
+        """
+        if narrativa not in MODOS_NARRATIVA:
+            raise ValueError(f"Modo de narrativa inválido: {narrativa}")
+        
         # 1. Analizar tipo
         info_indicador = self.analizar_tipo_indicador(indicador, meta)
         
@@ -305,59 +362,21 @@ class AIAnalyzer:
         print(f"Progreso: {progreso}% ({estado})")
         print(f"{'='*60}\n")
         
-        # 7. Análisis con IA
-        if val_act is None or val_ini is None or meta_num is None:
+        # 7. Narrativa (según modo solicitado)
+        if narrativa == "none":
+            analisis = None
+        elif val_act is None or val_ini is None or meta_num is None:
             analisis = "No se pudo realizar el análisis debido a falta de datos. Se requiere información actualizada del indicador."
+        elif narrativa == "template":
+            analisis = self.generar_analisis_plantilla(info_indicador, val_ini, val_act, progreso)
         else:
-            verbo = "reducir" if info_indicador['direccion'] == "reducir" else "incrementar"
-            
-            prompt = f"""
-Analiza este indicador de política pública ecuatoriana:
-
-DATOS:
-- Indicador: {indicador}
-- Objetivo: {verbo.upper()} de {val_ini} a {meta_num} {info_indicador['unidad']}
-- Valor actual: {val_act} {info_indicador['unidad']}
-- Progreso: {progreso}%
-
-CONTEXTO DE FUENTES:
-{texto_fuentes[:3000]}
-
-Genera un análisis en EXACTAMENTE 4 oraciones:
-1. Compara valor actual vs inicial
-2. Evalúa si el progreso es suficiente
-3. Identifica el principal riesgo
-4. Da una recomendación específica
-
-Sin viñetas, solo texto corrido.
-"""
-            
-            analisis = "No disponible."
-            try:
-                if self.verificar_ollama():
-                    resp = ollama.chat(
-                        model=self.model,
-                        messages=[
-                            {"role": "system", "content": "Analista técnico de políticas públicas. Conciso y objetivo."},
-                            {"role": "user", "content": prompt}
-                        ]
-                    )
-                    analisis = resp.get("message", {}).get("content", "").strip()
-            except Exception as e:
-                print(f"⚠️ Error Ollama: {e}")
-                # Análisis de respaldo
-                if info_indicador['direccion'] == "reducir":
-                    if val_act is not None and val_ini is not None:
-                        if val_act < val_ini:
-                            analisis = f"El indicador muestra una reducción de {val_ini} a {val_act}{info_indicador['unidad']}, avanzando hacia la meta. Con un progreso del {progreso}%, se requiere mantener políticas activas. El riesgo es perder momentum. Se recomienda monitoreo trimestral y ajustes según necesidad."
-                        else:
-                            analisis = f"El indicador aumentó de {val_ini} a {val_act}{info_indicador['unidad']}, contradiciendo el objetivo de reducción. El progreso del {progreso}% refleja retroceso. Riesgo crítico de no alcanzar meta. Se requiere revisión urgente de estrategias."
-                else:
-                    if val_act is not None and val_ini is not None:
-                        if val_act > val_ini:
-                            analisis = f"El indicador creció de {val_ini} a {val_act}{info_indicador['unidad']}, mostrando avance positivo. El progreso del {progreso}% indica necesidad de acelerar. Riesgo de no sostener crecimiento. Se recomienda continuar políticas actuales con optimizaciones."
-                        else:
-                            analisis = f"El indicador disminuyó de {val_ini} a {val_act}{info_indicador['unidad']}, contradiciendo el objetivo de incremento. Progreso del {progreso}% indica retroceso. Riesgo grave de alejarse de meta. Requiere redefinición inmediata de estrategias."
+            analisis = self.generar_analisis_ia(
+                indicador, info_indicador, val_ini, val_act, meta_num, progreso, texto_fuentes, deadline=deadline
+            )
+            if analisis is None:
+                # Sin respuesta del LLM: plantilla, y el resultado lo dice (narrativa='template')
+                narrativa = "template"
+                analisis = self.generar_analisis_plantilla(info_indicador, val_ini, val_act, progreso)
 
         return {
             "valor_inicial": val_ini if val_ini is not None else "No disponible",
@@ -370,5 +389,6 @@ Sin viñetas, solo texto corrido.
             "tipo_indicador": info_indicador['tipo'],
             "direccion": info_indicador['direccion'],
             "unidad": info_indicador['unidad'],
+            "narrativa": narrativa,
             "fuente": datos_scraping[0].get("fuente") if datos_scraping else "No disponible"
         }
\ No newline at end of file
@@ -1,119 +1,168 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context, has_request_context
 from flask_cors import CORS
-import pandas as pd
 import os
-from scraper import DataScraper
-from analyzer import AIAnalyzer
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import re
+import time
+import select
+import socket
+import uuid
+import queue
+import tempfile
+import threading
+import llm
+from scraper import estado_cascada
+from analyzer import AIAnalyzer, MODOS_NARRATIVA
+from deadline import Deadline
+from metricas import metricas
+from concurrencia import controlador_analisis, ANALYSIS_WORKERS_MAX
+from indice import indice
+from cola import cola
+from precarga import precargador, iniciar_precarga
+from planificador import PLANIFICADOR, ordenar_por_costo, resumen_plan
+from perfilado import PerfilSolicitud, modos_solicitados, cargar_resumen, listar_perfiles
+from exportacion import (
+    FORMATOS_EXPORTACION, TIPOS_MIME, FlujoCSV, abrir_escritor, exportar_resultados, fila_exportable
+)
+from respuestas import respuesta_json, respuesta_304, no_modificado, etag_de_archivo
+from pipeline import (
+    procesar_indicador_compartido, agrupar_indicadores, resultado_para_fila,
+    resultado_fallido, generar_narrativa_pendiente, NarrativaNoDisponible
+)
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['ETag', 'Content-Disposition'])
 
-scraper = DataScraper()
-analyzer = AIAnalyzer()
+# Hilos del pool = tope; cuántos analizan a la vez lo decide el control adaptativo
+# (MAX_ANALYSIS_WORKERS es ahora el límite inicial, ver concurrencia.py)
 
 try:
-    MAX_ANALYSIS_WORKERS = max(1, int(os.getenv('MAX_ANALYSIS_WORKERS', '2')))  # Reducido por análisis IA
+    ANALYSIS_DEADLINE_SECONDS = float(os.getenv('ANALYSIS_DEADLINE_SECONDS', '600'))  # Presupuesto por solicitud
 except ValueError:
-    MAX_ANALYSIS_WORKERS = 2
+    ANALYSIS_DEADLINE_SECONDS = 600.0
 
-def _obtener_valor_actual_inteligente(datos_scraping, indicador):
+# Tras agotar el deadline, tiempo para que los hilos devuelvan sus resultados parciales
+GRACIA_CANCELACION_SECONDS = 5
+
+# 'local': analiza en los hilos de este proceso
+# 'cola': solo encola y agrega; procesan los workers (worker.py) de una o varias máquinas
+ANALYSIS_MODE = os.getenv('ANALYSIS_MODE', 'local')
+ESPERA_COLA_SECONDS = 0.5
+
+def _cliente_desconectado():
     """
-    Selecciona el valor MÁS CONFIABLE extraído por Ollama o regex
-    Prioridad: 
-    1. Ollama con alta confianza (8-10) y año 2025
-    2. Ollama con confianza media (5-7) y año 2025
-    3. Ollama año 2024
-    4. Regex con alta relevancia
+    Detecta (best effort) si el cliente cerró la conexión mientras se procesa.
+    Solo disponible con el servidor de Werkzeug, que expone el socket en el environ.
     """
-    if not datos_scraping:
-        print("      ⚠️ No hay datos de scraping")
-        return None
-    
-    numeros_contexto = []
-    for resultado in datos_scraping:
-        numeros_contexto.extend(resultado.get('numeros_contexto', []))
-    
-    if not numeros_contexto:
-        print("      ⚠️ No hay números en contexto")
-        return None
-    
-    print(f"\n      🎯 SELECCIÓN INTELIGENTE DE VALOR:")
-    print(f"         Candidatos totales: {len(numeros_contexto)}")
-    
-    # Separar por método de extracción
-    valores_ia = [n for n in numeros_contexto if n.get('metodo') == 'ollama_inteligente']
-    valores_regex = [n for n in numeros_contexto if n.get('metodo') == 'regex_fallback']
-    
-    print(f"         - Extraídos por IA (Ollama): {len(valores_ia)}")
-    print(f"         - Extraídos por Regex: {len(valores_regex)}")
-    
-    # PRIORIDAD 1: Valores de IA con alta confianza
-    if valores_ia:
-        # Ordenar por: año (2025 primero), luego confianza
-        valores_ia_ordenados = sorted(
-            valores_ia,
-            key=lambda x: (
-                x.get('año', 0) == 2025,
-                x.get('confianza_ia', 0),
-                x.get('relevancia', 0)
-            ),
-            reverse=True
-        )
-        
-        mejor_ia = valores_ia_ordenados[0]
-        confianza = mejor_ia.get('confianza_ia', 0)
-        
-        print(f"\n         🤖 MEJOR VALOR DE IA:")
-        print(f"            Valor: {mejor_ia['valor']} {mejor_ia.get('unidad', '')}")
-        print(f"            Año: {mejor_ia.get('año', '?')}")
-        print(f"            Confianza: {confianza}/10")
-        print(f"            Contexto: {mejor_ia.get('contexto', '')[:100]}...")
-        
-        # Si confianza es alta (≥6), usar ese valor
-        if confianza >= 6:
-            print(f"         ✅ SELECCIONADO (Alta confianza IA)")
-            return mejor_ia['valor']
-    
-    # PRIORIDAD 2: Si IA tiene baja confianza, verificar regex
-    if valores_regex:
-        valores_regex_ordenados = sorted(
-            valores_regex,
-            key=lambda x: (
-                x.get('año', 0) == 2025,
-                x.get('relevancia', 0)
-            ),
-            reverse=True
-        )
+    if not has_request_context():
+        return False  # Hilos de fondo (exportación en streaming): la desconexión se detecta al escribir
+    sock = request.environ.get('werkzeug.socket')
+    if sock is None:
+        return False
+    try:
+        legible, _, _ = select.select([sock], [], [], 0)
+        if not legible:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b''
+    except (OSError, ValueError):
+        return True
+
+def _analizar_local(grupos, plan, indicators, narrativa, deadline, asignar, worker_limit, perfil=None):
+    """Ejecución paralela en este proceso, acotada por el deadline de la solicitud"""
+    total = len(indicators)
+    tarea = perfil.en_hilo(procesar_indicador_compartido) if perfil is not None else procesar_indicador_compartido
+    executor = ThreadPoolExecutor(max_workers=worker_limit)
+    try:
+        # Se envían en el orden del plan y cada uno pide turno con su costo estimado
+        futures = {
+            executor.submit(tarea, filas[0] + 1, total, indicators[filas[0]], narrativa, deadline, costo): huella
+            for huella, filas, costo in plan
+        }
+        pendientes = set(futures)
         
-        mejor_regex = valores_regex_ordenados[0]
-        print(f"\n         ⚙️ MEJOR VALOR DE REGEX:")
-        print(f"            Valor: {mejor_regex['valor']} ({mejor_regex.get('tipo', '?')})")
-        print(f"            Año: {mejor_regex.get('año', '?')}")
-        print(f"            Relevancia: {mejor_regex.get('relevancia', 0)}")
+        while pendientes and not deadline.expirado():
+            listos, pendientes = wait(pendientes, timeout=deadline.timeout(1.0), return_when=FIRST_COMPLETED)
+            for future in listos:
+                huella = futures[future]
+                try:
+                    _, result = future.result()
+                    asignar(huella, result)
+                except Exception as exc:
+                    print(f"\n❌ ERROR CRÍTICO en indicador {grupos[huella][0] + 1}: {exc}")
+                    asignar(huella, error=f"Error: {exc}")
+            
+            if pendientes and _cliente_desconectado():
+                print(f"\n🔌 Cliente desconectado: cancelando {len(pendientes)} indicadores")
+                deadline.cancelar("cliente desconectado")
         
-        # Si hay IA pero baja confianza, comparar
-        if valores_ia:
-            mejor_ia = valores_ia_ordenados[0]
-            if mejor_ia.get('confianza_ia', 0) < 6 and mejor_regex.get('relevancia', 0) > 15:
-                print(f"         ✅ SELECCIONADO (Regex más confiable que IA)")
-                return mejor_regex['valor']
-            else:
-                print(f"         ✅ SELECCIONADO (IA preferida sobre regex)")
-                return mejor_ia['valor']
-        else:
-            print(f"         ✅ SELECCIONADO (Único método: regex)")
-            return mejor_regex['valor']
+        if pendientes:
+            # Cancelación cooperativa: los hilos en curso devuelven lo que tengan
+            deadline.cancelar(deadline.motivo or "timeout")
+            for future in pendientes:
+                future.cancel()
+            listos, pendientes = wait(pendientes, timeout=GRACIA_CANCELACION_SECONDS)
+            for future in listos:
+                if future.cancelled():
+                    continue
+                try:
+                    _, result = future.result()
+                    asignar(futures[future], result)
+                except Exception as exc:
+                    asignar(futures[future], error=f"Error: {exc}")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _analizar_en_cola(grupos, plan, indicators, narrativa, deadline, asignar):
+    """
+    Encola un indicador por huella y agrega lo que devuelven los workers (worker.py).
+    Los workers toman primero las tareas de menor costo estimado (con envejecimiento).
+    Lo que no termine antes del deadline se cancela en la cola.
+    """
+    total = len(indicators)
+    trabajo = uuid.uuid4().hex
+    restante = deadline.restante()
+    cola.encolar(
+        trabajo,
+        [
+            (huella, {'idx': filas[0] + 1, 'total': total, 'fila': indicators[filas[0]], 'narrativa': narrativa, 'costo': costo}, costo)
+            for huella, filas, costo in plan
+        ],
+        vence=time.time() + restante if restante is not None else None
+    )
+    print(f"📤 Trabajo {trabajo[:8]} encolado: {len(grupos)} tareas")
     
-    # FALLBACK: Si solo hay IA con baja confianza
-    if valores_ia:
-        print(f"         ⚠️ SELECCIONADO (IA única opción, baja confianza)")
-        return valores_ia_ordenados[0]['valor']
+    asignadas = set()
+    marca = 0
+    try:
+        while len(asignadas) < len(grupos) and not deadline.expirado():
+            marca, terminadas = cola.terminadas(trabajo, desde=marca)
+            for huella, estado, resultado, error in terminadas:
+                asignadas.add(huella)
+                if estado == 'hecha':
+                    asignar(huella, resultado)
+                else:
+                    asignar(huella, error=error or estado, estado='timeout' if estado == 'cancelada' else 'error')
+            
+            if len(asignadas) < len(grupos):
+                if _cliente_desconectado():
+                    print(f"\n🔌 Cliente desconectado: cancelando trabajo {trabajo[:8]}")
+                    deadline.cancelar("cliente desconectado")
+                else:
+                    deadline.esperar(ESPERA_COLA_SECONDS)
+    finally:
+        cola.cancelar_trabajo(trabajo, f"Timeout: {deadline.motivo or 'deadline agotado'}")
     
-    print(f"         ❌ No se pudo seleccionar valor confiable")
-    return None
+    # Resultados que llegaron justo antes de cancelar (las canceladas quedan como timeout)
+    for huella, estado, resultado, error in cola.terminadas(trabajo, desde=marca)[1]:
+        if estado == 'hecha':
+            asignar(huella, resultado)
+        else:
+            asignar(huella, error=error or estado, estado='timeout' if estado == 'cancelada' else 'error')
 
+def iniciar_tareas_de_fondo():
+    """Precarga de fuentes y modelo; en modo cola la hacen los workers, que son quienes analizan"""
+    if ANALYSIS_MODE != 'cola':
+        iniciar_precarga()
 
 @app.route('/')
 def index():
@@ -121,7 +170,14 @@ def index():
 
 @app.route('/api/health', methods=['GET'])
 def health():
-    ollama_ok = analyzer.verificar_ollama()
+    """
+    Liviano: solo pregunta si los servidores Ollama responden (cacheado, ver
+    llm.servidores_activos). Con ?profundo=1 además genera con el modelo principal.
+    """
+    if request.args.get('profundo') == '1':
+        ollama_ok = AIAnalyzer().verificar_ollama()
+    else:
+        ollama_ok = bool(llm.servidores_activos())
     excel_exists = os.path.exists('../data/plan_gobierno_2025_2029.xlsx') or \
                    os.path.exists('data/plan_gobierno_2025_2029.xlsx')
     
@@ -130,7 +186,41 @@ def health():
         'ollama': 'funcionando' if ollama_ok else 'error - Ejecuta: ollama serve',
         'excel': 'encontrado' if excel_exists else 'no encontrado',
         'version': '5.0 - Extracción con IA Contextual (Ollama)',
-        'timestamp': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    datos = {
+        **metricas.instantanea(),
+        'concurrencia': controlador_analisis.estado(),
+        'precarga': precargador.estado(),
+        'cascada': estado_cascada(),
+        'ollama': llm.pool_ollama.estado()
+    }
+    if ANALYSIS_MODE == 'cola':
+        datos['cola'] = cola.estadisticas()
+    return jsonify(datos)
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """Búsqueda en todos los documentos ingeridos: fragmentos con página, ordenados por relevancia"""
+    consulta = request.args.get('q', '').strip()
+    if not consulta:
+        return jsonify({'success': False, 'error': 'Falta el parámetro q'}), 400
+    try:
+        limite = min(100, max(1, int(request.args.get('limit', 20))))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit debe ser un entero'}), 400
+    
+    inicio = time.perf_counter()
+    resultados = indice.buscar(consulta, limite=limite, url=request.args.get('url'))
+    return respuesta_json({
+        'success': True,
+        'q': consulta,
+        'resultados': resultados,
+        'total': len(resultados),
+        'tiempo_ms': round((time.perf_counter() - inicio) * 1000, 2)
     })
 
 @app.route('/api/load-excel', methods=['GET'])
@@ -143,16 +233,101 @@ def load_excel():
         if not os.path.exists(excel_path):
             return jsonify({'success': False, 'error': f'Archivo no encontrado: {excel_path}'}), 404
         
+        # ETag = hash del Excel: si no cambió, 304 sin volver a leerlo
+        etag = etag_de_archivo(excel_path)
+        if no_modificado(etag):
+            return respuesta_304(etag)
+        
+        import pandas as pd  # solo esta ruta lo necesita: no se carga al arrancar
         df = pd.read_excel(excel_path)
         data = df.to_dict('records')
         print(f"\n📊 Excel cargado: {len(data)} indicadores")
         
-        return jsonify({'success': True, 'data': data, 'total': len(data)})
+        return respuesta_json({'success': True, 'data': data, 'total': len(data)}, etag=etag)
         
     except Exception as e:
         print(f"❌ Error cargando Excel: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _parametros_analisis(data):
+    """(narrativa, segundos, None) o (None, None, respuesta de error 400)"""
+    narrativa = data.get('narrative', 'llm')
+    if narrativa not in MODOS_NARRATIVA:
+        return None, None, (jsonify({'success': False, 'error': f"Modo de narrativa inválido: {narrativa} (use {'|'.join(MODOS_NARRATIVA)})"}), 400)
+    try:
+        segundos = float(data.get('timeout', ANALYSIS_DEADLINE_SECONDS))
+    except (TypeError, ValueError):
+        return None, None, (jsonify({'success': False, 'error': 'timeout debe ser un número de segundos'}), 400)
+    return narrativa, segundos, None
+
+def _ejecutar_analisis(indicators, narrativa, segundos, deadline, al_completar=None, conservar=True, perfil=None):
+    """
+    Analiza todas las filas dentro del deadline. `al_completar(i, resultado)` se llama
+    por cada fila en cuanto termina (exportación en streaming); con conservar=False
+    no se acumula la lista de resultados. `perfil`: PerfilSolicitud activo (perfilado.py).
+    Devuelve (results, resumen).
+    """
+    print(f"\n{'='*80}")
+    print(f"🚀 ANÁLISIS CON OLLAMA - {len(indicators)} INDICADORES")
+    print(f"{'='*80}")
+    
+    total = len(indicators)
+    # Filas repetidas (mismo Indicador/Meta bajo varios Ejes) se calculan una sola vez
+    grupos = agrupar_indicadores(indicators, narrativa)
+    worker_limit = max(1, min(ANALYSIS_WORKERS_MAX, len(grupos)))
+    if ANALYSIS_MODE == 'cola':
+        print(f"⚙️ Procesamiento: cola compartida (workers externos)")
+    else:
+        print(f"⚙️ Procesamiento: hasta {worker_limit} hilos, {controlador_analisis.limite_actual()} activos (control adaptativo)")
+    print(f"🧬 Indicadores únicos: {len(grupos)} de {total} filas")
+    plan = ordenar_por_costo(grupos, indicators, narrativa)
+    print(f"📐 Planificación ({PLANIFICADOR}): {resumen_plan(plan)}")
+    print(f"🤖 Método: Ollama lee documentos completos y extrae datos con contexto")
+    print(f"📝 Narrativa: {narrativa}")
+    print(f"⏱️ Deadline de la solicitud: {segundos:.0f}s")
+    results = [None] * total if conservar else None
+    completadas = [False] * total
+    resumen = {'exitosos': 0, 'parciales': 0}
+
+    def _asignar(huella, result=None, error=None, estado='error'):
+        for i in grupos[huella]:
+            if result is not None:
+                fila = resultado_para_fila(result, indicators[i])
+            else:
+                fila = resultado_fallido(indicators[i], error, estado=estado)
+            completadas[i] = True
+            resumen['exitosos'] += fila.get('estado') not in ('error', 'timeout')
+            resumen['parciales'] += bool(fila.get('timeout'))
+            if conservar:
+                results[i] = fila
+            if al_completar is not None:
+                al_completar(i, fila)
+
+    try:
+        if ANALYSIS_MODE == 'cola':
+            _analizar_en_cola(grupos, plan, indicators, narrativa, deadline, _asignar)
+        else:
+            _analizar_local(grupos, plan, indicators, narrativa, deadline, _asignar, worker_limit, perfil)
+        
+        for huella, filas in grupos.items():
+            if not completadas[filas[0]]:
+                _asignar(
+                    huella,
+                    error=f"Timeout: deadline de {segundos:.0f}s agotado ({deadline.motivo})",
+                    estado='timeout'
+                )
+    finally:
+        deadline.cancelar("solicitud finalizada")
+
+    print(f"\n{'='*80}")
+    print(f"✅ ANÁLISIS COMPLETADO")
+    print(f"   Indicadores procesados: {total}")
+    print(f"   Exitosos: {resumen['exitosos']}/{total}")
+    print(f"   Parciales por timeout: {resumen['parciales']}")
+    print(f"   Tiempo total: {deadline.transcurrido():.1f}s")
+    print(f"{'='*80}\n")
+    return results, resumen
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_indicators():
     try:
@@ -162,145 +337,147 @@ def analyze_indicators():
         if not indicators:
             return jsonify({'success': False, 'error': 'No se recibieron indicadores'}), 400
         
-        print(f"\n{'='*80}")
-        print(f"🚀 ANÁLISIS CON OLLAMA - {len(indicators)} INDICADORES")
-        print(f"{'='*80}")
+        narrativa, segundos, error = _parametros_analisis(data)
+        if error:
+            return error
+        
+        # Perfilado opt-in: {'profile': 'cpu,memoria'} o cabecera X-Profile
+        modos = modos_solicitados(data, request.headers)
+        perfil = PerfilSolicitud(modos) if modos else None
+        with perfil if perfil is not None else nullcontext():
+            results, resumen = _ejecutar_analisis(indicators, narrativa, segundos, Deadline(segundos), perfil=perfil)
+        
+        respuesta = {'success': True, 'results': results, 'timeouts': resumen['parciales']}
+        if perfil is not None:
+            notas = ["modo cola: solo se perfila la solicitud, no los workers"] if ANALYSIS_MODE == 'cola' else []
+            perfil.notas.extend(notas)
+            respuesta['perfil'] = perfil.guardar({'indicadores': len(indicators)})
+        # Sin ETag: un 304 llegaría después de todo el análisis (no ahorra nada) y la
+        # narrativa del LLM cambia en cada ejecución
+        return respuesta_json(respuesta, condicional=False)
         
-        total = len(indicators)
-        worker_limit = max(1, min(MAX_ANALYSIS_WORKERS, total))
-        print(f"⚙️ Procesamiento: {worker_limit} hilos (limitado por análisis IA)")
-        print(f"🤖 Método: Ollama lee documentos completos y extrae datos con contexto")
-        results = [None] * total
+    except Exception as e:
+        print(f"\n❌ ERROR GENERAL DEL SISTEMA: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        def _process_indicator(idx, total_indicators, row_data):
-            local_scraper = DataScraper()
-            local_analyzer = AIAnalyzer()
-            
-            print(f"\n{'#'*80}")
-            print(f"📋 INDICADOR {idx}/{total_indicators}")
-            print(f"{'#'*80}")
-            
-            eje = row_data.get('Eje', 'Sin eje')
-            indicador = row_data.get('Indicador', 'Sin indicador')
-            meta = row_data.get('Meta', 'Sin meta')
-            
-            print(f"📌 {indicador}")
-            print(f"🎯 {meta}")
+def _flujo_csv_analisis(indicators, narrativa, segundos, deadline):
+    """CSV fila a fila a medida que terminan los indicadores (el análisis corre en otro hilo)"""
+    flujo = FlujoCSV()
+    completadas = queue.Queue()
 
-            # Extraer valor inicial
-            valor_inicial = row_data.get('ValorInicial')
-            if valor_inicial is None:
-                try:
-                    if isinstance(row_data.get('Meta'), (int, float)):
-                        valor_inicial = float(row_data.get('Meta'))
-                    else:
-                        m = re.search(r'(\d+[.,]?\d*)', str(row_data.get('Meta') or ''))
-                        if m:
-                            valor_inicial = float(m.group(1).replace(',', '.'))
-                except:
-                    valor_inicial = None
-            
-            print(f"📊 Valor Inicial (Base): {valor_inicial}")
+    def _analizar():
+        try:
+            _ejecutar_analisis(indicators, narrativa, segundos, deadline,
+                               al_completar=lambda i, fila: completadas.put((i, fila)), conservar=False)
+        except Exception as e:
+            print(f"❌ Error en exportación: {e}")
+        finally:
+            completadas.put(None)
 
-            # Scraping inteligente CON META (para contexto)
-            try:
-                print(f"\n🔎 Iniciando búsqueda web inteligente...")
-                datos_scraping = local_scraper.buscar_datos(indicador, meta)
-                valor_actual = _obtener_valor_actual_inteligente(datos_scraping, indicador)
-            except Exception as e:
-                print(f"❌ Error en scraping: {e}")
-                import traceback
-                traceback.print_exc()
-                datos_scraping = []
-                valor_actual = None
-            
-            print(f"\n📊 VALOR ACTUAL FINAL: {valor_actual}")
+    yield flujo.cabecera()
+    threading.Thread(target=_analizar, name='exportacion', daemon=True).start()
+    try:
+        while (item := completadas.get()) is not None:
+            i, fila = item
+            yield flujo.fila(i, indicators[i], fila)
+    finally:
+        # Si el cliente corta la descarga, se cancela el análisis en curso
+        deadline.cancelar("cliente desconectado")
 
-            # Análisis
+def _enviar_y_eliminar(ruta, bloque=64 * 1024):
+    try:
+        with open(ruta, 'rb') as f:
+            while datos := f.read(bloque):
+                yield datos
+    finally:
+        os.remove(ruta)
+
+@app.route('/api/export', methods=['POST'])
+def export_results():
+    """
+    Resultados como XLSX (openpyxl write-only), CSV o Parquet, escritos fila a fila.
+    Cuerpo: {'format', 'results': [...]} exporta resultados ya calculados;
+    {'format', 'indicators', 'narrative', 'timeout'} analiza y exporta en el camino
+    (en CSV la descarga avanza a medida que terminan los indicadores).
+    """
+    data = request.json or {}
+    formato = data.get('format', 'xlsx')
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({'success': False, 'error': f"Formato inválido: {formato} (use {'|'.join(FORMATOS_EXPORTACION)})"}), 400
+    cabeceras = {'Content-Disposition': f'attachment; filename="resultados_plan.{formato}"'}
+    
+    if 'results' in data:
+        def _escribir(ruta):
+            return exportar_resultados(((i, None, r) for i, r in enumerate(data['results'])), ruta, formato)
+    else:
+        indicators = data.get('indicators', [])
+        if not indicators:
+            return jsonify({'success': False, 'error': 'No se recibieron indicadores ni resultados'}), 400
+        narrativa, segundos, error = _parametros_analisis(data)
+        if error:
+            return error
+        deadline = Deadline(segundos)
+        if formato == 'csv':
+            return Response(stream_with_context(_flujo_csv_analisis(indicators, narrativa, segundos, deadline)),
+                            content_type=TIPOS_MIME['csv'], headers=cabeceras)
+        
+        def _escribir(ruta):
+            escritor = abrir_escritor(formato, ruta)
             try:
-                analysis = local_analyzer.analizar_indicador(
-                    eje=eje,
-                    indicador=indicador,
-                    meta=meta,
-                    valor_inicial=valor_inicial,
-                    valor_actual=valor_actual,
-                    datos_scraping=datos_scraping,
-                    contexto=indicador
+                _ejecutar_analisis(
+                    indicators, narrativa, segundos, deadline, conservar=False,
+                    al_completar=lambda i, fila: escritor.escribir(fila_exportable(i, indicators[i], fila))
                 )
-                
-                progreso = analysis.get('progreso', 0)
-                print(f"\n✅ ANÁLISIS COMPLETADO")
-                print(f"   Progreso: {progreso}%")
-                print(f"   Estado: {analysis.get('estado', 'N/A')}")
-                print(f"{'#'*80}\n")
-                
-                return idx, {
-                    'eje': eje,
-                    'indicador': indicador,
-                    'meta': meta,
-                    'valor_inicial': analysis.get('valor_inicial', 'No disponible'),
-                    'valor_actual': analysis.get('valor_actual', 'No disponible'),
-                    **analysis
-                }
-                
-            except Exception as e:
-                print(f"❌ Error en análisis: {e}")
-                import traceback
-                traceback.print_exc()
-                return idx, {
-                    'eje': eje,
-                    'indicador': indicador,
-                    'meta': meta,
-                    'valor_inicial': valor_inicial or 'No disponible',
-                    'valor_actual': 'Error',
-                    'progreso': 0,
-                    'estado': 'error',
-                    'eficiencia': 'N/A',
-                    'analisis': f"Error: {str(e)}",
-                    'fuente': 'Error'
-                }
+            finally:
+                escritor.cerrar()
+            return len(indicators)
+    
+    # XLSX/Parquet necesitan un archivo: se escribe fila a fila en disco y se envía por bloques
+    descriptor, ruta = tempfile.mkstemp(suffix=f'.{formato}')
+    os.close(descriptor)
+    try:
+        n = _escribir(ruta)
+    except ValueError as e:
+        os.remove(ruta)
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception:
+        os.remove(ruta)
+        raise
+    print(f"📤 Exportación {formato}: {n} filas")
+    cabeceras['Content-Length'] = str(os.path.getsize(ruta))
+    return Response(_enviar_y_eliminar(ruta), content_type=TIPOS_MIME[formato], headers=cabeceras)
 
-        # Ejecución paralela con timeout extendido (IA es más lenta)
-        with ThreadPoolExecutor(max_workers=worker_limit) as executor:
-            futures = {
-                executor.submit(_process_indicator, idx, total, row): (idx, row)
-                for idx, row in enumerate(indicators, start=1)
-            }
-            
-            for future in as_completed(futures):
-                idx, row_data = futures[future]
-                try:
-                    _, result = future.result(timeout=600)  # 10 min por indicador (IA puede tardar)
-                    results[idx - 1] = result
-                except Exception as exc:
-                    print(f"\n❌ ERROR CRÍTICO en indicador {idx}: {exc}")
-                    results[idx - 1] = {
-                        'eje': row_data.get('Eje', 'Sin eje'),
-                        'indicador': row_data.get('Indicador', 'Sin indicador'),
-                        'meta': row_data.get('Meta', 'Sin meta'),
-                        'valor_inicial': 'Error',
-                        'valor_actual': 'Error',
-                        'progreso': 0,
-                        'estado': 'error',
-                        'eficiencia': 'N/A',
-                        'analisis': f"Timeout o error: {exc}",
-                        'fuente': 'Error'
-                    }
+@app.route('/api/profiles', methods=['GET'])
+def profiles():
+    return jsonify({'success': True, 'perfiles': listar_perfiles()})
 
-        print(f"\n{'='*80}")
-        print(f"✅ ANÁLISIS COMPLETADO")
-        print(f"   Indicadores procesados: {len(results)}")
-        exitosos = sum(1 for r in results if r and r.get('estado') != 'error')
-        print(f"   Exitosos: {exitosos}/{len(results)}")
-        print(f"{'='*80}\n")
-        
-        return jsonify({'success': True, 'results': results})
-        
+@app.route('/api/profiles/<perfil_id>', methods=['GET'])
+def profile(perfil_id):
+    resumen = cargar_resumen(perfil_id)
+    if resumen is None:
+        return jsonify({'success': False, 'error': 'Perfil no encontrado'}), 404
+    return jsonify({'success': True, 'perfil': resumen})
+
+@app.route('/api/narrative/<narrativa_id>', methods=['GET'])
+def generar_narrativa(narrativa_id):
+    """Genera (una sola vez) la narrativa con IA de un indicador analizado sin ella"""
+    try:
+        analisis = generar_narrativa_pendiente(narrativa_id)
+    except NarrativaNoDisponible as e:
+        respuesta = jsonify({'success': False, 'error': str(e), 'reintentar': True})
+        respuesta.status_code = 503
+        respuesta.headers['Retry-After'] = '30'
+        return respuesta
     except Exception as e:
-        print(f"\n❌ ERROR GENERAL DEL SISTEMA: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"❌ Error generando narrativa: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
+    
+    if analisis is None:
+        return jsonify({'success': False, 'error': f'Narrativa no encontrada: {narrativa_id}'}), 404
+    
+    return jsonify({'success': True, 'narrativa_id': narrativa_id, 'analisis': analisis})
 
 if __name__ == '__main__':
     print("\n" + "="*80)
@@ -317,9 +494,13 @@ if __name__ == '__main__':
     print("="*80 + "\n")
     
     # Verificar Ollama
-    if analyzer.verificar_ollama():
+    if AIAnalyzer().verificar_ollama():
         print("✅ Ollama conectado correctamente\n")
     else:
         print("⚠️ WARNING: Ollama no está corriendo. Ejecuta: ollama serve\n")
     
+    # Con debug el reloader de Werkzeug ejecuta este bloque en el proceso vigilante y
+    # en el hijo que atiende: las tareas de fondo solo en el hijo
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        iniciar_tareas_de_fondo()
     app.run(debug=True, port=5050, host='0.0.0.0')
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Tiempo de importación de los puntos de entrada en un intérprete nuevo (python -X importtime)
+contra un presupuesto, y qué dependencias pesadas quedan cargadas tras importarlos y tras
+el primer GET /api/health.
+
+Uso (desde backend/):
+    python benchmarks/bench_arranque.py                      # app
+    python benchmarks/bench_arranque.py app worker lote      # varios módulos
+Opciones: --repeticiones N (por defecto 5), --presupuesto-ms MS (o PRESUPUESTO_IMPORTACION_MS),
+--top N (importaciones directas más lentas), --sin-health.
+Sale con código 1 si algún módulo supera el presupuesto o carga una dependencia pesada.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Mediana (ms) de importar cada módulo; holgura para máquinas más lentas que la de desarrollo
+try:
+    PRESUPUESTO_IMPORTACION_MS = float(os.getenv('PRESUPUESTO_IMPORTACION_MS', '400'))
+except ValueError:
+    PRESUPUESTO_IMPORTACION_MS = 400.0
+
+# Se importan al primer uso (ingesta, llm, load_excel, lote.leer_plan): nunca al arrancar
+MODULOS_PESADOS = ('pandas', 'numpy', 'pdfplumber', 'ollama', 'httpx', 'requests', 'bs4', 'openpyxl', 'pyarrow')
+
+# Corre en el intérprete nuevo; la última línea de stdout es el JSON con lo cargado
+_SONDA = """
+import sys, json, time
+PESADOS = {pesados!r}
+import {modulo}
+cargados = {{'importar': [m for m in PESADOS if m in sys.modules]}}
+if {health!r} and {modulo!r} == 'app':
+    inicio = time.perf_counter()
+    respuesta = app.app.test_client().get('/api/health')
+    cargados['health_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+    cargados['health_status'] = respuesta.status_code
+    cargados['health'] = [m for m in PESADOS if m in sys.modules]
+print(json.dumps(cargados))
+"""
+
+
+def _leer_importtime(salida):
+    """[(nivel, módulo, self_us, acumulado_us)] de la salida de -X importtime"""
+    filas = []
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:'):
+            continue
+        partes = linea[len('import time:'):].split('|')
+        if len(partes) != 3 or not partes[0].strip().isdigit():
+            continue  # encabezado
+        nombre = partes[2].rstrip()
+        nivel = (len(nombre) - len(nombre.lstrip())) // 2
+        filas.append((nivel, nombre.strip(), int(partes[0]), int(partes[1])))
+    return filas
+
+
+def medir(modulo, health=True):
+    """Una importación en un intérprete nuevo: (ms totales, importaciones directas, cargados)"""
+    codigo = _SONDA.format(modulo=modulo, pesados=MODULOS_PESADOS, health=health)
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=BACKEND, capture_output=True, text=True, timeout=120
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"import {modulo} falló:\n{proceso.stderr[-2000:]}")
+    filas = _leer_importtime(proceso.stderr)
+    posicion = next((i for i, f in enumerate(filas) if f[0] == 0 and f[1] == modulo), None)
+    if posicion is None:
+        raise RuntimeError(f"Sin medición de importtime para {modulo}")
+    total = filas[posicion][3]
+    # importtime escribe cada módulo después de sus dependencias: las directas son
+    # las de nivel 1 entre la línea anterior de nivel 0 y la del módulo
+    directas = []
+    for nivel, nombre, _, acumulado in reversed(filas[:posicion]):
+        if nivel == 0:
+            break
+        if nivel == 1:
+            directas.append((nombre, acumulado / 1000))
+    cargados = json.loads(proceso.stdout.strip().splitlines()[-1])
+    return total / 1000, directas, cargados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modulos', nargs='*', default=['app'])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--presupuesto-ms', type=float, default=PRESUPUESTO_IMPORTACION_MS)
+    parser.add_argument('--top', type=int, default=8)
+    parser.add_argument('--sin-health', action='store_true', help="no mide el primer GET /api/health")
+    args = parser.parse_args()
+
+    fallas = []
+    for modulo in args.modulos:
+        tiempos = []
+        directas = cargados = None
+        for _ in range(args.repeticiones):
+            ms, directas, cargados = medir(modulo, health=not args.sin_health)
+            tiempos.append(ms)
+        mediana = statistics.median(tiempos)
+        dentro = mediana <= args.presupuesto_ms
+        print(f"\n🚀 import {modulo}: mediana {mediana:.0f} ms (mín {min(tiempos):.0f}, "
+              f"{args.repeticiones} intérpretes) — presupuesto {args.presupuesto_ms:.0f} ms "
+              f"{'✅' if dentro else '❌'}")
+        print(f"   {'importación directa':<40}{'ms':>10}")
+        for nombre, ms in sorted(directas, key=lambda d: d[1], reverse=True)[:args.top]:
+            print(f"   {nombre:<40}{ms:>10.1f}")
+        if not dentro:
+            fallas.append(f"{modulo}: {mediana:.0f} ms > {args.presupuesto_ms:.0f} ms")
+
+        if cargados['importar']:
+            fallas.append(f"{modulo}: importarlo carga {', '.join(cargados['importar'])}")
+        print(f"   Pesados tras importar: {', '.join(cargados['importar']) or 'ninguno'}")
+        if 'health' in cargados:
+            print(f"   GET /api/health: {cargados['health_ms']:.0f} ms (HTTP {cargados['health_status']}), "
+                  f"pesados cargados: {', '.join(cargados['health']) or 'ninguno'}")
+            if cargados['health']:
+                fallas.append(f"{modulo}: /api/health carga {', '.join(cargados['health'])}")
+
+    if fallas:
+        print("\n❌ Fuera de presupuesto:")
+        for falla in fallas:
+            print(f"   - {falla}")
+        sys.exit(1)
+    print("\n✅ Arranque dentro del presupuesto")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Compara la extracción HTML anterior (BeautifulSoup + html.parser) con extraccion_html (lxml).
+
+Uso (desde backend/):
+    python benchmarks/bench_html.py                   # páginas sintéticas tipo portal con tablas
+    python benchmarks/bench_html.py pagina.html ...   # archivos guardados
+    python benchmarks/bench_html.py https://...       # descarga las URLs una vez
+Opciones: --repeticiones N (por defecto 5)
+Con las páginas sintéticas se verifica además que la poda no pierda contenido
+(p. ej. <main> dentro de class="layout-with-sidebar"); si lo pierde, sale con código 1.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from extraccion_html import extraer_html
+
+
+def extraer_bs4(contenido):
+    """Ruta anterior de DataScraper.extraer_texto_html"""
+    soup = BeautifulSoup(contenido, 'html.parser')
+    for script in soup(["script", "style", "nav", "footer"]):
+        script.decompose()
+    texto = soup.get_text(separator='\n', strip=True)
+    soup.decompose()
+    return texto
+
+
+def pagina_sintetica(filas=3000, parrafos=400):
+    menu = ''.join(f'<li><a href="/s{i}">Sección {i}</a></li>' for i in range(150))
+    tabla = ''.join(
+        f'<tr><td>Provincia {i}</td><td>{2015 + i % 10}</td><td>{i * 0.37:.2f}%</td><td>{i * 13}</td></tr>'
+        for i in range(filas)
+    )
+    texto = ''.join(
+        f'<p>La tasa de <b>pobreza</b> por ingresos en el año {2015 + i % 10} se ubicó en '
+        f'<span>{20 + i % 7},{i % 100:02d}%</span> según la ENEMDU.</p>'
+        for i in range(parrafos)
+    )
+    scripts = '<script>' + 'var x = 1;' * 5000 + '</script>'
+    return (
+        '<html><head><meta charset="utf-8"><style>' + 'p{color:red}' * 2000 + '</style></head><body>'
+        f'<header><div class="navbar"><ul>{menu}</ul></div></header>'
+        f'<div class="cookie-banner">Usamos cookies</div>'
+        f'<main><h1>Boletín técnico</h1>{texto}'
+        f'<table><tr><th>Provincia</th><th>Año</th><th>Tasa</th><th>Casos</th></tr>{tabla}</table></main>'
+        f'<aside class="sidebar">{menu}</aside><footer>Instituto Nacional de Estadística</footer>{scripts}'
+        '</body></html>'
+    ).encode('utf-8')
+
+
+def pagina_envuelta():
+    """
+    Regresión: todo el contenido dentro de contenedores cuyas clases contienen palabras
+    de boilerplate como parte de un nombre compuesto (no deben podarse)
+    """
+    return (
+        '<html><head><meta charset="utf-8"></head><body>'
+        '<div class="site layout-with-sidebar"><div class="navbar">Inicio | Estadísticas</div>'
+        '<div class="content-share-wrapper"><main><h1>Mercado laboral</h1>'
+        '<p>La tasa de desempleo se ubicó en 3,8% en septiembre de 2025.</p>'
+        '<table><tr><th>Periodo</th><th>Desempleo</th></tr><tr><td>sep-2025</td><td>3,8%</td></tr></table>'
+        '<div class="pie-chart">Empleo adecuado 35,9%</div></main></div>'
+        '<div class="cookie-banner">Usamos cookies</div></div></body></html>'
+    ).encode('utf-8')
+
+
+# Lo que la extracción de cada página sintética debe conservar (y lo que debe podar)
+VERIFICACIONES = {
+    'envuelta': {'conserva': ('3,8% en septiembre', 'sep-2025 | 3,8%', 'Empleo adecuado 35,9%'),
+                 'poda': ('Usamos cookies',), 'tablas': 1},
+}
+
+
+def verificar(nombre, resultado):
+    """Errores de contenido perdido o ruido no podado en una página sintética"""
+    esperado = VERIFICACIONES.get(nombre)
+    if esperado is None:
+        return []
+    errores = [f"pierde '{t}'" for t in esperado['conserva'] if t not in resultado['texto']]
+    errores += [f"no poda '{t}'" for t in esperado['poda'] if t in resultado['texto']]
+    if len(resultado['tablas']) != esperado['tablas']:
+        errores.append(f"{len(resultado['tablas'])} tablas (se esperaban {esperado['tablas']})")
+    return errores
+
+
+def cargar(fuente):
+    if fuente.startswith(('http://', 'https://')):
+        import requests
+        respuesta = requests.get(fuente, timeout=30, headers={'User-Agent': 'Mozilla/5.0'})
+        respuesta.raise_for_status()
+        return respuesta.content
+    with open(fuente, 'rb') as f:
+        return f.read()
+
+
+def medir(funcion, contenido, repeticiones):
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(contenido)
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('fuentes', nargs='*')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    paginas = [(f, cargar(f)) for f in args.fuentes] or [
+        ('sintética', pagina_sintetica()), ('envuelta', pagina_envuelta())
+    ]
+    metodos = [
+        ('bs4 html.parser', lambda c: {'texto': extraer_bs4(c), 'tablas': []}),
+        ('lxml', lambda c: extraer_html(c, solo_principal=False)),
+        ('lxml principal', lambda c: extraer_html(c, solo_principal=True)),
+    ]
+
+    fallas = []
+    for nombre, contenido in paginas:
+        print(f"\n📄 {nombre} ({len(contenido) / 1024:.0f} KB, mediana de {args.repeticiones})")
+        print(f"   {'método':<18}{'ms':>10}{'x':>8}{'chars':>10}{'tablas':>8}")
+        base = None
+        for metodo, funcion in metodos:
+            segundos, resultado = medir(funcion, contenido, args.repeticiones)
+            base = base or segundos
+            print(f"   {metodo:<18}{segundos * 1000:>10.1f}{base / segundos:>8.1f}"
+                  f"{len(resultado['texto']):>10}{len(resultado['tablas']):>8}")
+            if metodo.startswith('lxml'):
+                fallas += [f"{nombre} / {metodo}: {e}" for e in verificar(nombre, resultado)]
+
+    if fallas:
+        print("\n❌ La extracción pierde contenido:")
+        for falla in fallas:
+            print(f"   - {falla}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
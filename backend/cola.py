@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from almacen import CACHE_DIR
+from concurrencia import PLANIFICADOR_ENVEJECIMIENTO
+
+# En un volumen compartido entre máquinas (NFS/SMB) WAL no funciona: usar COLA_JOURNAL=DELETE
+COLA_DB = os.getenv('COLA_DB', os.path.join(CACHE_DIR, 'cola.db'))
+COLA_JOURNAL = os.getenv('COLA_JOURNAL', 'WAL').upper()
+
+try:
+    COLA_LEASE_SECONDS = float(os.getenv('COLA_LEASE_SECONDS', '60'))
+except ValueError:
+    COLA_LEASE_SECONDS = 60.0
+
+try:
+    COLA_MAX_INTENTOS = int(os.getenv('COLA_MAX_INTENTOS', '3'))
+except ValueError:
+    COLA_MAX_INTENTOS = 3
+
+# Las tareas terminadas (con su resultado) se eliminan pasado este tiempo (ver Worker._latidos)
+try:
+    COLA_RETENCION_SECONDS = float(os.getenv('COLA_RETENCION_SECONDS', str(24 * 3600)))
+except ValueError:
+    COLA_RETENCION_SECONDS = 24 * 3600.0
+
+ESTADOS_FINALES = ('hecha', 'fallida', 'cancelada')
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tareas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trabajo TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    carga TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    dueno TEXT,
+    lease_expira REAL,
+    vence REAL,
+    costo REAL NOT NULL DEFAULT 0,
+    resultado TEXT,
+    error TEXT,
+    creada REAL NOT NULL,
+    actualizada REAL NOT NULL,
+    terminada INTEGER,
+    UNIQUE (trabajo, clave)
+);
+CREATE INDEX IF NOT EXISTS idx_tareas_estado ON tareas (estado, id);
+CREATE INDEX IF NOT EXISTS idx_tareas_trabajo ON tareas (trabajo, estado);
+CREATE TABLE IF NOT EXISTS narrativas (
+    id TEXT PRIMARY KEY,
+    datos TEXT NOT NULL,
+    expira REAL NOT NULL
+);
+"""
+
+# Orden de llegada a un estado final dentro del trabajo: cada escritura lo calcula dentro
+# de su transacción, así que crece con el orden de commit y sirve de marca para
+# terminadas() (que solo lee lo posterior a la marca)
+_SIGUIENTE_TERMINADA = (
+    "(SELECT COALESCE(MAX(t.terminada), 0) + 1 FROM tareas AS t WHERE t.trabajo = tareas.trabajo)"
+)
+
+
+class ColaTareas:
+    """
+    Cola de tareas de análisis sobre SQLite, compartida por la API (que encola y
+    agrega) y los workers (worker.py) de una o varias máquinas.
+    - Cada tarea tomada tiene un lease; el worker lo renueva con latidos.
+    - Si el worker muere, el lease vence y la tarea vuelve a 'pendiente'
+      (hasta COLA_MAX_INTENTOS; después queda 'fallida').
+    - `vence` es la hora (epoch) en que el solicitante deja de esperar: las
+      tareas vencidas no se toman y se marcan 'cancelada'.
+    - Se toma primero la de menor costo estimado, envejecida por su antigüedad
+      (prioridad_con_envejecimiento en concurrencia.py).
+    Los tiempos son de reloj de pared: las máquinas deben tener NTP.
+    """
+
+    def __init__(self, ruta=None, lease=COLA_LEASE_SECONDS, max_intentos=COLA_MAX_INTENTOS):
+        self.ruta = ruta or COLA_DB
+        self.lease = lease
+        self.max_intentos = max_intentos
+        self._local = threading.local()
+
+    def _conexion(self):
+        con = getattr(self._local, 'con', None)
+        if con is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            con.execute(f"PRAGMA journal_mode={COLA_JOURNAL}")
+            con.executescript(_ESQUEMA)
+            # Colas creadas antes de la planificación por costo o de la marca de terminadas
+            columnas = {c[1] for c in con.execute("PRAGMA table_info(tareas)")}
+            if 'costo' not in columnas:
+                con.execute("ALTER TABLE tareas ADD COLUMN costo REAL NOT NULL DEFAULT 0")
+            if 'terminada' not in columnas:
+                con.execute("ALTER TABLE tareas ADD COLUMN terminada INTEGER")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_tareas_terminada ON tareas (trabajo, terminada)")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def _transaccion(self, funcion):
+        con = self._conexion()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            valor = funcion(con)
+            con.execute("COMMIT")
+            return valor
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    # --- Lado de la API ---
+
+    def encolar(self, trabajo, tareas, vence=None):
+        """tareas: [(clave, carga_dict, costo_estimado_s), ...] únicas dentro del trabajo"""
+        ahora = time.time()
+        filas = [
+            (trabajo, clave, json.dumps(carga, ensure_ascii=False, default=str), vence, costo or 0.0, ahora, ahora)
+            for clave, carga, costo in tareas
+        ]
+        self._transaccion(lambda con: con.executemany(
+            "INSERT INTO tareas (trabajo, clave, carga, vence, costo, creada, actualizada) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            filas
+        ))
+        return len(filas)
+
+    def terminadas(self, trabajo, desde=0):
+        """
+        (marca, [(clave, estado, resultado, error)]) de las tareas del trabajo que terminaron
+        después de la marca `desde`; la marca devuelta se pasa en la siguiente consulta
+        """
+        filas = self._conexion().execute(
+            "SELECT terminada, clave, estado, resultado, error FROM tareas "
+            "WHERE trabajo = ? AND terminada > ? ORDER BY terminada", (trabajo, desde)
+        ).fetchall()
+        marca = filas[-1][0] if filas else desde
+        return marca, [
+            (clave, estado, json.loads(resultado) if resultado else None, error)
+            for _, clave, estado, resultado, error in filas
+        ]
+
+    def cancelar_trabajo(self, trabajo, motivo="cancelado"):
+        """Las tareas sin terminar se cancelan; los workers lo notan en el siguiente latido"""
+        return self._transaccion(lambda con: con.execute(
+            "UPDATE tareas SET estado = 'cancelada', error = ?, actualizada = ?, "
+            f"terminada = {_SIGUIENTE_TERMINADA} "
+            "WHERE trabajo = ? AND estado IN ('pendiente', 'en_curso')",
+            (motivo, time.time(), trabajo)
+        ).rowcount)
+
+    def purgar(self, antiguedad=COLA_RETENCION_SECONDS):
+        """Elimina tareas terminadas hace más de `antiguedad` segundos y narrativas vencidas"""
+        ahora = time.time()
+        con = self._conexion()
+        tareas = con.execute(
+            "DELETE FROM tareas WHERE estado IN ('hecha', 'fallida', 'cancelada') AND actualizada < ?",
+            (ahora - antiguedad,)
+        ).rowcount
+        con.execute("DELETE FROM narrativas WHERE expira < ?", (ahora,))
+        return tareas
+
+    # --- Narrativas diferidas (las registra el worker, las genera la API) ---
+
+    def guardar_narrativa(self, narrativa_id, datos, ttl):
+        self._conexion().execute(
+            "INSERT OR REPLACE INTO narrativas (id, datos, expira) VALUES (?, ?, ?)",
+            (narrativa_id, json.dumps(datos, ensure_ascii=False, default=str), time.time() + ttl)
+        )
+
+    def obtener_narrativa(self, narrativa_id):
+        fila = self._conexion().execute(
+            "SELECT datos FROM narrativas WHERE id = ? AND expira >= ?", (narrativa_id, time.time())
+        ).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def estadisticas(self):
+        filas = self._conexion().execute("SELECT estado, COUNT(*) FROM tareas GROUP BY estado").fetchall()
+        return dict(filas)
+
+    # --- Lado de los workers ---
+
+    def _recuperar_vencidas(self, con, ahora):
+        # Leases vencidos (worker caído): reintento o fallo definitivo
+        con.execute(
+            "UPDATE tareas SET estado = 'fallida', error = 'lease vencido: se agotaron los reintentos', "
+            f"dueno = NULL, actualizada = ?, terminada = {_SIGUIENTE_TERMINADA} WHERE estado = 'en_curso' AND lease_expira < ? AND intentos >= ?",
+            (ahora, ahora, self.max_intentos)
+        )
+        recuperadas = con.execute(
+            "UPDATE tareas SET estado = 'pendiente', dueno = NULL, actualizada = ? "
+            "WHERE estado = 'en_curso' AND lease_expira < ?",
+            (ahora, ahora)
+        ).rowcount
+        if recuperadas:
+            print(f"♻️ Cola: {recuperadas} tareas recuperadas de workers caídos")
+        # Nadie espera ya su resultado
+        con.execute(
+            "UPDATE tareas SET estado = 'cancelada', error = 'deadline de la solicitud agotado', actualizada = ?, "
+            f"terminada = {_SIGUIENTE_TERMINADA} WHERE estado = 'pendiente' AND vence IS NOT NULL AND vence < ?",
+            (ahora, ahora)
+        )
+
+    def tomar(self, dueno):
+        """Reserva la tarea pendiente de menor costo envejecido. Devuelve dict o None si no hay"""
+        def _tomar(con):
+            ahora = time.time()
+            self._recuperar_vencidas(con, ahora)
+            fila = con.execute(
+                "SELECT id, trabajo, clave, carga, intentos, vence FROM tareas "
+                "WHERE estado = 'pendiente' ORDER BY costo + ? * creada, id LIMIT 1",
+                (PLANIFICADOR_ENVEJECIMIENTO,)
+            ).fetchone()
+            if fila is None:
+                return None
+            con.execute(
+                "UPDATE tareas SET estado = 'en_curso', dueno = ?, lease_expira = ?, "
+                "intentos = intentos + 1, actualizada = ? WHERE id = ?",
+                (dueno, ahora + self.lease, ahora, fila[0])
+            )
+            return {
+                'id': fila[0], 'trabajo': fila[1], 'clave': fila[2],
+                'carga': json.loads(fila[3]), 'intento': fila[4] + 1, 'vence': fila[5]
+            }
+        return self._transaccion(_tomar)
+
+    def latido(self, tarea_id, dueno):
+        """Renueva el lease. False si la tarea ya no es de este worker (cancelada o reasignada)"""
+        ahora = time.time()
+        return self._conexion().execute(
+            "UPDATE tareas SET lease_expira = ?, actualizada = ? "
+            "WHERE id = ? AND dueno = ? AND estado = 'en_curso'",
+            (ahora + self.lease, ahora, tarea_id, dueno)
+        ).rowcount == 1
+
+    def completar(self, tarea_id, dueno, resultado):
+        return self._conexion().execute(
+            "UPDATE tareas SET estado = 'hecha', resultado = ?, dueno = NULL, actualizada = ?, "
+            f"terminada = {_SIGUIENTE_TERMINADA} WHERE id = ? AND dueno = ? AND estado = 'en_curso'",
+            (json.dumps(resultado, ensure_ascii=False, default=str), time.time(), tarea_id, dueno)
+        ).rowcount == 1
+
+    def fallar(self, tarea_id, dueno, error):
+        """Devuelve la tarea a la cola si le quedan intentos; si no, la marca 'fallida'"""
+        return self._conexion().execute(
+            "UPDATE tareas SET estado = CASE WHEN intentos < ? THEN 'pendiente' ELSE 'fallida' END, "
+            f"terminada = CASE WHEN intentos < ? THEN NULL ELSE {_SIGUIENTE_TERMINADA} END, "
+            "error = ?, dueno = NULL, actualizada = ? WHERE id = ? AND dueno = ? AND estado = 'en_curso'",
+            (self.max_intentos, self.max_intentos, str(error), time.time(), tarea_id, dueno)
+        ).rowcount == 1
+
+
+cola = ColaTareas()
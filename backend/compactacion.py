@@ -0,0 +1,121 @@
+import re
+from collections import Counter
+
+from metricas import metricas
+
+# Separador de páginas que produce la ingesta de PDFs
+SEPARADOR_PAGINA = "\f"
+
+# Aproximación de tokens para llama3.x en español
+CHARS_POR_TOKEN = 4
+
+LINEAS_ZONA_CABECERA = 3
+FRACCION_PAGINAS_REPETIDA = 0.5
+MAX_PALABRAS_LINEA_CORTA = 4
+
+_RE_COLUMNAS = re.compile(r' {3,}')
+_RE_ESPACIOS = re.compile(r'[ \t ]{2,}')
+_RE_DIGITO = re.compile(r'\d')
+_RE_NUMERO = re.compile(r'\d+')
+
+
+def estimar_tokens(texto):
+    return len(texto) // CHARS_POR_TOKEN
+
+
+def _compactar_linea(linea):
+    """Quita el relleno de layout=True: columnas separadas por ' | ', resto con un espacio"""
+    linea = linea.strip()
+    if not linea:
+        return ''
+    linea = _RE_COLUMNAS.sub(' | ', linea)
+    return _RE_ESPACIOS.sub(' ', linea)
+
+
+def _firma(linea):
+    """
+    Forma normalizada para detectar repeticiones: en líneas cortas con pocos números
+    (números de página, 'Pág. 3 de 40') los dígitos pasan a '#'; las líneas con
+    cifras de datos se comparan literalmente para no confundirlas con cabeceras.
+    """
+    linea = linea.lower()
+    if len(_RE_NUMERO.findall(linea)) <= 2 and len(_RE_DIGITO.sub('', linea).strip()) <= 40:
+        return _RE_DIGITO.sub('#', linea)
+    return linea
+
+
+def _cabeceras_repetidas(paginas):
+    """Firmas de líneas que aparecen al inicio/fin de al menos la mitad de las páginas"""
+    if len(paginas) < 3:
+        return set()
+    conteo = Counter()
+    for lineas in paginas:
+        zona = lineas[:LINEAS_ZONA_CABECERA] + lineas[-LINEAS_ZONA_CABECERA:]
+        conteo.update({_firma(l) for l in zona})
+    minimo = max(2, int(len(paginas) * FRACCION_PAGINAS_REPETIDA))
+    return {firma for firma, n in conteo.items() if n >= minimo}
+
+
+def _es_relleno(lineas, i, repetidas_sin_numero, palabras_clave):
+    """Línea sin números que no aporta: repetida (menús) o corta y lejos de cualquier cifra"""
+    linea = lineas[i]
+    # Filas de tablas (incluidos encabezados de columna) se conservan
+    if _RE_DIGITO.search(linea) or ' | ' in linea:
+        return False
+    linea_lower = linea.lower()
+    if palabras_clave and any(p in linea_lower for p in palabras_clave):
+        return False
+    if linea_lower in repetidas_sin_numero:
+        return True
+    if len(linea.split()) > MAX_PALABRAS_LINEA_CORTA:
+        return False
+    vecinas = lineas[max(0, i - 1):i] + lineas[i + 1:i + 2]
+    return not any(_RE_DIGITO.search(v) for v in vecinas)
+
+
+def compactar_texto(texto, palabras_clave=None):
+    """
+    Reduce el texto antes de enviarlo al LLM conservando las cifras y su contexto:
+    1. colapsa el relleno de espacios del layout (las tablas quedan como 'a | b | c')
+    2. elimina cabeceras y pies que se repiten entre páginas
+    3. elimina líneas sin números que son menús/boilerplate
+    Devuelve (texto_compacto, estadisticas).
+    """
+    if not texto:
+        return texto, {'chars_antes': 0, 'chars_despues': 0, 'tokens_antes': 0, 'tokens_despues': 0}
+
+    palabras_clave = [p.lower() for p in (palabras_clave or []) if len(p) > 3]
+
+    paginas = []
+    for pagina in texto.split(SEPARADOR_PAGINA):
+        lineas = [_compactar_linea(l) for l in pagina.splitlines()]
+        paginas.append([l for l in lineas if l])
+
+    cabeceras = _cabeceras_repetidas(paginas)
+    conteo_lineas = Counter(l.lower() for lineas in paginas for l in lineas if not _RE_DIGITO.search(l))
+    repetidas_sin_numero = {l for l, n in conteo_lineas.items() if n >= 2}
+
+    salida = []
+    for lineas in paginas:
+        if cabeceras:
+            n = len(lineas)
+            lineas = [
+                l for j, l in enumerate(lineas)
+                if not ((j < LINEAS_ZONA_CABECERA or j >= n - LINEAS_ZONA_CABECERA) and _firma(l) in cabeceras)
+            ]
+        conservadas = [l for j, l in enumerate(lineas) if not _es_relleno(lineas, j, repetidas_sin_numero, palabras_clave)]
+        if conservadas:
+            salida.append("\n".join(conservadas))
+
+    compacto = "\n\n".join(salida)
+    stats = {
+        'chars_antes': len(texto),
+        'chars_despues': len(compacto),
+        'tokens_antes': estimar_tokens(texto),
+        'tokens_despues': estimar_tokens(compacto)
+    }
+    metricas.incrementar('compactacion_chars_antes', stats['chars_antes'])
+    metricas.incrementar('compactacion_chars_despues', stats['chars_despues'])
+    metricas.incrementar('compactacion_tokens_antes', stats['tokens_antes'])
+    metricas.incrementar('compactacion_tokens_despues', stats['tokens_despues'])
+    return compacto, stats
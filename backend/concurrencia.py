@@ -0,0 +1,217 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from metricas import metricas
+from almacen import almacen
+
+
+def _int_env(nombre, defecto):
+    try:
+        return int(os.getenv(nombre, str(defecto)))
+    except ValueError:
+        return defecto
+
+
+ANALYSIS_WORKERS_MIN = max(1, _int_env('ANALYSIS_WORKERS_MIN', 1))
+ANALYSIS_WORKERS_MAX = max(ANALYSIS_WORKERS_MIN, _int_env('ANALYSIS_WORKERS_MAX', 6))
+ANALYSIS_WORKERS_INICIAL = min(ANALYSIS_WORKERS_MAX, max(ANALYSIS_WORKERS_MIN, _int_env('MAX_ANALYSIS_WORKERS', 2)))
+
+# Envejecimiento del orden por costo: segundos de costo que compensa cada segundo
+# de espera, así una tarea cara nunca espera más que su diferencia de costo
+try:
+    PLANIFICADOR_ENVEJECIMIENTO = float(os.getenv('PLANIFICADOR_ENVEJECIMIENTO', '1.0'))
+except ValueError:
+    PLANIFICADOR_ENVEJECIMIENTO = 1.0
+
+# Cada proceso publica en el almacén (compartido por los procesos de esta máquina)
+# cuántos indicadores analiza, con su PID como clave. La entrada de un proceso muerto
+# se descarta al leerla (y si el PID se reutilizó, vence sola)
+OCUPACION_TTL_SECONDS = 900
+
+
+def prioridad_con_envejecimiento(costo, llegada, envejecimiento=PLANIFICADOR_ENVEJECIMIENTO):
+    """
+    Clave de orden (menor primero) de costo - envejecimiento * espera. Como todas las
+    tareas en espera envejecen al mismo ritmo, equivale a costo + envejecimiento * llegada,
+    que no cambia con el tiempo y sirve para un heap o un ORDER BY.
+    """
+    return (costo or 0.0) + envejecimiento * llegada
+
+
+class ControladorConcurrencia:
+    """
+    Límite de indicadores en ejecución ajustado por AIMD:
+    - cada señal observada (tokens/s por servidor y modelo de Ollama, segundos por
+      mil caracteres de cada PDF leído) se compara con su línea base, la mejor
+      marca reciente con deriva lenta;
+    - si empeora más allá de `tolerancia` (contención de CPU/memoria o de
+      Ollama), el límite se multiplica por `factor_reduccion`;
+    - si se mantiene sana, crece aditivamente (~ +1 por cada `limite` observaciones).
+    Los hilos del pool piden turno con `turno(deadline, costo)`; sobran los que superan
+    el límite. Los turnos libres se dan primero al menor costo esperado, con envejecimiento
+    (ver prioridad_con_envejecimiento) para que las tareas caras no esperen sin fin.
+    """
+
+    def __init__(self, minimo=ANALYSIS_WORKERS_MIN, maximo=ANALYSIS_WORKERS_MAX,
+                 inicial=ANALYSIS_WORKERS_INICIAL, tolerancia=1.5, factor_reduccion=0.7,
+                 deriva_base=0.02, enfriamiento_s=10.0):
+        self.minimo = minimo
+        self.maximo = maximo
+        self.limite = float(inicial)
+        self.tolerancia = tolerancia
+        self.factor_reduccion = factor_reduccion
+        self.deriva_base = deriva_base
+        self.enfriamiento_s = enfriamiento_s
+        self.en_uso = 0
+        self.bases = {}
+        self.decisiones = deque(maxlen=50)
+        self._ultima_reduccion = 0.0
+        self._espera = []                       # heap de (prioridad, secuencia)
+        self._secuencia = itertools.count()
+        self._cond = threading.Condition()
+        self._publicar()
+
+    def limite_actual(self):
+        return max(self.minimo, min(self.maximo, int(self.limite)))
+
+    def adquirir(self, deadline=None, costo=0.0):
+        with self._cond:
+            entrada = (prioridad_con_envejecimiento(costo, time.monotonic()), next(self._secuencia))
+            heapq.heappush(self._espera, entrada)
+            try:
+                while self.en_uso >= self.limite_actual() or self._espera[0] != entrada:
+                    if deadline is not None:
+                        deadline.verificar("espera de turno de análisis")
+                        self._cond.wait(deadline.timeout(1.0))
+                    else:
+                        self._cond.wait(1.0)
+            except BaseException:
+                self._espera.remove(entrada)
+                heapq.heapify(self._espera)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._espera)
+            self.en_uso += 1
+            en_uso = self.en_uso
+            self._publicar()
+            # Si queda capacidad, el siguiente de la fila puede pasar
+            self._cond.notify_all()
+        self._compartir_ocupacion(en_uso)
+
+    def liberar(self):
+        with self._cond:
+            self.en_uso -= 1
+            en_uso = self.en_uso
+            self._publicar()
+            self._cond.notify_all()
+        self._compartir_ocupacion(en_uso)
+
+    @contextmanager
+    def turno(self, deadline=None, costo=0.0):
+        self.adquirir(deadline, costo)
+        try:
+            yield
+        finally:
+            self.liberar()
+
+    def observar(self, senal, valor, mayor_es_mejor=False):
+        """Registra una medición de la señal y ajusta el límite si corresponde"""
+        if valor is None or valor <= 0:
+            return
+        # Normalizado a "costo": menor es mejor
+        costo = 1.0 / valor if mayor_es_mejor else valor
+        with self._cond:
+            base = self.bases.get(senal)
+            if base is None:
+                self.bases[senal] = costo
+                return
+            # La base sigue la mejor marca y sube despacio si las condiciones cambian
+            self.bases[senal] = min(costo, base * (1 + self.deriva_base))
+
+            anterior = self.limite_actual()
+            ahora = time.monotonic()
+            if costo > base * self.tolerancia:
+                if ahora - self._ultima_reduccion >= self.enfriamiento_s:
+                    self.limite = max(self.minimo, self.limite * self.factor_reduccion)
+                    self._ultima_reduccion = ahora
+                    self._decidir('reducir', senal, costo / base, anterior)
+            else:
+                self.limite = min(self.maximo, self.limite + 1.0 / max(self.limite, 1.0))
+                if self.limite_actual() != anterior:
+                    self._decidir('aumentar', senal, costo / base, anterior)
+            self._publicar()
+            self._cond.notify_all()
+
+    def _decidir(self, accion, senal, ratio, anterior):
+        decision = {
+            'hora': time.strftime('%H:%M:%S'),
+            'accion': accion,
+            'senal': senal,
+            'ratio_vs_base': round(ratio, 2),
+            'limite_anterior': anterior,
+            'limite_nuevo': self.limite_actual()
+        }
+        self.decisiones.append(decision)
+        metricas.incrementar(f'concurrencia_{accion}')
+        print(f"   🎚️ Concurrencia: {accion} {anterior} → {decision['limite_nuevo']} ({senal} x{decision['ratio_vs_base']})")
+
+    def _compartir_ocupacion(self, en_uso):
+        try:
+            almacen.guardar('ocupacion', str(os.getpid()), en_uso, ttl=OCUPACION_TTL_SECONDS)
+        except Exception as e:
+            print(f"⚠️ No se pudo publicar la ocupación: {e}")
+
+    def _publicar(self):
+        metricas.fijar('concurrencia_limite', self.limite_actual())
+        metricas.fijar('concurrencia_en_uso', self.en_uso)
+
+    def estado(self):
+        with self._cond:
+            return {
+                'limite': self.limite_actual(),
+                'limite_continuo': round(self.limite, 3),
+                'minimo': self.minimo,
+                'maximo': self.maximo,
+                'en_uso': self.en_uso,
+                'en_espera': len(self._espera),
+                'bases': {s: round(b, 6) for s, b in self.bases.items()},
+                'decisiones': list(self.decisiones)
+            }
+
+
+# Compartido por todas las solicitudes del proceso
+controlador_analisis = ControladorConcurrencia()
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, pero es de otro usuario
+    except (OSError, ValueError):
+        return True  # no se puede comprobar: se respeta la entrada hasta que venza
+    return True
+
+
+def analisis_en_curso():
+    """
+    Indicadores en análisis en todos los procesos de esta máquina (mismo CACHE_DIR).
+    Las entradas de procesos que ya no existen (worker caído) se eliminan y no cuentan.
+    """
+    try:
+        total = 0
+        for clave, en_uso in almacen.entradas('ocupacion'):
+            if clave.isdigit() and not _proceso_vivo(int(clave)):
+                almacen.eliminar('ocupacion', clave)
+                continue
+            total += en_uso
+        return total
+    except Exception:
+        return controlador_analisis.en_uso
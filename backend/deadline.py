@@ -0,0 +1,86 @@
+import time
+import threading
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el presupuesto de tiempo (o se canceló) la solicitud"""
+
+
+class Deadline:
+    """
+    Presupuesto de tiempo por solicitud con cancelación cooperativa.
+    Se pasa a scraping, extracción de PDF y llamadas a Ollama; cada etapa
+    ajusta sus timeouts al tiempo restante y verifica entre pasos.
+    """
+
+    def __init__(self, segundos=None, padre=None):
+        self.inicio = time.monotonic()
+        self.limite = self.inicio + segundos if segundos is not None else None
+        self.padre = padre
+        self._cancelado = threading.Event()
+        self.motivo = None
+
+    def derivar(self, segundos=None):
+        """Deadline hijo: expira con el padre, pero cancelarlo no afecta al padre"""
+        return Deadline(segundos, padre=self)
+
+    def restante(self):
+        """Segundos restantes (None = sin límite)"""
+        propio = None if self.limite is None else max(0.0, self.limite - time.monotonic())
+        heredado = self.padre.restante() if self.padre is not None else None
+        if propio is None:
+            return heredado
+        if heredado is None:
+            return propio
+        return min(propio, heredado)
+
+    def transcurrido(self):
+        return time.monotonic() - self.inicio
+
+    def cancelar(self, motivo="cancelado"):
+        if not self._cancelado.is_set():
+            self.motivo = motivo
+            self._cancelado.set()
+
+    def cancelado(self):
+        return self._cancelado.is_set() or (self.padre is not None and self.padre.cancelado())
+
+    def expirado(self):
+        if self._cancelado.is_set():
+            return True
+        if self.padre is not None and self.padre.expirado():
+            return True
+        return self.limite is not None and time.monotonic() >= self.limite
+
+    def verificar(self, etapa=""):
+        """Lanza DeadlineExceeded si ya no queda tiempo"""
+        if self.expirado():
+            motivo = self.motivo or (self.padre.motivo if self.padre is not None else None) or "timeout"
+            raise DeadlineExceeded(f"{motivo} en etapa '{etapa}'" if etapa else motivo)
+
+    def timeout(self, maximo=None):
+        """Timeout para una operación: el menor entre `maximo` y el tiempo restante"""
+        restante = self.restante()
+        if restante is None:
+            return maximo
+        if maximo is None:
+            return max(restante, 0.1)
+        return max(min(maximo, restante), 0.1)
+
+    def esperar(self, segundos):
+        """Duerme como mucho `segundos`; despierta antes si se cancela o expira"""
+        restante = self.restante()
+        if restante is not None:
+            segundos = min(segundos, restante)
+        fin = time.monotonic() + segundos
+        while not self.expirado():
+            resto = fin - time.monotonic()
+            if resto <= 0:
+                break
+            # Con padre se despierta periódicamente para notar su cancelación
+            self._cancelado.wait(min(resto, 0.25) if self.padre is not None else resto)
+
+
+def timeout_de(deadline, maximo=None):
+    """Atajo para etapas que aceptan deadline opcional"""
+    return deadline.timeout(maximo) if deadline is not None else maximo
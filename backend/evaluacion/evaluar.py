@@ -0,0 +1,342 @@
+"""
+Precisión vs. latencia de las estrategias de extracción sobre el conjunto dorado (casos.jsonl).
+
+Uso (desde backend/):
+    python evaluacion/evaluar.py capturar                 # guarda el texto de las fuentes reales en documentos/
+    python evaluacion/evaluar.py                          # todas las estrategias con el Ollama local
+    python evaluacion/evaluar.py --modelo-stub            # sin Ollama: el "modelo" responde con el mejor candidato regex
+    python evaluacion/evaluar.py --estrategias regex,cascada --repeticiones 3 --json reporte.json
+
+Cada caso es una línea JSON: id, indicador, meta y el documento (url + archivo en
+documentos/, o 'texto' en línea para los sintéticos), con 'esperado' (valor correcto)
+o 'sin_dato': true (lo correcto es no devolver valor). Los casos de fuentes reales sin
+'esperado' se capturan pero no puntúan hasta que alguien revise el documento y lo complete;
+mientras ninguno puntúe, el reporte lo advierte: la precisión y la frontera de Pareto
+salen solo de los casos sintéticos.
+
+Por defecto se usa una caché vacía (CACHE_DIR temporal) y las respuestas del LLM se
+descartan antes de cada ejecución, así cada estrategia paga su inferencia; --con-cache
+usa la caché normal.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+DIR_EVALUACION = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIR_EVALUACION))
+
+CASOS_POR_DEFECTO = os.path.join(DIR_EVALUACION, 'casos.jsonl')
+
+# Tolerancia relativa por defecto al comparar con el valor esperado
+TOLERANCIA_RELATIVA = 0.005
+
+
+def cargar_casos(ruta=CASOS_POR_DEFECTO):
+    with open(ruta, encoding='utf-8') as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def texto_caso(caso):
+    if caso.get('texto'):
+        return caso['texto']
+    ruta = os.path.join(DIR_EVALUACION, caso.get('documento') or '')
+    if caso.get('documento') and os.path.exists(ruta):
+        with open(ruta, encoding='utf-8') as f:
+            return f.read()
+    return None
+
+
+def evaluable(caso):
+    return caso.get('esperado') is not None or caso.get('sin_dato', False)
+
+
+def es_real(caso):
+    """Caso tomado de una fuente real (url) y no un párrafo sintético"""
+    return bool(caso.get('url'))
+
+
+def es_correcto(caso, valor):
+    if caso.get('sin_dato'):
+        return valor is None
+    if valor is None:
+        return False
+    esperado = float(caso['esperado'])
+    tolerancia = caso.get('tolerancia')
+    if tolerancia is None:
+        tolerancia = max(0.01, abs(esperado) * TOLERANCIA_RELATIVA)
+    return abs(float(valor) - esperado) <= tolerancia
+
+
+class RegistroLLM:
+    """Envuelve llm.chat para contar tokens de prompt (prompt_eval_count o estimación) y llamadas"""
+
+    def __init__(self, llm, estimar_tokens, chat=None):
+        self._llm = llm
+        self._estimar_tokens = estimar_tokens
+        self._chat = chat or llm.chat
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.llamadas = 0
+        self.tokens_prompt = 0
+        self.modelos = []
+
+    def chat(self, model, messages, deadline=None, **kwargs):
+        respuesta = self._chat(model=model, messages=messages, deadline=deadline, **kwargs)
+        self.llamadas += 1
+        self.modelos.append(model)
+        self.tokens_prompt += respuesta.get('prompt_eval_count') or \
+            sum(self._estimar_tokens(m.get('content', '')) for m in messages)
+        return respuesta
+
+    def instalar(self):
+        self._llm.chat = self.chat
+
+
+class ModeloStub:
+    """
+    Sustituto de Ollama sin red ni GPU: responde con el mejor candidato regex del caso en
+    curso (el modelo rápido con confianza 6, el principal con 9). Sirve para probar el
+    arnés y medir tokens de prompt; su precisión es la de la estrategia regex.
+    """
+
+    def __init__(self, scraper):
+        self.scraper = scraper
+        self.caso = None
+        self.texto = None
+
+    def chat(self, model, messages, deadline=None, **kwargs):
+        candidatos = self.scraper.extraer_valores_fallback_regex(self.texto, self.caso['indicador'], self.caso['meta'])
+        if candidatos:
+            mejor = candidatos[0]
+            contenido = {
+                'valor_encontrado': mejor['valor'],
+                'año': mejor.get('año'),
+                'contexto': mejor.get('texto_raw', ''),
+                'confianza': 9 if model == self.scraper.model else 6,
+                'tipo_dato': mejor.get('tipo'),
+                'unidad': ''
+            }
+        else:
+            contenido = {'valor_encontrado': None, 'razon': 'stub: sin candidatos'}
+        return {'message': {'content': json.dumps(contenido)}}
+
+
+def estrategias(scraper):
+    """nombre -> función(texto, caso) que devuelve la lista de valores (el primero es el elegido)"""
+    return {
+        'regex': lambda texto, caso: scraper.extraer_valores_fallback_regex(texto, caso['indicador'], caso['meta']),
+        'llm_rapido': lambda texto, caso: scraper.extraer_con_ollama_inteligente(
+            texto, caso['indicador'], caso['meta'], model=scraper.modelo_rapido),
+        'llm_principal': lambda texto, caso: scraper.extraer_con_ollama_inteligente(
+            texto, caso['indicador'], caso['meta'], model=scraper.model),
+        'cascada': lambda texto, caso: scraper.extraer_en_cascada(texto, caso['indicador'], caso['meta'])[0],
+    }
+
+
+def evaluar_estrategia(funcion, casos, registro, stub=None, repeticiones=1, antes=None):
+    """Corre la estrategia en cada caso; `antes()` se llama antes de cada repetición (vaciar cachés)"""
+    detalle = []
+    for caso, texto in casos:
+        if stub is not None:
+            stub.caso, stub.texto = caso, texto
+        tiempos = []
+        for _ in range(repeticiones):
+            if antes is not None:
+                antes()
+            registro.reiniciar()
+            inicio = time.perf_counter()
+            try:
+                valores = funcion(texto, caso)
+                error = None
+            except Exception as e:
+                valores, error = [], str(e)
+            tiempos.append(time.perf_counter() - inicio)
+        valor = valores[0]['valor'] if valores else None
+        detalle.append({
+            'id': caso['id'],
+            'real': es_real(caso),
+            'valor': valor,
+            'esperado': caso.get('esperado'),
+            'correcto': es_correcto(caso, valor) if evaluable(caso) else None,
+            'segundos': round(statistics.median(tiempos), 4),
+            'tokens_prompt': registro.tokens_prompt,
+            'llamadas_llm': registro.llamadas,
+            'modelos': registro.modelos,
+            'nivel': valores[0].get('cascada') if valores else None,
+            'error': error
+        })
+    return detalle
+
+
+def resumir(detalle):
+    puntuados = [d for d in detalle if d['correcto'] is not None]
+    reales = [d for d in puntuados if d['real']]
+    segundos = sorted(d['segundos'] for d in detalle)
+    return {
+        'casos': len(detalle),
+        'puntuados': len(puntuados),
+        'puntuados_reales': len(reales),
+        'precision': round(sum(d['correcto'] for d in puntuados) / len(puntuados), 3) if puntuados else None,
+        'precision_reales': round(sum(d['correcto'] for d in reales) / len(reales), 3) if reales else None,
+        'cobertura': round(sum(d['valor'] is not None for d in detalle) / len(detalle), 3) if detalle else None,
+        'latencia_media_s': round(statistics.mean(segundos), 4) if segundos else None,
+        'latencia_p95_s': segundos[min(len(segundos) - 1, int(len(segundos) * 0.95))] if segundos else None,
+        'tokens_prompt_medios': round(statistics.mean(d['tokens_prompt'] for d in detalle), 1) if detalle else None,
+        'llamadas_llm': sum(d['llamadas_llm'] for d in detalle),
+        'errores': sum(1 for d in detalle if d['error'])
+    }
+
+
+def frontera_pareto(resumenes):
+    """Estrategias no dominadas en (precisión ↑, latencia media ↓, tokens de prompt ↓)"""
+    def ejes(r):
+        return (-(r['precision'] or 0.0), r['latencia_media_s'] or 0.0, r['tokens_prompt_medios'] or 0.0)
+
+    frontera = set()
+    for nombre, r in resumenes.items():
+        dominada = any(
+            all(a <= b for a, b in zip(ejes(otro), ejes(r))) and ejes(otro) != ejes(r)
+            for otro_nombre, otro in resumenes.items() if otro_nombre != nombre
+        )
+        if not dominada:
+            frontera.add(nombre)
+    return frontera
+
+
+def advertencia_sin_reales(resumenes):
+    """Texto de advertencia si ningún caso de fuente real puntúa (None si alguno puntúa)"""
+    if any(r['puntuados_reales'] for r in resumenes.values()):
+        return None
+    puntuados = max((r['puntuados'] for r in resumenes.values()), default=0)
+    return (f"Ningún caso de fuente real puntúa (sin documento capturado o sin 'esperado'): "
+            f"precisión y frontera de Pareto calculadas solo con {puntuados} casos sintéticos")
+
+
+def imprimir_reporte(resumenes, frontera):
+    print("\n" + "="*108)
+    print("📏 EVALUACIÓN DE EXTRACCIÓN - precisión vs. latencia")
+    print("="*108)
+    print(f"   {'estrategia':<16}{'precisión':>10}{'reales':>12}{'cobertura':>11}{'lat. media s':>14}{'p95 s':>9}"
+          f"{'tokens prompt':>15}{'llamadas':>10}{'pareto':>9}")
+    for nombre, r in resumenes.items():
+        precision = f"{r['precision']:.3f}" if r['precision'] is not None else '-'
+        reales = f"{r['precision_reales']:.3f} ({r['puntuados_reales']})" if r['puntuados_reales'] else '- (0)'
+        print(f"   {nombre:<16}{precision:>10}{reales:>12}{r['cobertura']:>11.3f}{r['latencia_media_s']:>14.3f}"
+              f"{r['latencia_p95_s']:>9.3f}{r['tokens_prompt_medios']:>15.0f}{r['llamadas_llm']:>10}"
+              f"{'★' if nombre in frontera else '':>9}")
+    print("="*108)
+    advertencia = advertencia_sin_reales(resumenes)
+    if advertencia:
+        print(f"   ⚠️ {advertencia}")
+    print()
+
+
+def capturar(casos, forzar=False):
+    """Descarga (vía el pipeline de ingesta) el texto de cada fuente real y lo guarda en documentos/"""
+    from scraper import DataScraper
+    scraper = DataScraper()
+    for caso in casos:
+        if not caso.get('url') or not caso.get('documento'):
+            continue
+        ruta = os.path.join(DIR_EVALUACION, caso['documento'])
+        if os.path.exists(ruta) and not forzar:
+            print(f"   ✓ {caso['id']}: ya capturado")
+            continue
+        try:
+            texto = scraper.obtener_texto_documento(caso['url'], forzar=forzar)
+        except Exception as exc:
+            print(f"   ❌ {caso['id']}: {exc}")
+            continue
+        if not texto:
+            print(f"   ❌ {caso['id']}: no se pudo obtener {caso['url']}")
+            continue
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write(texto)
+        print(f"   📥 {caso['id']}: {len(texto):,} caracteres")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('accion', nargs='?', choices=('evaluar', 'capturar'), default='evaluar')
+    parser.add_argument('--casos', default=CASOS_POR_DEFECTO)
+    parser.add_argument('--estrategias', help="Lista separada por comas (por defecto todas)")
+    parser.add_argument('--modelo-stub', action='store_true', help="No llama a Ollama (ver ModeloStub)")
+    parser.add_argument('--repeticiones', type=int, default=1, help="Se reporta la mediana de latencia por caso")
+    parser.add_argument('--con-cache', action='store_true', help="Reutiliza la caché de documentos y respuestas del LLM")
+    parser.add_argument('--forzar', action='store_true', help="capturar: vuelve a descargar aunque exista el archivo")
+    parser.add_argument('--json', help="Guarda resumen y detalle por caso en este archivo")
+    args = parser.parse_args()
+
+    casos = cargar_casos(args.casos)
+    if args.accion == 'capturar':
+        capturar(casos, forzar=args.forzar)
+        return
+
+    # Antes de importar el backend: almacen lee CACHE_DIR al importarse
+    if not args.con_cache:
+        os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix='evaluacion_')
+
+    import llm
+    from scraper import DataScraper
+    from almacen import almacen
+    from compactacion import estimar_tokens
+
+    scraper = DataScraper()
+    stub = ModeloStub(scraper) if args.modelo_stub else None
+    registro = RegistroLLM(llm, estimar_tokens, chat=stub.chat if stub else None)
+    registro.instalar()
+
+    disponibles = estrategias(scraper)
+    nombres = args.estrategias.split(',') if args.estrategias else list(disponibles)
+    desconocidas = [n for n in nombres if n not in disponibles]
+    if desconocidas:
+        parser.error(f"Estrategias desconocidas: {desconocidas} (disponibles: {', '.join(disponibles)})")
+
+    con_texto = []
+    for caso in casos:
+        texto = texto_caso(caso)
+        if texto is None:
+            print(f"   ∅ {caso['id']}: sin documento (ejecute 'capturar')")
+        else:
+            con_texto.append((caso, texto))
+    sin_esperado = [c['id'] for c, _ in con_texto if not evaluable(c)]
+    if sin_esperado:
+        print(f"   ⚠️ Sin 'esperado' (no puntúan): {', '.join(sin_esperado)}")
+
+    # Cada ejecución paga su inferencia: sin respuestas del LLM de estrategias o repeticiones previas
+    antes = None if args.con_cache else (lambda: almacen.vaciar('llm_extraccion'))
+    detalles, resumenes = {}, {}
+    for nombre in nombres:
+        print(f"\n▶️ {nombre}: {len(con_texto)} casos")
+        detalles[nombre] = evaluar_estrategia(
+            disponibles[nombre], con_texto, registro, stub, max(1, args.repeticiones), antes=antes
+        )
+        resumenes[nombre] = resumir(detalles[nombre])
+
+    frontera = frontera_pareto(resumenes)
+    imprimir_reporte(resumenes, frontera)
+    for nombre, detalle in detalles.items():
+        fallidos = [d['id'] for d in detalle if d['correcto'] is False]
+        if fallidos:
+            print(f"   ✗ {nombre}: {', '.join(fallidos)}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'modelo_stub': args.modelo_stub,
+                'advertencia': advertencia_sin_reales(resumenes),
+                'resumen': resumenes,
+                'pareto': sorted(frontera),
+                'detalle': detalles
+            }, f, ensure_ascii=False, indent=2, default=str)
+        print(f"\n💾 Reporte: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
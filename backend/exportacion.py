@@ -0,0 +1,204 @@
+import io
+import csv
+import json
+
+FORMATOS_EXPORTACION = ('xlsx', 'csv', 'parquet')
+
+TIPOS_MIME = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+# Fila original del plan + claves del resultado de analizar_indicador (y de resultado_fallido)
+COLUMNAS = [
+    'fila', 'Eje', 'Indicador', 'Meta',
+    'valor_inicial', 'valor_actual', 'fecha_actualizacion', 'progreso', 'estado', 'eficiencia',
+    'analisis', 'tipo_indicador', 'direccion', 'unidad', 'narrativa', 'narrativa_id', 'fuente',
+    'timeout', 'parcial'
+]
+
+# Filas por row group de Parquet (memoria acotada a este lote)
+FILAS_POR_GRUPO_PARQUET = 500
+
+# Textos que una hoja de cálculo tomaría como fórmula (inyección de fórmulas en CSV/XLSX)
+PREFIJOS_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def fila_exportable(indice, fila_original, resultado):
+    """Dict con exactamente COLUMNAS; la fila original manda sobre los textos del resultado"""
+    fila_original = fila_original or {}
+    fila = {
+        'fila': indice,
+        'Eje': fila_original.get('Eje', resultado.get('eje')),
+        'Indicador': fila_original.get('Indicador', resultado.get('indicador')),
+        'Meta': fila_original.get('Meta', resultado.get('meta')),
+    }
+    for columna in COLUMNAS[4:]:
+        valor = resultado.get(columna)
+        # Listas/dicts (p. ej. datos de fuentes) como JSON en una celda
+        fila[columna] = json.dumps(valor, ensure_ascii=False, default=str) if isinstance(valor, (dict, list)) else valor
+    return fila
+
+
+def _es_formula(valor):
+    return isinstance(valor, str) and valor.startswith(PREFIJOS_FORMULA)
+
+
+class _EscritorCSV:
+    """Los textos que empiezan como fórmula se escriben con un apóstrofo delante"""
+
+    def __init__(self, destino):
+        self._propio = isinstance(destino, str)
+        self._archivo = open(destino, 'w', encoding='utf-8', newline='') if self._propio else destino
+        self._csv = csv.DictWriter(self._archivo, fieldnames=COLUMNAS)
+        self._csv.writeheader()
+
+    def escribir(self, fila):
+        self._csv.writerow({c: "'" + v if _es_formula(v) else v for c, v in fila.items()})
+
+    def cerrar(self):
+        if self._propio:
+            self._archivo.close()
+
+
+class _EscritorXLSX:
+    """
+    openpyxl en modo write-only: las filas van a disco al escribirse, no quedan en memoria.
+    Los textos que empiezan como fórmula se guardan como celdas de texto
+    """
+
+    def __init__(self, destino):
+        from openpyxl import Workbook
+        self._destino = destino
+        self._libro = Workbook(write_only=True)
+        self._hoja = self._libro.create_sheet('Resultados')
+        self._hoja.append(COLUMNAS)
+
+    def escribir(self, fila):
+        self._hoja.append([self._celda(fila[c]) for c in COLUMNAS])
+
+    def _celda(self, valor):
+        if not _es_formula(valor):
+            return valor
+        from openpyxl.cell import WriteOnlyCell
+        celda = WriteOnlyCell(self._hoja, value=valor)
+        celda.data_type = 's'
+        return celda
+
+    def cerrar(self):
+        self._libro.save(self._destino)
+
+
+class _EscritorParquet:
+    """Row groups de FILAS_POR_GRUPO_PARQUET filas; columnas mixtas como texto"""
+
+    def __init__(self, destino):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("La exportación a Parquet requiere pyarrow (pip install pyarrow)")
+        self._pa = pa
+        tipos = {'fila': pa.int64(), 'progreso': pa.float64(), 'timeout': pa.bool_(), 'parcial': pa.bool_()}
+        self._esquema = pa.schema([pa.field(c, tipos.get(c, pa.string())) for c in COLUMNAS])
+        self._escritor = pq.ParquetWriter(destino, self._esquema)
+        self._pendientes = []
+
+    def _convertir(self, fila):
+        convertida = {}
+        for columna in COLUMNAS:
+            valor = fila[columna]
+            if columna in ('timeout', 'parcial'):
+                convertida[columna] = bool(valor)
+            elif columna == 'progreso':
+                try:
+                    convertida[columna] = float(valor)
+                except (TypeError, ValueError):
+                    convertida[columna] = None
+            elif columna == 'fila':
+                convertida[columna] = valor
+            else:
+                convertida[columna] = None if valor is None else str(valor)
+        return convertida
+
+    def escribir(self, fila):
+        self._pendientes.append(self._convertir(fila))
+        if len(self._pendientes) >= FILAS_POR_GRUPO_PARQUET:
+            self._vaciar()
+
+    def _vaciar(self):
+        if self._pendientes:
+            self._escritor.write_table(self._pa.Table.from_pylist(self._pendientes, schema=self._esquema))
+            self._pendientes = []
+
+    def cerrar(self):
+        self._vaciar()
+        self._escritor.close()
+
+
+_ESCRITORES = {'csv': _EscritorCSV, 'xlsx': _EscritorXLSX, 'parquet': _EscritorParquet}
+
+
+def abrir_escritor(formato, destino):
+    """Escritor incremental: .escribir(fila_exportable) por cada resultado y .cerrar() al final"""
+    if formato not in _ESCRITORES:
+        raise ValueError(f"Formato de exportación inválido: {formato} (use {'|'.join(FORMATOS_EXPORTACION)})")
+    return _ESCRITORES[formato](destino)
+
+
+def exportar_resultados(resultados, destino, formato):
+    """
+    Escribe (indice, fila_original, resultado) a medida que llegan (cualquier iterable,
+    p. ej. un generador que produce indicadores al completarse). Devuelve las filas escritas.
+    """
+    escritor = abrir_escritor(formato, destino)
+    n = 0
+    try:
+        for indice, fila_original, resultado in resultados:
+            escritor.escribir(fila_exportable(indice, fila_original, resultado))
+            n += 1
+    finally:
+        escritor.cerrar()
+    return n
+
+
+def leer_jsonl(ruta):
+    """
+    (fila, None, resultado) de una salida de lote.py en orden de fila; si una fila se
+    repite vale la última. En memoria solo se guardan los desplazamientos de cada línea.
+    """
+    desplazamientos = {}
+    with open(ruta, 'rb') as f:
+        posicion = 0
+        for linea in f:
+            try:
+                desplazamientos[json.loads(linea)['fila']] = posicion
+            except (json.JSONDecodeError, KeyError):
+                pass
+            posicion += len(linea)
+        for fila in sorted(desplazamientos):
+            f.seek(desplazamientos[fila])
+            yield fila, None, json.loads(f.readline())['resultado']
+
+
+class FlujoCSV:
+    """CSV como flujo de bytes fila a fila (respuestas HTTP en streaming)"""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._escritor = _EscritorCSV(self._buffer)
+
+    def _extraer(self):
+        datos = self._buffer.getvalue().encode('utf-8')
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return datos
+
+    def cabecera(self):
+        # BOM para que Excel detecte UTF-8 al abrir el CSV
+        return '\ufeff'.encode('utf-8') + self._extraer()
+
+    def fila(self, indice, fila_original, resultado):
+        self._escritor.escribir(fila_exportable(indice, fila_original, resultado))
+        return self._extraer()
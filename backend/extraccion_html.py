@@ -0,0 +1,167 @@
+import os
+
+from lxml import etree, html
+
+from metricas import metricas
+
+# Leer solo la región de contenido principal (<main>, <article>, #content...) cuando exista
+HTML_SOLO_PRINCIPAL = os.getenv('HTML_SOLO_PRINCIPAL', '0') == '1'
+
+# La región principal debe tener al menos esta fracción del texto de <body>;
+# si no, se usa la página completa (evita quedarse con un <article> de 2 líneas)
+MIN_FRACCION_PRINCIPAL = 0.2
+
+# <form> no se poda: los portales ASP.NET envuelven toda la página en uno
+_ETIQUETAS_RUIDO = (
+    'script', 'style', 'noscript', 'template', 'iframe', 'svg', 'canvas',
+    'nav', 'footer', 'header', 'aside', 'button', 'select'
+)
+
+# Menús, migas de pan, avisos de cookies, redes sociales, barras laterales...
+# Se compara cada clase/id completo (separados por espacios): una parte de un nombre
+# compuesto no basta ('layout-with-sidebar' envuelve toda la página, 'pie-chart' es un gráfico)
+_CLASES_RUIDO = frozenset((
+    'menu', 'navbar', 'breadcrumb', 'breadcrumbs', 'migas', 'cookie', 'cookies', 'sidebar',
+    'social', 'share', 'compartir', 'footer', 'pie', 'banner', 'modal', 'popup',
+    'main-menu', 'nav-menu', 'menu-principal', 'cookie-banner', 'cookie-notice', 'cookie-consent',
+    'social-share', 'share-buttons', 'site-footer', 'site-header', 'top-bar', 'topbar'
+))
+# Solo se examinan elementos con atributos relevantes (la poda por regex en XPath es lenta)
+_XPATH_CANDIDATOS_RUIDO = etree.XPath(".//*[@id or @class or @style or @hidden or @aria-hidden or @role]")
+_ROLES_RUIDO = frozenset(('navigation', 'banner', 'contentinfo'))
+# Un elemento marcado como ruido no se poda si contiene contenido
+_XPATH_CONTENIDO = etree.XPath("self::main | self::article | self::table | .//main | .//article | .//table")
+MAX_FRACCION_PODA = 0.5
+
+
+def _es_ruido(elemento):
+    atributos = elemento.attrib
+    if 'hidden' in atributos or atributos.get('aria-hidden') == 'true':
+        return True
+    if atributos.get('role') in _ROLES_RUIDO:
+        return True
+    if 'display:none' in atributos.get('style', '').replace(' ', ''):
+        return True
+    nombres = f"{atributos.get('id', '')} {atributos.get('class', '')}".lower().split()
+    return any(nombre in _CLASES_RUIDO for nombre in nombres)
+
+
+def _contiene_contenido(elemento, total):
+    """<main>/<article>/<table> dentro, o la mayor parte del texto de la página"""
+    if _XPATH_CONTENIDO(elemento):
+        return True
+    return len(elemento.text_content()) > MAX_FRACCION_PODA * total
+
+
+_XPATH_PRINCIPAL = etree.XPath(
+    ".//main | .//article | .//*[@role='main'] | .//*[@id='content' or @id='contenido' "
+    "or @id='main' or @id='main-content']"
+)
+
+# Tablas de datos = las que no contienen otras tablas; las de maquetación
+# (portales antiguos) se leen como bloques normales
+_XPATH_TABLAS = etree.XPath(".//table[not(.//table)]")
+
+_ETIQUETAS_BLOQUE = frozenset((
+    'p', 'div', 'section', 'article', 'main', 'li', 'ul', 'ol', 'dl', 'dt', 'dd',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'br', 'tr', 'td', 'th', 'table', 'pre', 'blockquote',
+    'caption', 'figcaption', 'address', 'hr', 'body'
+))
+
+
+def _texto_plano(elemento):
+    return ' '.join(elemento.text_content().split())
+
+
+def filas_de_tabla(tabla):
+    """Filas de un <table> como listas de celdas (texto normalizado, sin filas vacías)"""
+    filas = []
+    for tr in tabla.iter('tr'):
+        celdas = [_texto_plano(c) for c in tr if c.tag in ('td', 'th')]
+        if any(celdas):
+            filas.append(celdas)
+    return filas
+
+
+def _parsear(contenido):
+    if not contenido:
+        return None
+    try:
+        parser = html.HTMLParser(remove_comments=True, remove_pis=True)
+        return html.document_fromstring(contenido, parser=parser)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def _podar(raiz):
+    etree.strip_elements(raiz, *_ETIQUETAS_RUIDO, with_tail=False)
+    total = len(raiz.text_content())
+    for elemento in _XPATH_CANDIDATOS_RUIDO(raiz):
+        # <html>/<body> con clases genéricas no se eliminan; tampoco un contenedor
+        # con el contenido (atributos engañosos no deben vaciar la página)
+        if elemento.tag not in ('html', 'body') and elemento.getparent() is not None \
+                and _es_ruido(elemento) and not _contiene_contenido(elemento, total):
+            elemento.drop_tree()
+
+
+def _region_principal(raiz):
+    """Candidato de contenido principal con más texto, si es representativo de la página"""
+    candidatos = _XPATH_PRINCIPAL(raiz)
+    if not candidatos:
+        return raiz
+    mejor = max(candidatos, key=lambda e: len(e.text_content()))
+    total = len(raiz.text_content()) or 1
+    return mejor if len(mejor.text_content()) / total >= MIN_FRACCION_PRINCIPAL else raiz
+
+
+def _texto_por_bloques(raiz):
+    """Texto visible con un salto de línea por bloque; elementos en línea no cortan la frase"""
+    for elemento in raiz.iter(tag=etree.Element):
+        if elemento.tag in _ETIQUETAS_BLOQUE:
+            elemento.tail = '\n' + (elemento.tail or '')
+            if elemento.tag != 'br':
+                elemento.text = '\n' + (elemento.text or '')
+    lineas = (' '.join(l.split()) for l in raiz.text_content().splitlines())
+    return '\n'.join(l for l in lineas if l)
+
+
+def extraer_html(contenido, solo_principal=None):
+    """
+    Texto visible y tablas de una página HTML (bytes o str), parseada con lxml.
+    - Se poda el boilerplate (script/style/nav/footer, menús, cookies, ocultos).
+    - Cada <table> se devuelve como filas de celdas y, en el texto, como líneas
+      'celda | celda | celda' (el mismo formato que deja la compactación de PDFs).
+    - Con solo_principal se lee solo <main>/<article>/#content si existe.
+    Devuelve {'texto': str, 'tablas': [[[celda, ...], ...], ...]}.
+    """
+    if solo_principal is None:
+        solo_principal = HTML_SOLO_PRINCIPAL
+
+    with metricas.cronometro('extraccion_html'):
+        raiz = _parsear(contenido)
+        if raiz is None:
+            return {'texto': '', 'tablas': []}
+
+        _podar(raiz)
+        if solo_principal:
+            raiz = _region_principal(raiz)
+
+        tablas = []
+        for tabla in _XPATH_TABLAS(raiz):
+            filas = filas_de_tabla(tabla)
+            if filas:
+                tablas.append(filas)
+            # La tabla se sustituye por sus filas ya aplanadas
+            reemplazo = etree.Element('pre')
+            reemplazo.text = '\n'.join(' | '.join(fila) for fila in filas)
+            reemplazo.tail = tabla.tail
+            tabla.getparent().replace(tabla, reemplazo)
+
+        texto = _texto_por_bloques(raiz)
+
+    metricas.incrementar('html_tablas_extraidas', len(tablas))
+    return {'texto': texto, 'tablas': tablas}
+
+
+def texto_de_html(contenido, solo_principal=None):
+    return extraer_html(contenido, solo_principal)['texto']
@@ -0,0 +1,186 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+import unicodedata
+
+from almacen import CACHE_DIR
+from compactacion import SEPARADOR_PAGINA
+from metricas import metricas
+
+# Párrafos largos (p. ej. páginas sin líneas en blanco) se parten en trozos de este tamaño
+MAX_CHARS_PARRAFO = 1200
+CHARS_FRAGMENTO = 240
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    url TEXT PRIMARY KEY,
+    actualizado REAL NOT NULL,
+    paginas INTEGER NOT NULL,
+    caracteres INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS parrafos USING fts5(
+    plegado,
+    texto UNINDEXED,
+    url UNINDEXED,
+    pagina UNINDEXED,
+    parrafo UNINDEXED,
+    tokenize = 'unicode61'
+);
+"""
+
+# Cifras como '12,81' o '1.098,34' se buscan como frase de tokens consecutivos
+_RE_TERMINO = re.compile(r'\d+(?:[.,]\d+)*|\w+')
+
+
+def quitar_tildes(texto):
+    """Plegado de acentos (misma regla que usa el scraper para identificar fuentes)"""
+    if not isinstance(texto, str): return texto
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+
+def plegar(texto):
+    return quitar_tildes(texto.lower())
+
+
+def _partir_pagina(pagina):
+    """
+    Párrafos (separados por líneas en blanco) conservando sus separadores, de modo
+    que ''.join(partes) == pagina. Los muy largos se parten por líneas.
+    """
+    partes = []
+    for parrafo in re.split(r'(?<=\n\n)', pagina):
+        if len(parrafo) <= MAX_CHARS_PARRAFO:
+            partes.append(parrafo)
+            continue
+        actual = ''
+        for linea in parrafo.splitlines(keepends=True):
+            if actual and len(actual) + len(linea) > MAX_CHARS_PARRAFO:
+                partes.append(actual)
+                actual = ''
+            actual += linea
+        if actual:
+            partes.append(actual)
+    return [p for p in partes if p]
+
+
+class IndiceDocumentos:
+    """
+    Índice invertido persistente (SQLite FTS5) de todo documento ingerido,
+    a nivel de página y párrafo. El texto indexado se pliega igual que
+    quitar_tildes, así 'poblacion' encuentra 'población'.
+    También sirve como almacén local: el scraper lo consulta antes de ir a la red.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or os.path.join(CACHE_DIR, 'indice.db')
+        self._local = threading.local()
+
+    def _conexion(self):
+        con = getattr(self._local, 'con', None)
+        if con is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(_ESQUEMA)
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def indexar_documento(self, url, texto):
+        """(Re)indexa el documento completo. Las páginas vienen separadas por SEPARADOR_PAGINA"""
+        if not texto:
+            return 0
+        inicio = time.perf_counter()
+        filas = []
+        paginas = texto.split(SEPARADOR_PAGINA)
+        for num_pagina, pagina in enumerate(paginas, 1):
+            for num_parrafo, parrafo in enumerate(_partir_pagina(pagina), 1):
+                filas.append((plegar(parrafo), parrafo, url, num_pagina, num_parrafo))
+
+        con = self._conexion()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute("DELETE FROM parrafos WHERE url = ?", (url,))
+            con.executemany(
+                "INSERT INTO parrafos (plegado, texto, url, pagina, parrafo) VALUES (?, ?, ?, ?, ?)", filas
+            )
+            con.execute(
+                "INSERT OR REPLACE INTO documentos (url, actualizado, paginas, caracteres) VALUES (?, ?, ?, ?)",
+                (url, time.time(), len(paginas), len(texto))
+            )
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+        metricas.registrar_tiempo('indexacion', time.perf_counter() - inicio)
+        metricas.incrementar('indice_parrafos_indexados', len(filas))
+        return len(filas)
+
+    def info_documento(self, url):
+        fila = self._conexion().execute(
+            "SELECT actualizado, paginas, caracteres FROM documentos WHERE url = ?", (url,)
+        ).fetchone()
+        if fila is None:
+            return None
+        return {'url': url, 'actualizado': fila[0], 'paginas': fila[1], 'caracteres': fila[2]}
+
+    def renovar(self, url):
+        """Marca el documento como vigente sin reindexarlo (la fuente no cambió)"""
+        self._conexion().execute("UPDATE documentos SET actualizado = ? WHERE url = ?", (time.time(), url))
+
+    def texto_documento(self, url, max_edad=None):
+        """Texto original reconstruido desde el índice (None si no está o es más viejo que max_edad)"""
+        info = self.info_documento(url)
+        if info is None or (max_edad is not None and time.time() - info['actualizado'] > max_edad):
+            return None
+        filas = self._conexion().execute(
+            "SELECT pagina, texto FROM parrafos WHERE url = ? ORDER BY pagina, parrafo", (url,)
+        ).fetchall()
+        paginas = {}
+        for pagina, texto in filas:
+            paginas.setdefault(pagina, []).append(texto)
+        return SEPARADOR_PAGINA.join(''.join(paginas.get(p, [])) for p in range(1, info['paginas'] + 1))
+
+    def _fragmento(self, texto, plegado, terminos):
+        """Ventana de texto alrededor del primer término encontrado"""
+        pos = min((p for p in (plegado.find(t) for t in terminos) if p >= 0), default=0)
+        # El plegado conserva la longitud en textos NFC; si no, se usa el texto plegado
+        base = texto if len(texto) == len(plegado) else plegado
+        inicio = max(0, pos - CHARS_FRAGMENTO // 2)
+        fragmento = ' '.join(base[inicio:inicio + CHARS_FRAGMENTO].split())
+        return ('…' if inicio else '') + fragmento + ('…' if inicio + CHARS_FRAGMENTO < len(base) else '')
+
+    def buscar(self, consulta, limite=20, url=None):
+        """Párrafos que contienen todos los términos, ordenados por BM25"""
+        terminos = _RE_TERMINO.findall(plegar(consulta or ''))
+        if not terminos:
+            return []
+        expresion = ' '.join('"' + re.sub(r'[.,]', ' ', t) + '"' for t in terminos)
+        sql = ("SELECT url, pagina, parrafo, texto, plegado, bm25(parrafos) AS puntaje "
+               "FROM parrafos WHERE parrafos MATCH ?")
+        parametros = [expresion]
+        if url:
+            sql += " AND url = ?"
+            parametros.append(url)
+        sql += " ORDER BY puntaje LIMIT ?"
+        parametros.append(limite)
+
+        inicio = time.perf_counter()
+        filas = self._conexion().execute(sql, parametros).fetchall()
+        metricas.registrar_tiempo('busqueda_indice', time.perf_counter() - inicio)
+        return [
+            {
+                'url': fila[0],
+                'pagina': fila[1],
+                'parrafo': fila[2],
+                'fragmento': self._fragmento(fila[3], fila[4], terminos),
+                'puntaje': round(-fila[5], 4)
+            }
+            for fila in filas
+        ]
+
+
+indice = IndiceDocumentos()
@@ -0,0 +1,216 @@
+import re
+import hashlib
+import threading
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+from metricas import metricas
+
+# Una sola pasada sobre el documento buscando números; el sufijo (y, si hace falta,
+# el prefijo) de unidad se comprueba anclado junto a cada número
+_RE_NUMERO = re.compile(r'(?<![\d.,])\d+(?:[.,]\d+)*')
+_RE_SUFIJO = re.compile(
+    r'\s*(?:%|(?:por\s+cada|cada)\s*100(?:[.,]?000)?|millones?(?:\s*(?:de\s+)?USD)?|casos|personas|hogares)',
+    re.IGNORECASE
+)
+_RE_PREFIJO = re.compile(
+    r'(?:USD\s*|tasa\s+(?:de\s+)?(?:mortalidad|siniestros|accidentes)\s+(?:fue|es)?\s*)$',
+    re.IGNORECASE
+)
+MAX_CHARS_PREFIJO = 60
+
+_RE_AÑO = re.compile(r'202[0-5]')
+
+# Filas de una tabla linealizada que se suben buscando el encabezado con los años
+MAX_FILAS_ENCABEZADO = 10
+
+# Documentos recientes cuyo índice se reutiliza (el mismo boletín sirve a varios indicadores).
+# La caché guarda solo tokens y posiciones, no el texto, y se acota por tokens guardados
+MAX_INDICES_CACHE = 16
+MAX_TOKENS_CACHE = 200000
+
+TokenNumerico = namedtuple('TokenNumerico', 'valor inicio fin unidad texto_raw')
+
+
+def a_numero(texto):
+    """Convención del scraper: '.' como separador de miles y ',' como decimal"""
+    return float(texto.replace('.', '').replace(',', '.'))
+
+
+def _unidad(prefijo, numero, sufijo):
+    """Unidad del token según su prefijo/sufijo (mismas reglas que los patrones regex previos)"""
+    prefijo = (prefijo or '').lower()
+    sufijo = ' '.join((sufijo or '').lower().split())
+    decimal = ',' in numero or '.' in numero
+    if sufijo.startswith('millon'):
+        if prefijo.startswith('usd') or sufijo.endswith('usd'):
+            return 'monetario'
+        return None
+    # El resto de unidades exige parte decimal, como antes
+    if not decimal:
+        return None
+    if sufijo == '%':
+        return 'porcentaje'
+    if 'cada' in sufijo or prefijo.startswith('tasa'):
+        return 'tasa_por_100k'
+    if sufijo in ('casos', 'personas', 'hogares'):
+        return 'absoluto'
+    return None
+
+
+def _minusculas_alineadas(texto):
+    """texto.lower() con las mismas posiciones que el original"""
+    minusculas = texto.lower()
+    if len(minusculas) == len(texto):
+        return minusculas
+    return ''.join(c.lower() if len(c.lower()) == 1 else c for c in texto)
+
+
+def _tokenizar(texto):
+    """(tokens por unidad, posiciones de años) del texto, en una sola pasada"""
+    por_unidad = {}
+    for match in _RE_NUMERO.finditer(texto):
+        numero = match.group(0)
+        sufijo = _RE_SUFIJO.match(texto, match.end())
+        # El prefijo solo decide la unidad de montos en millones y de tasas sin sufijo
+        prefijo = None
+        if (sufijo is None and ('.' in numero or ',' in numero)) or \
+           (sufijo is not None and sufijo.group(0).lstrip()[:1] in 'mM'):
+            prefijo = _RE_PREFIJO.search(texto, max(0, match.start() - MAX_CHARS_PREFIJO), match.start())
+        unidad = _unidad(prefijo and prefijo.group(0), numero, sufijo and sufijo.group(0))
+        if unidad is None:
+            continue
+        try:
+            valor = a_numero(numero)
+        except ValueError:
+            continue
+        inicio = prefijo.start() if prefijo else match.start()
+        fin = sufijo.end() if sufijo else match.end()
+        por_unidad.setdefault(unidad, []).append(
+            TokenNumerico(valor, inicio, fin, unidad, texto[inicio:fin])
+        )
+    return por_unidad, [m.start() for m in _RE_AÑO.finditer(texto)]
+
+
+class IndiceNumerico:
+    """
+    Tokens numéricos de un documento (valor, posición, unidad) construidos en
+    una sola pasada, más las posiciones de años y de palabras clave para
+    consultar en O(log n) el año más cercano y la proximidad de palabras.
+    `tokenizado`: (por_unidad, posiciones_año) ya calculados para este mismo texto.
+    """
+
+    def __init__(self, texto, tokenizado=None):
+        self.texto = texto
+        self._minusculas = None
+        self._palabras = {}
+        self.por_unidad, self.posiciones_año = tokenizado or _tokenizar(texto)
+
+    def tokens(self, unidad):
+        return self.por_unidad.get(unidad, [])
+
+    def ventana(self, token, radio=300):
+        return max(0, token.inicio - radio), min(len(self.texto), token.fin + radio)
+
+    def contexto(self, token, radio=300):
+        inicio, fin = self.ventana(token, radio)
+        return self.texto[inicio:fin]
+
+    def _año_de_columna(self, token, max_filas=MAX_FILAS_ENCABEZADO):
+        """
+        Si el token es una celda de una fila 'a | b | c' (tablas linealizadas), el año
+        del encabezado de su columna en las filas de arriba; None si no hay
+        """
+        texto = self.texto
+        inicio_linea = texto.rfind('\n', 0, token.inicio) + 1
+        fin_linea = texto.find('\n', token.fin)
+        fin_linea = len(texto) if fin_linea < 0 else fin_linea
+        if '|' not in texto[inicio_linea:fin_linea]:
+            return None
+        columna = texto.count('|', inicio_linea, token.inicio)
+        fin = inicio_linea - 1
+        for _ in range(max_filas):
+            if fin < 0:
+                break
+            inicio = texto.rfind('\n', 0, fin) + 1
+            celdas = texto[inicio:fin].split('|')
+            if len(celdas) < 2:
+                break
+            if columna < len(celdas) and _RE_AÑO.fullmatch(celdas[columna].strip()):
+                return int(celdas[columna].strip())
+            fin = inicio - 1
+        return None
+
+    def año_cercano(self, token, radio=300):
+        """
+        Año (2020-2025) del token: el de su columna si está en una tabla, si no el más
+        cercano dentro de la ventana, o None
+        """
+        año = self._año_de_columna(token)
+        if año is not None:
+            return año
+        inicio, fin = self.ventana(token, radio)
+        posiciones = self.posiciones_año
+        i = bisect_left(posiciones, token.inicio)
+        mejor = None
+        for j in (i - 1, i):
+            if 0 <= j < len(posiciones) and inicio <= posiciones[j] and posiciones[j] + 4 <= fin:
+                distancia = abs(posiciones[j] - token.inicio)
+                if mejor is None or distancia < mejor[0]:
+                    mejor = (distancia, posiciones[j])
+        return int(self.texto[mejor[1]:mejor[1] + 4]) if mejor else None
+
+    def _posiciones_palabra(self, palabra):
+        posiciones = self._palabras.get(palabra)
+        if posiciones is None:
+            if self._minusculas is None:
+                self._minusculas = _minusculas_alineadas(self.texto)
+            posiciones = []
+            pos = self._minusculas.find(palabra)
+            while pos >= 0:
+                posiciones.append(pos)
+                pos = self._minusculas.find(palabra, pos + 1)
+            self._palabras[palabra] = posiciones
+        return posiciones
+
+    def palabras_cercanas(self, token, palabras, radio=300):
+        """Cuántas de `palabras` (en minúsculas) aparecen dentro de la ventana del token"""
+        inicio, fin = self.ventana(token, radio)
+        cercanas = 0
+        for palabra in palabras:
+            posiciones = self._posiciones_palabra(palabra)
+            i = bisect_left(posiciones, inicio)
+            if i < len(posiciones) and posiciones[i] + len(palabra) <= fin:
+                cercanas += 1
+        return cercanas
+
+
+_cache = OrderedDict()          # huella del texto -> (por_unidad, posiciones_año, n_tokens)
+_cache_lock = threading.Lock()
+_tokens_en_cache = 0
+
+
+def indice_numerico(texto):
+    """
+    Índice del texto. La tokenización se reutiliza si el mismo documento se consultó
+    hace poco; el índice devuelto usa el texto del llamador (la caché no lo retiene).
+    """
+    global _tokens_en_cache
+    clave = hashlib.blake2b(texto.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+    with _cache_lock:
+        entrada = _cache.get(clave)
+        if entrada is not None:
+            _cache.move_to_end(clave)
+            metricas.incrementar('indice_numerico_reutilizado')
+            return IndiceNumerico(texto, entrada[:2])
+
+    with metricas.cronometro('indice_numerico'):
+        indice = IndiceNumerico(texto)
+    n_tokens = sum(len(t) for t in indice.por_unidad.values()) + len(indice.posiciones_año)
+    with _cache_lock:
+        if clave not in _cache and n_tokens <= MAX_TOKENS_CACHE:
+            _cache[clave] = (indice.por_unidad, indice.posiciones_año, n_tokens)
+            _tokens_en_cache += n_tokens
+        while _cache and (len(_cache) > MAX_INDICES_CACHE or _tokens_en_cache > MAX_TOKENS_CACHE):
+            _tokens_en_cache -= _cache.popitem(last=False)[1][2]
+    return indice
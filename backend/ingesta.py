@@ -0,0 +1,265 @@
+import os
+import time
+import tempfile
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from deadline import timeout_de
+from metricas import metricas
+from concurrencia import controlador_analisis
+from compactacion import SEPARADOR_PAGINA
+from perfilado import propagar
+
+# requests y pdfplumber se importan al primer uso: importar el módulo (y app.py)
+# no los carga (ver benchmarks/bench_arranque.py)
+
+# Límites de ingesta por documento (configurables por entorno)
+try:
+    INGESTA_MAX_BYTES = int(os.getenv('INGESTA_MAX_BYTES', str(50 * 1024 * 1024)))
+except ValueError:
+    INGESTA_MAX_BYTES = 50 * 1024 * 1024
+
+try:
+    INGESTA_MAX_PAGINAS = int(os.getenv('INGESTA_MAX_PAGINAS', '200'))
+except ValueError:
+    INGESTA_MAX_PAGINAS = 200
+
+# Tope del texto de un PDF que vuelve del archivo de desborde a memoria: acota lo que
+# cada worker retiene por documento (el resto de las páginas se descarta)
+try:
+    INGESTA_MAX_CARACTERES = int(os.getenv('INGESTA_MAX_CARACTERES', str(5 * 1000 * 1000)))
+except ValueError:
+    INGESTA_MAX_CARACTERES = 5 * 1000 * 1000
+
+CHUNK_BYTES = 64 * 1024
+
+# Señal de lectura de PDF para el control de concurrencia: segundos por mil caracteres
+# extraídos, por documento. Por página no sirve (una página casi en blanco fija una base
+# diminuta); con poco texto el fijo por página domina y tampoco, así que no se observa
+MIN_CARACTERES_SENAL_PDF = 5000
+
+# Solicitudes cubiertas (hedged): si un host tarda más que su p95 habitual en
+# responder, se lanza una segunda solicitud y se usa la primera que llegue
+INGESTA_COBERTURA = os.getenv('INGESTA_COBERTURA', '0') == '1'
+MIN_MUESTRAS_COBERTURA = 20
+_latencias_host = {}
+_latencias_lock = threading.Lock()
+_pool_cobertura = ThreadPoolExecutor(max_workers=8, thread_name_prefix='cobertura')
+
+
+class DocumentoDemasiadoGrande(Exception):
+    """El documento supera INGESTA_MAX_BYTES"""
+
+
+def _registrar_pico(bytes_en_memoria):
+    """
+    Marca de agua estimada de lo que retiene la ingesta en el hilo actual, calculada
+    con el largo de los bytes/textos que mantiene (no es memoria medida: para eso,
+    el modo memoria de perfilado.py)
+    """
+    metricas.registrar_maximo('ingesta_pico_estimado_bytes_por_worker', threading.current_thread().name, bytes_en_memoria)
+
+
+def _validar_tamano(resp, max_bytes):
+    longitud = resp.headers.get('Content-Length')
+    if longitud and longitud.isdigit() and int(longitud) > max_bytes:
+        raise DocumentoDemasiadoGrande(f"{int(longitud):,} bytes > límite {max_bytes:,}")
+
+
+def _registrar_latencia(host, segundos):
+    with _latencias_lock:
+        _latencias_host.setdefault(host, deque(maxlen=100)).append(segundos)
+
+
+def p95_host(host):
+    """Percentil 95 del tiempo hasta la respuesta del host (None si hay pocas muestras)"""
+    with _latencias_lock:
+        muestras = sorted(_latencias_host.get(host, ()))
+    if len(muestras) < MIN_MUESTRAS_COBERTURA:
+        return None
+    return muestras[int(0.95 * (len(muestras) - 1))]
+
+
+def _cerrar_si_sobra(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _abrir(url, headers, timeout, deadline):
+    """requests.get en streaming, con solicitud cubierta si el host va lento"""
+    import requests
+    host = urlparse(url).netloc
+
+    def _get():
+        inicio = time.perf_counter()
+        resp = requests.get(url, headers=headers, timeout=timeout_de(deadline, timeout), stream=True)
+        _registrar_latencia(host, time.perf_counter() - inicio)
+        return resp
+
+    umbral = p95_host(host) if INGESTA_COBERTURA else None
+    if umbral is None:
+        return _get()
+
+    _get = propagar(_get)
+    primero = _pool_cobertura.submit(_get)
+    listos, _ = wait([primero], timeout=umbral)
+    if listos:
+        return primero.result()
+
+    print(f"      🐢 {host} supera su p95 ({umbral:.1f}s): lanzando solicitud de respaldo")
+    metricas.incrementar('ingesta_solicitudes_cubiertas')
+    pendientes = {primero, _pool_cobertura.submit(_get)}
+    error = None
+    while pendientes:
+        listos, pendientes = wait(pendientes, timeout=timeout_de(deadline, timeout), return_when=FIRST_COMPLETED)
+        if not listos:
+            break
+        for future in listos:
+            if future.exception() is None:
+                for otro in pendientes:
+                    otro.add_done_callback(_cerrar_si_sobra)
+                return future.result()
+            error = future.exception()
+    for otro in pendientes:
+        otro.add_done_callback(_cerrar_si_sobra)
+    raise error or requests.Timeout(f"Sin respuesta de {host}")
+
+
+def descargar_a_archivo(url, headers, timeout=60, deadline=None, max_bytes=None, sufijo=''):
+    """
+    Descarga en streaming a un archivo temporal sin pasar de max_bytes.
+    Devuelve la ruta (el llamador debe borrarla) o None si HTTP != 200.
+    Si falla a mitad de descarga, el archivo temporal se elimina.
+    """
+    max_bytes = max_bytes or INGESTA_MAX_BYTES
+    with _abrir(url, headers, timeout, deadline) as resp:
+        if resp.status_code != 200:
+            print(f"      ⚠️ HTTP {resp.status_code}")
+            return None
+        _validar_tamano(resp, max_bytes)
+
+        fd, ruta = tempfile.mkstemp(suffix=sufijo)
+        descargados = 0
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in resp.iter_content(chunk_size=CHUNK_BYTES):
+                    if deadline is not None:
+                        deadline.verificar("descarga")
+                    descargados += len(chunk)
+                    if descargados > max_bytes:
+                        raise DocumentoDemasiadoGrande(f"descarga supera el límite de {max_bytes:,} bytes")
+                    tmp.write(chunk)
+        except BaseException:
+            os.remove(ruta)
+            raise
+
+    metricas.incrementar('ingesta_bytes_descargados', descargados)
+    return ruta
+
+
+def descargar_bytes(url, headers, timeout=20, deadline=None, max_bytes=None):
+    """Descarga en memoria (HTML) con tope de tamaño. None si HTTP != 200"""
+    max_bytes = max_bytes or INGESTA_MAX_BYTES
+    with _abrir(url, headers, timeout, deadline) as resp:
+        if resp.status_code != 200:
+            print(f"      ⚠️ HTTP {resp.status_code}")
+            return None
+        _validar_tamano(resp, max_bytes)
+
+        partes = []
+        descargados = 0
+        for chunk in resp.iter_content(chunk_size=CHUNK_BYTES):
+            if deadline is not None:
+                deadline.verificar("descarga")
+            descargados += len(chunk)
+            if descargados > max_bytes:
+                raise DocumentoDemasiadoGrande(f"descarga supera el límite de {max_bytes:,} bytes")
+            partes.append(chunk)
+
+    contenido = b''.join(partes)
+    del partes
+    metricas.incrementar('ingesta_bytes_descargados', descargados)
+    _registrar_pico(2 * len(contenido))
+    return contenido
+
+
+def validadores_remotos(url, headers, timeout=15):
+    """
+    Validadores HTTP del documento (ETag, Last-Modified, tamaño) vía HEAD, para
+    saber si cambió sin descargarlo. None si el servidor no responde 200 o no da ninguno.
+    """
+    import requests
+    try:
+        resp = requests.head(url, headers=headers, timeout=timeout, allow_redirects=True)
+    except requests.RequestException:
+        return None
+    if resp.status_code != 200:
+        return None
+    validadores = {
+        'etag': resp.headers.get('ETag'),
+        'last_modified': resp.headers.get('Last-Modified'),
+        'content_length': resp.headers.get('Content-Length')
+    }
+    # Sin ETag ni Last-Modified el tamaño solo no basta (páginas dinámicas)
+    if not validadores['etag'] and not validadores['last_modified']:
+        return None
+    return validadores
+
+
+def extraer_texto_pdf(ruta, max_paginas=None, deadline=None):
+    """
+    Lee el PDF página a página volcando el texto a un archivo de desborde,
+    liberando la caché de cada página de pdfplumber al terminarla.
+    Solo una página (y al final el texto resultante, hasta INGESTA_MAX_CARACTERES)
+    vive en memoria.
+    """
+    import pdfplumber
+    max_paginas = max_paginas or INGESTA_MAX_PAGINAS
+    pico = 0
+    segundos_lectura = 0.0
+    caracteres = 0
+
+    with tempfile.TemporaryFile(mode='w+', encoding='utf-8') as desborde:
+        with pdfplumber.open(ruta) as pdf:
+            total_pages = len(pdf.pages)
+            a_leer = min(total_pages, max_paginas)
+            print(f"      📄 Total de páginas: {total_pages}" + (f" (se leen {a_leer})" if a_leer < total_pages else ""))
+
+            for i in range(a_leer):
+                if deadline is not None:
+                    deadline.verificar("lectura PDF")
+                page = pdf.pages[i]
+                inicio_pagina = time.perf_counter()
+                try:
+                    page_text = page.extract_text(layout=True) or ""
+                finally:
+                    page.close()
+                segundos_lectura += time.perf_counter() - inicio_pagina
+                caracteres += len(page_text)
+                if i:
+                    desborde.write("\n" + SEPARADOR_PAGINA)
+                desborde.write(page_text)
+                pico = max(pico, len(page_text))
+                if caracteres >= INGESTA_MAX_CARACTERES:
+                    # Lo que siga no volvería a memoria: no vale la pena leerlo
+                    a_leer = i + 1
+                    break
+                if (i + 1) % 5 == 0:
+                    print(f"         Procesadas {i + 1}/{a_leer} páginas...")
+
+        if caracteres >= MIN_CARACTERES_SENAL_PDF:
+            controlador_analisis.observar('pdf_s_por_mil_caracteres', 1000 * segundos_lectura / caracteres)
+        metricas.incrementar('ingesta_paginas_pdf', a_leer)
+        if a_leer < total_pages:
+            metricas.incrementar('ingesta_pdf_truncados')
+
+        desborde.seek(0)
+        texto = desborde.read(INGESTA_MAX_CARACTERES)
+        if desborde.read(1):
+            print(f"      ✂️ Texto recortado a {INGESTA_MAX_CARACTERES:,} caracteres")
+            metricas.incrementar('ingesta_texto_truncado')
+
+    _registrar_pico(pico + len(texto))
+    return texto, a_leer
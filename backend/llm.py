@@ -0,0 +1,340 @@
+import os
+import time
+import threading
+from functools import lru_cache
+
+from deadline import timeout_de
+from metricas import metricas
+from concurrencia import controlador_analisis
+
+# Límite por llamada aunque la solicitud no tenga deadline (evita generaciones colgadas)
+MAX_SEGUNDOS_LLM = 300
+
+MODELO_PRINCIPAL = os.getenv('OLLAMA_MODEL', 'llama3.1:8b')
+# Modelo pequeño de la cascada de extracción (vacío lo desactiva)
+MODELO_RAPIDO = os.getenv('OLLAMA_MODEL_RAPIDO', 'llama3.2:3b')
+
+# Generaciones simultáneas por servidor (Ollama las serializa: más solo agrega cola en el servidor)
+try:
+    OLLAMA_MAX_POR_HOST = max(1, int(os.getenv('OLLAMA_MAX_POR_HOST', '2')))
+except ValueError:
+    OLLAMA_MAX_POR_HOST = 2
+
+# Tiempo fuera de un servidor que no responde (se multiplica con los fallos seguidos, hasta x10)
+try:
+    OLLAMA_ENFRIAMIENTO_SECONDS = float(os.getenv('OLLAMA_ENFRIAMIENTO_SECONDS', '30'))
+except ValueError:
+    OLLAMA_ENFRIAMIENTO_SECONDS = 30.0
+
+# Vigencia del chequeo de servidores de /api/health (las sondas suelen ser frecuentes)
+try:
+    OLLAMA_SALUD_TTL_SECONDS = float(os.getenv('OLLAMA_SALUD_TTL_SECONDS', '10'))
+except ValueError:
+    OLLAMA_SALUD_TTL_SECONDS = 10.0
+
+
+@lru_cache(maxsize=None)
+def _errores_conexion():
+    """
+    Servidor caído o reiniciándose: se reintenta en otro. ollama/httpx se importan
+    al primer uso para que importar este módulo (y app.py) no los cargue.
+    """
+    import httpx
+    return (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, ConnectionError)
+
+# Timeouts de los clientes HTTP por servidor: cada llamada usa el mayor escalón que no
+# excede su tiempo restante, así hay pocos clientes (con keep-alive) por servidor y
+# el timeout nunca supera el deadline. ollama.Client no acepta timeout por llamada
+ESCALONES_TIMEOUT = (1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+
+def escalon_timeout(timeout):
+    if timeout is None:
+        return None
+    return max((e for e in ESCALONES_TIMEOUT if e <= timeout), default=ESCALONES_TIMEOUT[0])
+
+
+def _leer_hosts():
+    """
+    OLLAMA_HOSTS='http://gpu1:11434,http://gpu2:11434=4' (=N: máximo de generaciones
+    simultáneas en ese servidor). Sin OLLAMA_HOSTS: OLLAMA_HOST o el local por defecto.
+    """
+    valor = os.getenv('OLLAMA_HOSTS') or os.getenv('OLLAMA_HOST') or 'http://127.0.0.1:11434'
+    hosts = []
+    for entrada in valor.split(','):
+        host, _, maximo = entrada.strip().partition('=')
+        if not host:
+            continue
+        try:
+            maximo = max(1, int(maximo)) if maximo else OLLAMA_MAX_POR_HOST
+        except ValueError:
+            maximo = OLLAMA_MAX_POR_HOST
+        hosts.append((host.strip(), maximo))
+    return hosts
+
+
+class EndpointOllama:
+    def __init__(self, host, maximo):
+        self.host = host
+        self.maximo = maximo
+        self.en_curso = 0
+        self.solicitudes = 0
+        self.errores = 0
+        self.fallos_seguidos = 0
+        self.caido_hasta = 0.0
+        self.latencia_s = None          # promedio móvil de las llamadas exitosas
+        self.modelos_ausentes = set()
+        self._clientes = {}             # escalón de timeout -> ollama.Client (reutilizado)
+        self._clientes_lock = threading.Lock()
+
+    def cliente(self, timeout=None):
+        """ollama.Client de este servidor para el escalón de `timeout`, creado una sola vez"""
+        escalon = escalon_timeout(timeout)
+        with self._clientes_lock:
+            cliente = self._clientes.get(escalon)
+            if cliente is None:
+                import ollama
+                cliente = ollama.Client(host=self.host, timeout=escalon)
+                self._clientes[escalon] = cliente
+            return cliente
+
+    def sano(self, ahora):
+        return ahora >= self.caido_hasta
+
+    def carga(self):
+        return self.en_curso / self.maximo
+
+    def estado(self, ahora):
+        return {
+            'host': self.host,
+            'sano': self.sano(ahora),
+            'en_curso': self.en_curso,
+            'maximo': self.maximo,
+            'solicitudes': self.solicitudes,
+            'errores': self.errores,
+            'latencia_s': round(self.latencia_s, 3) if self.latencia_s is not None else None,
+            'modelos_ausentes': sorted(self.modelos_ausentes)
+        }
+
+
+class PoolOllama:
+    """
+    Reparte las llamadas entre uno o varios servidores Ollama (OLLAMA_HOSTS):
+    - cada llamada va al servidor sano menos cargado (en curso / máximo, luego latencia);
+    - cada servidor atiende como mucho `maximo` llamadas a la vez; las demás esperan
+      turno aquí, acotadas por el deadline de la solicitud;
+    - si un servidor no responde (conexión rechazada, error 5xx) queda fuera
+      OLLAMA_ENFRIAMIENTO_SECONDS y la llamada se reintenta en otro; si todos están
+      fuera se prueba el que vuelve antes;
+    - un modelo que un servidor no tiene (404) se pide a los demás.
+    Los límites son por proceso (con gunicorn, por worker).
+    """
+
+    def __init__(self, hosts, enfriamiento=OLLAMA_ENFRIAMIENTO_SECONDS):
+        self.endpoints = [EndpointOllama(host, maximo) for host, maximo in hosts]
+        self.enfriamiento = enfriamiento
+        self._cond = threading.Condition()
+
+    def _elegir(self, model, excluir):
+        """(endpoint libre o None, si algún endpoint podría atender el modelo)"""
+        ahora = time.monotonic()
+        candidatos = [e for e in self.endpoints if e not in excluir and model not in e.modelos_ausentes]
+        if not candidatos:
+            return None, False
+        sanos = [e for e in candidatos if e.sano(ahora)] or [min(candidatos, key=lambda e: e.caido_hasta)]
+        libres = [e for e in sanos if e.en_curso < e.maximo]
+        if not libres:
+            return None, True
+        return min(libres, key=lambda e: (e.carga(), e.latencia_s or 0.0)), True
+
+    def adquirir(self, model, excluir=(), deadline=None):
+        """Reserva un lugar en el mejor endpoint; None si ninguno (fuera de `excluir`) tiene el modelo"""
+        with self._cond:
+            while True:
+                endpoint, posible = self._elegir(model, excluir)
+                if endpoint is not None:
+                    endpoint.en_curso += 1
+                    endpoint.solicitudes += 1
+                    return endpoint
+                if not posible:
+                    return None
+                if deadline is not None:
+                    deadline.verificar("espera de servidor Ollama")
+                    self._cond.wait(deadline.timeout(1.0))
+                else:
+                    self._cond.wait(1.0)
+
+    def liberar(self, endpoint, segundos=None, caido=False, error=False):
+        with self._cond:
+            endpoint.en_curso -= 1
+            if caido:
+                endpoint.errores += 1
+                endpoint.fallos_seguidos += 1
+                endpoint.caido_hasta = time.monotonic() + self.enfriamiento * min(endpoint.fallos_seguidos, 10)
+            elif error:
+                endpoint.errores += 1
+            else:
+                endpoint.fallos_seguidos = 0
+                if segundos is not None:
+                    endpoint.latencia_s = segundos if endpoint.latencia_s is None else \
+                        0.8 * endpoint.latencia_s + 0.2 * segundos
+            self._cond.notify_all()
+
+    def ejecutar(self, model, operacion, deadline=None, etapa='llm'):
+        """
+        operacion(endpoint) en el mejor endpoint, con failover a los demás ante caídas o
+        modelo ausente. Registra en `etapa` la duración de la llamada que respondió.
+        """
+        import ollama
+        intentados = set()
+        ultimo_error = None
+        while True:
+            if deadline is not None:
+                deadline.verificar("llm")
+            espera = time.perf_counter()
+            endpoint = self.adquirir(model, intentados, deadline)
+            metricas.registrar_tiempo('ollama_espera', time.perf_counter() - espera)
+            if endpoint is None:
+                if ultimo_error is not None:
+                    raise ultimo_error
+                raise ollama.ResponseError(f"model '{model}' not found on any Ollama server", 404)
+            intentados.add(endpoint)
+
+            inicio = time.perf_counter()
+            try:
+                respuesta = operacion(endpoint)
+            except ollama.ResponseError as e:
+                if e.status_code == 404:
+                    self._registrar_ausente(endpoint, model)
+                    self.liberar(endpoint, error=True)
+                elif e.status_code >= 500:
+                    self.liberar(endpoint, caido=True)
+                    print(f"⚠️ Ollama {endpoint.host}: error {e.status_code}; se reintenta en otro servidor")
+                else:
+                    self.liberar(endpoint, error=True)
+                    raise
+                ultimo_error = e
+                metricas.incrementar('ollama_failover')
+                continue
+            except _errores_conexion() as e:
+                self.liberar(endpoint, caido=True)
+                print(f"⚠️ Ollama {endpoint.host} no responde ({e}); se reintenta en otro servidor")
+                ultimo_error = e
+                metricas.incrementar('ollama_failover')
+                continue
+            except BaseException:
+                self.liberar(endpoint, error=True)
+                raise
+
+            segundos = time.perf_counter() - inicio
+            self.liberar(endpoint, segundos)
+            metricas.registrar_tiempo(etapa, segundos)
+            return respuesta
+
+    def _registrar_ausente(self, endpoint, model):
+        with self._cond:
+            if model in endpoint.modelos_ausentes:
+                return
+            endpoint.modelos_ausentes.add(model)
+        print(f"⚠️ Modelo {model} no instalado en {endpoint.host} (ollama pull {model}); se omite allí")
+
+    def disponible(self, model):
+        """False si ningún servidor tiene el modelo (la cascada salta ese nivel)"""
+        return bool(model) and any(model not in e.modelos_ausentes for e in self.endpoints)
+
+    def estado(self):
+        ahora = time.monotonic()
+        with self._cond:
+            return [e.estado(ahora) for e in self.endpoints]
+
+
+pool_ollama = PoolOllama(_leer_hosts())
+
+
+def disponible(model):
+    return pool_ollama.disponible(model)
+
+
+_salud_lock = threading.Lock()
+_salud = {'hora': None, 'servidores': []}
+
+
+def servidores_activos(timeout=2.0):
+    """
+    Chequeo liviano para /api/health: GET /api/version a cada servidor del pool, sin
+    generar ni cargar el modelo ni importar ollama. Hosts que responden; el resultado
+    se reutiliza OLLAMA_SALUD_TTL_SECONDS.
+    """
+    from urllib.request import urlopen
+    with _salud_lock:
+        ahora = time.monotonic()
+        if _salud['hora'] is not None and ahora - _salud['hora'] < OLLAMA_SALUD_TTL_SECONDS:
+            return _salud['servidores']
+        activos = []
+        for endpoint in pool_ollama.endpoints:
+            base = endpoint.host if '://' in endpoint.host else f"http://{endpoint.host}"
+            try:
+                with urlopen(f"{base.rstrip('/')}/api/version", timeout=timeout) as resp:
+                    if resp.status == 200:
+                        activos.append(endpoint.host)
+            except (OSError, ValueError):
+                continue
+        _salud['hora'] = time.monotonic()
+        _salud['servidores'] = activos
+        return activos
+
+
+def chat(model, messages, deadline=None, timeout=MAX_SEGUNDOS_LLM, **kwargs):
+    """
+    Llamada a ollama.chat acotada por el deadline de la solicitud, en el servidor
+    menos cargado del pool. El timeout HTTP nunca excede el tiempo restante del presupuesto.
+    """
+    if deadline is not None:
+        deadline.verificar("llm")
+
+    atendido = {}
+
+    def _chat(endpoint):
+        atendido['host'] = endpoint.host
+        return endpoint.cliente(timeout_de(deadline, timeout)).chat(model=model, messages=messages, **kwargs)
+
+    respuesta = pool_ollama.ejecutar(model, _chat, deadline=deadline)
+
+    # Rendimiento de generación: señal principal del control de concurrencia. Una señal
+    # (y una línea base) por servidor y modelo: el modelo rápido de la cascada genera
+    # bastante más tokens/s que el principal, y un servidor más lento del pool no está
+    # degradado por serlo; compararlos reduciría el límite sin contención real
+    tokens = respuesta.get('eval_count') or 0
+    duracion_ns = respuesta.get('eval_duration') or 0
+    if tokens > 1 and duracion_ns > 0:
+        tokens_s = tokens / (duracion_ns / 1e9)
+        senal = f"ollama_tokens_s:{atendido['host']}:{model}"
+        metricas.fijar(senal, round(tokens_s, 2))
+        controlador_analisis.observar(senal, tokens_s, mayor_es_mejor=True)
+    return respuesta
+
+
+def precargar(model, keep_alive='30m', timeout=MAX_SEGUNDOS_LLM):
+    """
+    Carga el modelo en memoria de cada servidor del pool (generate sin prompt) para que
+    la primera solicitud no lo espere. Falla solo si no se pudo cargar en ninguno.
+    """
+    import ollama
+    cargados = 0
+    ultimo_error = None
+    for endpoint in pool_ollama.endpoints:
+        inicio = time.perf_counter()
+        try:
+            endpoint.cliente(timeout).generate(model=model, prompt='', keep_alive=keep_alive)
+        except ollama.ResponseError as e:
+            if e.status_code == 404:
+                pool_ollama._registrar_ausente(endpoint, model)
+            ultimo_error = e
+            continue
+        except _errores_conexion() as e:
+            ultimo_error = e
+            continue
+        metricas.registrar_tiempo('llm_precarga', time.perf_counter() - inicio)
+        cargados += 1
+    if not cargados and ultimo_error is not None:
+        raise ultimo_error
@@ -0,0 +1,215 @@
+"""
+Ejecución por lotes del plan completo, sin servidor HTTP.
+
+    python lote.py                                         # ../data/plan_gobierno_2025_2029.xlsx
+    python lote.py --entrada plan.csv --procesos 4 --salida resultados.jsonl
+    python lote.py --narrativa template --timeout-indicador 300
+    python lote.py --exportar resultados.xlsx              # además .csv o .parquet al terminar
+
+Cada indicador único se procesa en un pool de procesos. Cada resultado se agrega
+de inmediato a la salida (JSON Lines, una línea por fila del plan), que es también
+el punto de control: al volver a ejecutar con la misma salida se retoman solo
+las filas pendientes o con error (--reiniciar empieza de cero). Si una fila aparece
+varias veces en la salida, vale su última línea.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from analyzer import MODOS_NARRATIVA
+from deadline import Deadline
+from metricas import metricas
+from exportacion import exportar_resultados, leer_jsonl
+from planificador import PLANIFICADOR, ordenar_por_costo, resumen_plan
+from pipeline import procesar_indicador, agrupar_indicadores, resultado_para_fila, resultado_fallido
+
+ENTRADA_POR_DEFECTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'plan_gobierno_2025_2029.xlsx')
+
+try:
+    LOTE_TIMEOUT_INDICADOR = float(os.getenv('LOTE_TIMEOUT_INDICADOR', '600'))
+except ValueError:
+    LOTE_TIMEOUT_INDICADOR = 600.0
+
+
+def leer_plan(ruta):
+    """Filas del plan (xlsx/xls, csv o parquet) como dicts; celdas vacías -> None"""
+    import pandas as pd  # los procesos hijos del pool no lo necesitan
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension in ('.xlsx', '.xls'):
+        df = pd.read_excel(ruta)
+    elif extension == '.csv':
+        df = pd.read_csv(ruta)
+    elif extension == '.parquet':
+        df = pd.read_parquet(ruta)  # requiere pyarrow o fastparquet
+    else:
+        raise ValueError(f"Formato no soportado: {extension} (use .xlsx, .csv o .parquet)")
+    return df.astype(object).where(pd.notna(df), None).to_dict('records')
+
+
+def leer_punto_control(ruta, narrativa):
+    """Huellas ya completadas (sin error ni timeout) en una salida previa"""
+    completadas = set()
+    if not os.path.exists(ruta):
+        return completadas
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError:
+                continue  # última línea truncada por una interrupción
+            if registro.get('narrativa') == narrativa and \
+               registro.get('resultado', {}).get('estado') not in ('error', 'timeout'):
+                completadas.add(registro['huella'])
+    return completadas
+
+
+def _procesar_en_hijo(idx, total, fila, narrativa, timeout):
+    """Se ejecuta en un proceso del pool; devuelve también sus tiempos por etapa acumulados"""
+    inicio = time.perf_counter()
+    try:
+        _, resultado = procesar_indicador(idx, total, fila, narrativa, Deadline(timeout))
+    except Exception as e:
+        resultado = resultado_fallido(fila, f"Error: {e}")
+    return resultado, time.perf_counter() - inicio, os.getpid(), metricas.instantanea()['tiempos']
+
+
+def _resumen_etapas(tiempos_por_proceso):
+    etapas = {}
+    for tiempos in tiempos_por_proceso.values():
+        for etapa, t in tiempos.items():
+            e = etapas.setdefault(etapa, {'n': 0, 'total_s': 0.0, 'max_s': 0.0})
+            e['n'] += t['n']
+            e['total_s'] += t['total_s']
+            e['max_s'] = max(e['max_s'], t['max_s'])
+    return etapas
+
+
+def ejecutar_lote(entrada, salida, procesos, narrativa='llm', timeout=LOTE_TIMEOUT_INDICADOR, reiniciar=False):
+    filas = leer_plan(entrada)
+    grupos = agrupar_indicadores(filas, narrativa)
+    if reiniciar and os.path.exists(salida):
+        os.remove(salida)
+    completadas = leer_punto_control(salida, narrativa)
+    # Los más baratos primero (documentos ya indexados, HTML antes que PDF grandes)
+    plan = ordenar_por_costo({h: i for h, i in grupos.items() if h not in completadas}, filas, narrativa)
+    pendientes = [(huella, indices) for huella, indices, _ in plan]
+
+    print("\n" + "="*80)
+    print("📦 LOTE - PLAN DE GOBIERNO ECUADOR")
+    print("="*80)
+    print(f"   Entrada: {entrada} ({len(filas)} filas, {len(grupos)} indicadores únicos)")
+    print(f"   Salida: {salida}")
+    print(f"   Ya completados: {len(completadas & set(grupos))} | Pendientes: {len(pendientes)}")
+    print(f"   Planificación ({PLANIFICADOR}): {resumen_plan(plan)}")
+    print(f"   Procesos: {procesos} | Narrativa: {narrativa} | Timeout por indicador: {timeout:.0f}s")
+    print("="*80 + "\n")
+
+    conteo = {'ok': 0, 'error': 0, 'timeout': 0}
+    segundos_indicador = []
+    tiempos_por_proceso = {}
+    inicio = time.perf_counter()
+
+    with open(salida, 'a', encoding='utf-8') as f, ProcessPoolExecutor(max_workers=procesos) as pool:
+        futures = {
+            pool.submit(_procesar_en_hijo, indices[0] + 1, len(filas), filas[indices[0]], narrativa, timeout): (huella, indices)
+            for huella, indices in pendientes
+        }
+        for hechos, future in enumerate(as_completed(futures), 1):
+            huella, indices = futures[future]
+            try:
+                resultado, segundos, pid, tiempos = future.result()
+                tiempos_por_proceso[pid] = tiempos
+            except Exception as e:
+                # El proceso hijo murió (p. ej. sin memoria)
+                resultado, segundos = resultado_fallido(filas[indices[0]], f"Error: {e}"), 0.0
+
+            estado = resultado.get('estado')
+            conteo['timeout' if resultado.get('timeout') or estado == 'timeout' else 'error' if estado == 'error' else 'ok'] += 1
+            segundos_indicador.append(segundos)
+
+            for i in indices:
+                registro = {
+                    'fila': i,
+                    'huella': huella,
+                    'narrativa': narrativa,
+                    'segundos': round(segundos, 2),
+                    'resultado': resultado_para_fila(resultado, filas[i])
+                }
+                f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+            # Punto de control durable: lo escrito sobrevive a una interrupción
+            f.flush()
+            os.fsync(f.fileno())
+
+            transcurrido = time.perf_counter() - inicio
+            print(f"📦 [{hechos}/{len(pendientes)}] {estado} en {segundos:.1f}s | "
+                  f"{hechos / transcurrido * 60:.1f} indicadores/min")
+
+    total_s = time.perf_counter() - inicio
+    resumen = {
+        'filas': len(filas),
+        'unicos': len(grupos),
+        'retomados': len(completadas & set(grupos)),
+        'procesados': len(pendientes),
+        **conteo,
+        'segundos': round(total_s, 1),
+        'indicadores_por_minuto': round(len(pendientes) / total_s * 60, 2) if total_s > 0 else 0.0,
+        'etapas': _resumen_etapas(tiempos_por_proceso)
+    }
+    _imprimir_resumen(resumen, segundos_indicador)
+    return resumen
+
+
+def _imprimir_resumen(resumen, segundos_indicador):
+    print("\n" + "="*80)
+    print("✅ LOTE COMPLETADO")
+    print("="*80)
+    print(f"   Filas: {resumen['filas']} | Únicos: {resumen['unicos']} | Retomados: {resumen['retomados']}")
+    print(f"   Procesados: {resumen['procesados']} (ok {resumen['ok']}, error {resumen['error']}, timeout {resumen['timeout']})")
+    print(f"   Tiempo total: {resumen['segundos']:.1f}s | Throughput: {resumen['indicadores_por_minuto']} indicadores/min")
+    if segundos_indicador:
+        ordenados = sorted(segundos_indicador)
+        p95 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))]
+        print(f"   Por indicador: promedio {sum(ordenados) / len(ordenados):.1f}s | p95 {p95:.1f}s | máx {ordenados[-1]:.1f}s")
+    if resumen['etapas']:
+        print(f"\n   {'etapa':<28}{'n':>7}{'total s':>11}{'prom s':>10}{'máx s':>10}")
+        for etapa, t in sorted(resumen['etapas'].items(), key=lambda e: e[1]['total_s'], reverse=True):
+            print(f"   {etapa:<28}{t['n']:>7}{t['total_s']:>11.1f}{t['total_s'] / t['n']:>10.2f}{t['max_s']:>10.2f}")
+    print("="*80 + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Análisis por lotes del plan de gobierno")
+    parser.add_argument('--entrada', default=ENTRADA_POR_DEFECTO, help="Plan en .xlsx, .csv o .parquet")
+    parser.add_argument('--salida', default='resultados_lote.jsonl', help="JSON Lines incremental (y punto de control)")
+    parser.add_argument('--procesos', type=int, default=min(4, os.cpu_count() or 2),
+                        help="Procesos del pool (cada uno con su propio scraper y cliente de Ollama)")
+    parser.add_argument('--narrativa', choices=MODOS_NARRATIVA, default='llm')
+    parser.add_argument('--timeout-indicador', type=float, default=LOTE_TIMEOUT_INDICADOR)
+    parser.add_argument('--reiniciar', action='store_true', help="Ignora la salida previa y empieza de cero")
+    parser.add_argument('--exportar', help="Al terminar, exporta la salida a .xlsx, .csv o .parquet")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.entrada):
+        print(f"❌ Archivo no encontrado: {args.entrada}")
+        sys.exit(1)
+
+    resumen = ejecutar_lote(
+        args.entrada, args.salida, max(1, args.procesos),
+        narrativa=args.narrativa, timeout=args.timeout_indicador, reiniciar=args.reiniciar
+    )
+    if args.exportar:
+        formato = os.path.splitext(args.exportar)[1].lower().lstrip('.')
+        try:
+            n = exportar_resultados(leer_jsonl(args.salida), args.exportar, formato)
+            print(f"📤 Exportadas {n} filas a {args.exportar}")
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+    sys.exit(1 if resumen['error'] else 0)
+
+
+if __name__ == '__main__':
+    main()
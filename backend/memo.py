@@ -0,0 +1,74 @@
+import time
+import threading
+from concurrent.futures import Future
+
+
+class MemoResultados:
+    """
+    Memo en proceso con TTL corto y cálculo único (single-flight):
+    si dos solicitudes piden la misma clave a la vez, la segunda espera
+    el cálculo de la primera en lugar de repetirlo.
+    """
+
+    def __init__(self, ttl=300, max_entradas=5000):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._valores = {}      # clave -> (expira, valor)
+        self._en_curso = {}     # clave -> Future
+
+    def disponible(self, clave):
+        """True si la clave tiene valor vigente o un cálculo en curso (no costaría un cálculo nuevo)"""
+        with self._lock:
+            entrada = self._valores.get(clave)
+            return (entrada is not None and entrada[0] > time.monotonic()) or clave in self._en_curso
+
+    def obtener_o_calcular(self, clave, calcular, guardar_si=None, timeout=None, reintentar=None):
+        """
+        Devuelve (valor, compartido). `compartido` es True si el valor vino del memo
+        o de un cálculo en curso de otra solicitud. `guardar_si(valor)` decide si
+        el valor se memoriza (p. ej. no guardar resultados parciales).
+        Un valor compartido que no se memorizaría (p. ej. cortado por el deadline de la
+        otra solicitud) se descarta y se calcula de nuevo mientras `reintentar()` sea True.
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                entrada = self._valores.get(clave)
+                if entrada is not None and entrada[0] > time.monotonic():
+                    return entrada[1], True
+                future = self._en_curso.get(clave)
+                propio = future is None
+                if propio:
+                    future = Future()
+                    self._en_curso[clave] = future
+
+            if propio:
+                break
+            valor = future.result(timeout=None if limite is None else max(0.0, limite - time.monotonic()))
+            if guardar_si is None or guardar_si(valor) or reintentar is None or not reintentar():
+                return valor, True
+
+        try:
+            valor = calcular()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(valor)
+            if guardar_si is None or guardar_si(valor):
+                with self._lock:
+                    self._valores[clave] = (time.monotonic() + self.ttl, valor)
+                    if len(self._valores) > self.max_entradas:
+                        self._purgar()
+            return valor, False
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave, None)
+
+    def _purgar(self):
+        ahora = time.monotonic()
+        for clave in [c for c, (expira, _) in self._valores.items() if expira <= ahora]:
+            del self._valores[clave]
+        while len(self._valores) > self.max_entradas:
+            self._valores.pop(next(iter(self._valores)))
@@ -0,0 +1,81 @@
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class Metricas:
+    """
+    Registro de métricas en memoria (thread-safe) expuesto en /api/metrics.
+    - contadores: totales acumulados
+    - tiempos: por etapa (n, total, máximo, último)
+    - maximos: marcas de agua por clave (p. ej. memoria pico por hilo)
+    - valores: último valor observado
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.inicio = time.time()
+        self.contadores = {}
+        self.tiempos = {}
+        self.maximos = {}
+        self.valores = {}
+
+    def incrementar(self, nombre, n=1):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def registrar_tiempo(self, etapa, segundos):
+        with self._lock:
+            t = self.tiempos.setdefault(etapa, {'n': 0, 'total_s': 0.0, 'max_s': 0.0, 'ultimo_s': 0.0})
+            t['n'] += 1
+            t['total_s'] += segundos
+            t['max_s'] = max(t['max_s'], segundos)
+            t['ultimo_s'] = segundos
+
+    @contextmanager
+    def cronometro(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_tiempo(etapa, time.perf_counter() - inicio)
+
+    def registrar_maximo(self, grupo, clave, valor):
+        with self._lock:
+            g = self.maximos.setdefault(grupo, {})
+            if valor > g.get(clave, float('-inf')):
+                g[clave] = valor
+
+    def fijar(self, nombre, valor):
+        with self._lock:
+            self.valores[nombre] = valor
+
+    def instantanea(self):
+        with self._lock:
+            tiempos = {
+                etapa: {**t, 'promedio_s': round(t['total_s'] / t['n'], 4) if t['n'] else 0.0}
+                for etapa, t in self.tiempos.items()
+            }
+            return {
+                'uptime_s': round(time.time() - self.inicio, 1),
+                'rss_pico_kb': rss_pico_kb(),
+                'contadores': dict(self.contadores),
+                'tiempos': tiempos,
+                'maximos': {g: dict(v) for g, v in self.maximos.items()},
+                'valores': dict(self.valores)
+            }
+
+
+def rss_pico_kb():
+    """RSS máximo del proceso en KB (None si no está disponible)"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+metricas = Metricas()
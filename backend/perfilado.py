@@ -0,0 +1,313 @@
+"""
+Perfilado bajo demanda de solicitudes de análisis.
+
+    POST /api/analyze  {"indicators": [...], "profile": "cpu,memoria"}   (o cabecera X-Profile: cpu)
+
+- cpu: cProfile (determinista) de la solicitud y de los hilos que procesan sus indicadores;
+- memoria: tracemalloc, pico de asignación por etapa de procesar_indicador.
+Cada reporte queda en PERFILES_DIR/<id>/ (cpu.prof para pstats/snakeviz, cpu.txt,
+etapas.json, resumen.json). Para comparar dos ejecuciones:
+
+    python perfilado.py comparar <id_antes> <id_despues>
+"""
+import os
+import sys
+import io
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import argparse
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from almacen import CACHE_DIR
+
+# Permite que las solicitudes pidan perfilado (PERFILADO=0 lo ignora)
+PERFILADO_ACTIVO = os.getenv('PERFILADO', '1') == '1'
+PERFILES_DIR = os.getenv('PERFILES_DIR', os.path.join(CACHE_DIR, 'perfiles'))
+MODOS_PERFIL = ('cpu', 'memoria')
+FUNCIONES_EN_RESUMEN = 25
+
+# Desde 3.12 cProfile usa sys.monitoring: un solo perfilador activo por intérprete,
+# que ve todos los hilos. Antes, cada hilo necesita el suyo.
+_CPU_GLOBAL = sys.version_info >= (3, 12)
+
+# Un perfil de CPU a la vez por proceso (si no, los hilos de dos solicitudes se mezclan)
+_cpu_lock = threading.Lock()
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_usuarios = 0
+# El pico de tracemalloc es del proceso: en modo memoria las etapas corren de a una
+_etapa_memoria_lock = threading.Lock()
+_local = threading.local()
+
+
+def modos_solicitados(data, cabeceras):
+    """Modos pedidos en la cabecera X-Profile o en el campo 'profile' del cuerpo"""
+    if not PERFILADO_ACTIVO:
+        return ()
+    valor = cabeceras.get('X-Profile') or (data or {}).get('profile')
+    if not valor:
+        return ()
+    if valor is True or str(valor).lower() in ('1', 'true', 'todo'):
+        return MODOS_PERFIL
+    return tuple(m for m in (p.strip().lower() for p in str(valor).split(',')) if m in MODOS_PERFIL)
+
+
+def _iniciar_tracemalloc():
+    global _tracemalloc_usuarios
+    with _tracemalloc_lock:
+        if _tracemalloc_usuarios == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_usuarios += 1
+
+
+def _detener_tracemalloc():
+    global _tracemalloc_usuarios
+    with _tracemalloc_lock:
+        _tracemalloc_usuarios -= 1
+        if _tracemalloc_usuarios == 0:
+            tracemalloc.stop()
+
+
+class PerfilSolicitud:
+    """
+    Perfil de una solicitud. Usar como context manager en el hilo de la solicitud y
+    envolver con en_hilo() las funciones que corren en el pool (y con propagar() las
+    de pools internos, p. ej. las fuentes de DataScraper.buscar_datos). En modo memoria
+    las etapas de los indicadores se serializan para que cada pico sea de una sola
+    etapa; lo que asignen a la vez otras solicitudes sin perfilar también cuenta.
+    """
+
+    def __init__(self, modos, etiqueta='analyze'):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.modos = tuple(modos)
+        self.etiqueta = etiqueta
+        self.etapas = []
+        self.stats = None
+        self.cpu = 'cpu' in self.modos
+        self.notas = []
+        self._lock = threading.Lock()
+        self._perfil_global = None
+        self._inicio = None
+
+    # --- Ciclo de vida ---
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        if self.cpu and not _cpu_lock.acquire(blocking=False):
+            self.cpu = False
+            self.notas.append("cpu omitido: otra solicitud se está perfilando en este proceso")
+        if self.cpu and _CPU_GLOBAL:
+            self._perfil_global = cProfile.Profile()
+            self._perfil_global.enable()
+        if 'memoria' in self.modos:
+            _iniciar_tracemalloc()
+        _local.perfil = self
+        return self
+
+    def __exit__(self, *_):
+        _local.perfil = None
+        if self._perfil_global is not None:
+            self._perfil_global.disable()
+            self._fusionar(self._perfil_global)
+        if 'memoria' in self.modos:
+            _detener_tracemalloc()
+        if self.cpu:
+            _cpu_lock.release()
+        self.segundos = time.perf_counter() - self._inicio
+        return False
+
+    def en_hilo(self, funcion):
+        """Envuelve una tarea del pool: sus etapas (y su CPU, antes de 3.12) van a este perfil"""
+        def _envuelta(*args, **kwargs):
+            _local.perfil = self
+            perfil_hilo = cProfile.Profile() if self.cpu and not _CPU_GLOBAL else None
+            if perfil_hilo is not None:
+                perfil_hilo.enable()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                if perfil_hilo is not None:
+                    perfil_hilo.disable()
+                    self._fusionar(perfil_hilo)
+                _local.perfil = None
+        return _envuelta
+
+    def _fusionar(self, perfil):
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(perfil)
+            else:
+                self.stats.add(perfil)
+
+    def registrar_etapa(self, indicador, etapa, segundos, pico_kb=None):
+        with self._lock:
+            self.etapas.append({
+                'indicador': indicador,
+                'etapa': etapa,
+                'segundos': round(segundos, 4),
+                'pico_kb': pico_kb
+            })
+
+    # --- Reporte ---
+
+    def funciones_top(self, n=FUNCIONES_EN_RESUMEN):
+        """[(función, llamadas, tottime, cumtime)] por tiempo acumulado"""
+        if self.stats is None:
+            return []
+        filas = []
+        for (archivo, linea, nombre), (_, llamadas, tottime, cumtime, _) in self.stats.stats.items():
+            filas.append({
+                'funcion': f"{os.path.basename(archivo)}:{linea}({nombre})",
+                'llamadas': llamadas,
+                'tottime_s': round(tottime, 4),
+                'cumtime_s': round(cumtime, 4)
+            })
+        filas.sort(key=lambda f: f['cumtime_s'], reverse=True)
+        return filas[:n]
+
+    def guardar(self, extra=None):
+        """Escribe el reporte en PERFILES_DIR/<id>/ y devuelve el resumen"""
+        directorio = os.path.join(PERFILES_DIR, self.id)
+        os.makedirs(directorio, exist_ok=True)
+        if self.stats is not None:
+            self.stats.dump_stats(os.path.join(directorio, 'cpu.prof'))
+            texto = io.StringIO()
+            pstats.Stats(os.path.join(directorio, 'cpu.prof'), stream=texto).sort_stats('cumulative').print_stats(60)
+            with open(os.path.join(directorio, 'cpu.txt'), 'w', encoding='utf-8') as f:
+                f.write(texto.getvalue())
+        with open(os.path.join(directorio, 'etapas.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.etapas, f, ensure_ascii=False, indent=2)
+
+        resumen = {
+            'id': self.id,
+            'etiqueta': self.etiqueta,
+            'hora': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'modos': list(self.modos),
+            'segundos': round(getattr(self, 'segundos', 0.0), 3),
+            'notas': self.notas,
+            'ruta': directorio,
+            'funciones_top': self.funciones_top(),
+            'etapas': _resumir_etapas(self.etapas),
+            **(extra or {})
+        }
+        with open(os.path.join(directorio, 'resumen.json'), 'w', encoding='utf-8') as f:
+            json.dump(resumen, f, ensure_ascii=False, indent=2)
+        print(f"🔬 Perfil {self.id} guardado en {directorio}")
+        return resumen
+
+
+def propagar(funcion):
+    """
+    Envuelve `funcion` con el perfil activo en este hilo (si hay) para enviarla a otro
+    pool: antes de 3.12 cProfile no sigue a los hilos que lanza el hilo perfilado.
+    """
+    perfil = getattr(_local, 'perfil', None)
+    return perfil.en_hilo(funcion) if perfil is not None else funcion
+
+
+def _resumir_etapas(etapas):
+    por_etapa = {}
+    for e in etapas:
+        r = por_etapa.setdefault(e['etapa'], {'n': 0, 'total_s': 0.0, 'max_s': 0.0, 'pico_kb_max': None})
+        r['n'] += 1
+        r['total_s'] = round(r['total_s'] + e['segundos'], 4)
+        r['max_s'] = max(r['max_s'], e['segundos'])
+        if e['pico_kb'] is not None:
+            r['pico_kb_max'] = max(r['pico_kb_max'] or 0, e['pico_kb'])
+    return por_etapa
+
+
+@contextmanager
+def etapa(nombre, indicador=None):
+    """
+    Marca una etapa del pipeline. Sin perfil activo en el hilo no hace nada; con perfil
+    registra su duración y, en modo memoria, el pico de tracemalloc durante la etapa
+    (una etapa a la vez en el proceso, ya que reset_peak es global). Si tracemalloc se
+    detuvo antes de que la etapa terminara (hilo abandonado al cerrar la solicitud),
+    el pico queda en None.
+    """
+    perfil = getattr(_local, 'perfil', None)
+    if perfil is None:
+        yield
+        return
+    memoria = 'memoria' in perfil.modos and tracemalloc.is_tracing()
+    if memoria:
+        _etapa_memoria_lock.acquire()
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        pico_kb = None
+        if memoria:
+            if tracemalloc.is_tracing():
+                pico_kb = round(max(0, tracemalloc.get_traced_memory()[1] - base) / 1024, 1)
+            _etapa_memoria_lock.release()
+        perfil.registrar_etapa(indicador, nombre, time.perf_counter() - inicio, pico_kb)
+
+
+def cargar_resumen(perfil_id):
+    """Resumen guardado de un perfil (None si no existe o el id no es válido)"""
+    if not perfil_id or os.sep in perfil_id or perfil_id.startswith('.'):
+        return None
+    ruta = os.path.join(PERFILES_DIR, perfil_id, 'resumen.json')
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def listar_perfiles():
+    if not os.path.isdir(PERFILES_DIR):
+        return []
+    return sorted(os.listdir(PERFILES_DIR), reverse=True)
+
+
+def comparar(id_antes, id_despues, n=30):
+    """Diferencia de tiempo acumulado por función entre dos perfiles de CPU"""
+    tiempos = []
+    for perfil_id in (id_antes, id_despues):
+        ruta = os.path.join(PERFILES_DIR, perfil_id, 'cpu.prof')
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(f"Sin perfil de CPU: {ruta}")
+        stats = pstats.Stats(ruta).stats
+        tiempos.append({
+            f"{os.path.basename(archivo)}:{linea}({nombre})": cumtime
+            for (archivo, linea, nombre), (_, _, _, cumtime, _) in stats.items()
+        })
+    antes, despues = tiempos
+    filas = [
+        (funcion, antes.get(funcion, 0.0), despues.get(funcion, 0.0))
+        for funcion in set(antes) | set(despues)
+    ]
+    filas.sort(key=lambda f: abs(f[2] - f[1]), reverse=True)
+    return filas[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfiles de solicitudes de análisis")
+    sub = parser.add_subparsers(dest='accion', required=True)
+    sub.add_parser('listar')
+    p_comparar = sub.add_parser('comparar')
+    p_comparar.add_argument('antes')
+    p_comparar.add_argument('despues')
+    p_comparar.add_argument('-n', type=int, default=30)
+    args = parser.parse_args()
+
+    if args.accion == 'listar':
+        for perfil_id in listar_perfiles():
+            print(perfil_id)
+        return
+
+    print(f"\n   {'función':<70}{'antes s':>10}{'después s':>11}{'Δ s':>10}")
+    for funcion, antes, despues in comparar(args.antes, args.despues, args.n):
+        print(f"   {funcion[:69]:<70}{antes:>10.3f}{despues:>11.3f}{despues - antes:>+10.3f}")
+
+
+if __name__ == '__main__':
+    main()
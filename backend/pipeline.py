@@ -0,0 +1,379 @@
+import os
+import re
+import json
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FuturesTimeout
+from scraper import DataScraper
+from analyzer import AIAnalyzer
+from deadline import DeadlineExceeded, timeout_de
+from almacen import almacen
+from cola import cola
+from memo import MemoResultados
+from concurrencia import controlador_analisis
+from perfilado import etapa
+
+try:
+    MEMO_RESULTADOS_TTL = int(os.getenv('MEMO_RESULTADOS_TTL', '300'))
+except ValueError:
+    MEMO_RESULTADOS_TTL = 300
+
+# Resultados recientes por huella (Indicador, Meta, ValorInicial, narrativa), compartidos entre solicitudes
+_memo_resultados = MemoResultados(ttl=MEMO_RESULTADOS_TTL)
+
+# Narrativas diferidas: entradas necesarias para generar el texto con IA bajo demanda.
+# Se guardan en el almacén compartido para que cualquier proceso de la API las atienda;
+# con ANALYSIS_MODE=cola (API y workers) en la base de la cola, lo único que comparten
+# las máquinas (cada una tiene su CACHE_DIR)
+NARRATIVAS_TTL = 24 * 3600
+NARRATIVAS_EN_COLA = os.getenv('ANALYSIS_MODE', 'local') == 'cola'
+
+def registrar_narrativa_pendiente(eje, indicador, meta, valor_inicial, valor_actual, datos_scraping):
+    """Guarda las entradas del análisis y devuelve el id para /api/narrative/<id>"""
+    clave = json.dumps([indicador, meta, valor_inicial, valor_actual], default=str, ensure_ascii=False)
+    narrativa_id = hashlib.sha1(clave.encode('utf-8')).hexdigest()[:16]
+    
+    datos = {
+        'eje': eje,
+        'indicador': indicador,
+        'meta': meta,
+        'valor_inicial': valor_inicial,
+        'valor_actual': valor_actual,
+        'datos_scraping': datos_scraping
+    }
+    if NARRATIVAS_EN_COLA:
+        cola.guardar_narrativa(narrativa_id, datos, NARRATIVAS_TTL)
+    else:
+        almacen.guardar('narrativas', narrativa_id, datos, ttl=NARRATIVAS_TTL)
+    
+    return narrativa_id
+
+def obtener_narrativa_pendiente(narrativa_id):
+    if NARRATIVAS_EN_COLA:
+        return cola.obtener_narrativa(narrativa_id)
+    return almacen.obtener('narrativas', narrativa_id)
+
+class NarrativaNoDisponible(Exception):
+    """Ollama no generó la narrativa: no se guarda, se puede reintentar"""
+
+def generar_narrativa_pendiente(narrativa_id):
+    """
+    Texto con IA de una narrativa diferida (generado una sola vez entre procesos). None si no
+    existe; NarrativaNoDisponible si el LLM no respondió (la plantilla no se memoriza como texto IA)
+    """
+    pendiente = obtener_narrativa_pendiente(narrativa_id)
+    if pendiente is None:
+        return None
+    
+    def _generar():
+        analysis = AIAnalyzer().analizar_indicador(
+            eje=pendiente['eje'],
+            indicador=pendiente['indicador'],
+            meta=pendiente['meta'],
+            valor_inicial=pendiente['valor_inicial'],
+            valor_actual=pendiente['valor_actual'],
+            datos_scraping=pendiente['datos_scraping'],
+            contexto=pendiente['indicador'],
+            narrativa='llm'
+        )
+        return analysis['analisis'] if analysis['narrativa'] == 'llm' else None
+    
+    analisis = almacen.memoizar('narrativas_texto', narrativa_id, NARRATIVAS_TTL, _generar)
+    if analisis is None:
+        raise NarrativaNoDisponible("Ollama no respondió; reintente más tarde")
+    return analisis
+
+def _obtener_valor_actual_inteligente(datos_scraping, indicador):
+    """
+    Selecciona el valor MÁS CONFIABLE extraído por Ollama o regex
+    Prioridad: 
+    1. Ollama con alta confianza (8-10) y año 2025
+    2. Ollama con confianza media (5-7) y año 2025
+    3. Ollama año 2024
+    4. Regex con alta relevancia
+    """
+    if not datos_scraping:
+        print("      ⚠️ No hay datos de scraping")
+        return None
+    
+    numeros_contexto = []
+    for resultado in datos_scraping:
+        numeros_contexto.extend(resultado.get('numeros_contexto', []))
+    
+    if not numeros_contexto:
+        print("      ⚠️ No hay números en contexto")
+        return None
+    
+    print(f"\n      🎯 SELECCIÓN INTELIGENTE DE VALOR:")
+    print(f"         Candidatos totales: {len(numeros_contexto)}")
+    
+    # Separar por método de extracción
+    valores_ia = [n for n in numeros_contexto if n.get('metodo') == 'ollama_inteligente']
+    valores_regex = [n for n in numeros_contexto if n.get('metodo') == 'regex_fallback']
+    
+    print(f"         - Extraídos por IA (Ollama): {len(valores_ia)}")
+    print(f"         - Extraídos por Regex: {len(valores_regex)}")
+    
+    # PRIORIDAD 1: Valores de IA con alta confianza
+    if valores_ia:
+        # Ordenar por: año (2025 primero), luego confianza
+        valores_ia_ordenados = sorted(
+            valores_ia,
+            key=lambda x: (
+                x.get('año', 0) == 2025,
+                x.get('confianza_ia', 0),
+                x.get('relevancia', 0)
+            ),
+            reverse=True
+        )
+        
+        mejor_ia = valores_ia_ordenados[0]
+        confianza = mejor_ia.get('confianza_ia', 0)
+        
+        print(f"\n         🤖 MEJOR VALOR DE IA:")
+        print(f"            Valor: {mejor_ia['valor']} {mejor_ia.get('unidad', '')}")
+        print(f"            Año: {mejor_ia.get('año', '?')}")
+        print(f"            Confianza: {confianza}/10")
+        print(f"            Contexto: {mejor_ia.get('contexto', '')[:100]}...")
+        
+        # Si confianza es alta (≥6), usar ese valor
+        if confianza >= 6:
+            print(f"         ✅ SELECCIONADO (Alta confianza IA)")
+            return mejor_ia['valor']
+    
+    # PRIORIDAD 2: Si IA tiene baja confianza, verificar regex
+    if valores_regex:
+        valores_regex_ordenados = sorted(
+            valores_regex,
+            key=lambda x: (
+                x.get('año', 0) == 2025,
+                x.get('relevancia', 0)
+            ),
+            reverse=True
+        )
+        
+        mejor_regex = valores_regex_ordenados[0]
+        print(f"\n         ⚙️ MEJOR VALOR DE REGEX:")
+        print(f"            Valor: {mejor_regex['valor']} ({mejor_regex.get('tipo', '?')})")
+        print(f"            Año: {mejor_regex.get('año', '?')}")
+        print(f"            Relevancia: {mejor_regex.get('relevancia', 0)}")
+        
+        # Si hay IA pero baja confianza, comparar
+        if valores_ia:
+            mejor_ia = valores_ia_ordenados[0]
+            if mejor_ia.get('confianza_ia', 0) < 6 and mejor_regex.get('relevancia', 0) > 15:
+                print(f"         ✅ SELECCIONADO (Regex más confiable que IA)")
+                return mejor_regex['valor']
+            else:
+                print(f"         ✅ SELECCIONADO (IA preferida sobre regex)")
+                return mejor_ia['valor']
+        else:
+            print(f"         ✅ SELECCIONADO (Único método: regex)")
+            return mejor_regex['valor']
+    
+    # FALLBACK: Si solo hay IA con baja confianza
+    if valores_ia:
+        print(f"         ⚠️ SELECCIONADO (IA única opción, baja confianza)")
+        return valores_ia_ordenados[0]['valor']
+    
+    print(f"         ❌ No se pudo seleccionar valor confiable")
+    return None
+
+
+def resultado_fallido(row_data, mensaje, estado='error', valor_inicial='Error'):
+    """Fila de resultado para indicadores que no pudieron procesarse"""
+    return {
+        'eje': row_data.get('Eje', 'Sin eje'),
+        'indicador': row_data.get('Indicador', 'Sin indicador'),
+        'meta': row_data.get('Meta', 'Sin meta'),
+        'valor_inicial': valor_inicial,
+        'valor_actual': 'Error',
+        'progreso': 0,
+        'estado': estado,
+        'eficiencia': 'N/A',
+        'analisis': mensaje,
+        'fuente': 'Error',
+        **({'timeout': True, 'parcial': True} if estado == 'timeout' else {})
+    }
+
+def procesar_indicador(idx, total_indicators, row_data, narrativa='llm', deadline=None):
+    """
+    Pipeline completo de un indicador: scraping -> selección de valor -> análisis.
+    Con deadline: entre etapas se verifica el presupuesto; si se agota, el resultado
+    se devuelve parcial (cifras disponibles, narrativa de plantilla) con 'timeout': True.
+    """
+    local_scraper = DataScraper()
+    local_analyzer = AIAnalyzer()
+
+    print(f"\n{'#'*80}")
+    print(f"📋 INDICADOR {idx}/{total_indicators}")
+    print(f"{'#'*80}")
+
+    eje = row_data.get('Eje', 'Sin eje')
+    indicador = row_data.get('Indicador', 'Sin indicador')
+    meta = row_data.get('Meta', 'Sin meta')
+
+    print(f"📌 {indicador}")
+    print(f"🎯 {meta}")
+
+    # Extraer valor inicial
+    valor_inicial = row_data.get('ValorInicial')
+    if valor_inicial is None:
+        try:
+            if isinstance(row_data.get('Meta'), (int, float)):
+                valor_inicial = float(row_data.get('Meta'))
+            else:
+                m = re.search(r'(\d+[.,]?\d*)', str(row_data.get('Meta') or ''))
+                if m:
+                    valor_inicial = float(m.group(1).replace(',', '.'))
+        except:
+            valor_inicial = None
+
+    print(f"📊 Valor Inicial (Base): {valor_inicial}")
+
+    # Scraping inteligente CON META (para contexto)
+    try:
+        if deadline is not None:
+            deadline.verificar("scraping")
+        print(f"\n🔎 Iniciando búsqueda web inteligente...")
+        with etapa('scraping', indicador):
+            datos_scraping = local_scraper.buscar_datos(indicador, meta, deadline=deadline)
+        with etapa('seleccion_valor', indicador):
+            valor_actual = _obtener_valor_actual_inteligente(datos_scraping, indicador)
+    except DeadlineExceeded as e:
+        print(f"⏱️ {e}")
+        datos_scraping = []
+        valor_actual = None
+    except Exception as e:
+        print(f"❌ Error en scraping: {e}")
+        import traceback
+        traceback.print_exc()
+        datos_scraping = []
+        valor_actual = None
+
+    print(f"\n📊 VALOR ACTUAL FINAL: {valor_actual}")
+
+    # Sin tiempo para la narrativa con IA: se completa con la plantilla
+    agotado = deadline is not None and deadline.expirado()
+    if agotado and narrativa == 'llm':
+        narrativa = 'template'
+
+    # Análisis
+    try:
+        with etapa('analisis', indicador):
+            analysis = local_analyzer.analizar_indicador(
+                eje=eje,
+                indicador=indicador,
+                meta=meta,
+                valor_inicial=valor_inicial,
+                valor_actual=valor_actual,
+                datos_scraping=datos_scraping,
+                contexto=indicador,
+                narrativa=narrativa,
+                deadline=deadline
+            )
+
+        agotado = agotado or (deadline is not None and deadline.expirado())
+        if agotado:
+            analysis['timeout'] = True
+            analysis['parcial'] = True
+            print(f"⏱️ Resultado PARCIAL (deadline agotado)")
+
+        # También si se pidió 'llm' pero Ollama no respondió: la narrativa IA queda para después
+        if analysis.get('narrativa') != 'llm':
+            analysis['narrativa_id'] = registrar_narrativa_pendiente(
+                eje, indicador, meta, valor_inicial, valor_actual, datos_scraping
+            )
+
+        progreso = analysis.get('progreso', 0)
+        print(f"\n✅ ANÁLISIS COMPLETADO")
+        print(f"   Progreso: {progreso}%")
+        print(f"   Estado: {analysis.get('estado', 'N/A')}")
+        print(f"{'#'*80}\n")
+
+        return idx, {
+            'eje': eje,
+            'indicador': indicador,
+            'meta': meta,
+            'valor_inicial': analysis.get('valor_inicial', 'No disponible'),
+            'valor_actual': analysis.get('valor_actual', 'No disponible'),
+            **analysis
+        }
+
+    except Exception as e:
+        print(f"❌ Error en análisis: {e}")
+        import traceback
+        traceback.print_exc()
+        return idx, resultado_fallido(row_data, f"Error: {str(e)}", valor_inicial=valor_inicial or 'No disponible')
+
+
+def _normalizar(valor):
+    if valor is None:
+        return ''
+    return ' '.join(unicodedata.normalize('NFC', str(valor)).split()).casefold()
+
+def huella_indicador(row_data, narrativa='llm'):
+    """Identifica filas equivalentes aunque difieran en espacios o mayúsculas (el Eje no cuenta)"""
+    clave = json.dumps([
+        _normalizar(row_data.get('Indicador')),
+        _normalizar(row_data.get('Meta')),
+        _normalizar(row_data.get('ValorInicial')),
+        narrativa
+    ], ensure_ascii=False)
+    return hashlib.sha1(clave.encode('utf-8')).hexdigest()[:20]
+
+def agrupar_indicadores(indicators, narrativa='llm'):
+    """huella -> índices (base 0) de las filas que comparten el mismo cálculo, en orden de aparición"""
+    grupos = OrderedDict()
+    for i, row in enumerate(indicators):
+        grupos.setdefault(huella_indicador(row, narrativa), []).append(i)
+    return grupos
+
+def resultado_para_fila(resultado, row_data):
+    """Copia del resultado compartido con los textos propios de la fila (Eje incluido)"""
+    return {
+        **resultado,
+        'eje': row_data.get('Eje', 'Sin eje'),
+        'indicador': row_data.get('Indicador', resultado.get('indicador')),
+        'meta': row_data.get('Meta', resultado.get('meta'))
+    }
+
+def _es_memorizable(resultado):
+    return not resultado.get('timeout') and resultado.get('estado') not in ('error', 'timeout')
+
+def _procesar_con_turno(idx, total_indicators, row_data, narrativa, deadline, costo=0.0):
+    """Ejecuta el indicador cuando el control de concurrencia adaptativo da turno (menor costo primero)"""
+    try:
+        with controlador_analisis.turno(deadline, costo):
+            return procesar_indicador(idx, total_indicators, row_data, narrativa, deadline)[1]
+    except DeadlineExceeded as e:
+        return resultado_fallido(row_data, f"Timeout esperando turno de análisis: {e}", estado='timeout')
+
+def calculo_disponible(row_data, narrativa='llm'):
+    """True si el indicador ya está calculado o en curso en este proceso"""
+    return _memo_resultados.disponible(huella_indicador(row_data, narrativa))
+
+def procesar_indicador_compartido(idx, total_indicators, row_data, narrativa='llm', deadline=None, costo=0.0):
+    """
+    procesar_indicador memoizado por huella: una solicitud concurrente (o reciente,
+    dentro de MEMO_RESULTADOS_TTL) con el mismo indicador reutiliza el cálculo.
+    `costo`: segundos estimados (planificador.py), ordena la espera de turno
+    """
+    huella = huella_indicador(row_data, narrativa)
+    try:
+        resultado, compartido = _memo_resultados.obtener_o_calcular(
+            huella,
+            lambda: _procesar_con_turno(idx, total_indicators, row_data, narrativa, deadline, costo),
+            guardar_si=_es_memorizable,
+            timeout=timeout_de(deadline),
+            # Un resultado parcial de otra solicitud (deadline más corto, cliente que se
+            # desconectó) no sirve si a esta todavía le queda tiempo
+            reintentar=lambda: deadline is None or not deadline.expirado()
+        )
+    except FuturesTimeout:
+        return idx, resultado_fallido(row_data, "Timeout esperando un cálculo compartido", estado='timeout')
+    
+    if compartido:
+        print(f"♻️ INDICADOR {idx}/{total_indicators} reutilizado de un cálculo compartido")
+    return idx, resultado_para_fila(resultado, row_data)
@@ -0,0 +1,95 @@
+import os
+import time
+
+from scraper import DataScraper
+from indice import indice
+from metricas import metricas
+from almacen import CACHE_DOCUMENTOS_TTL
+from pipeline import calculo_disponible
+
+# 'costo': los indicadores más baratos primero (con envejecimiento, ver concurrencia.py);
+# 'fifo': orden de la planilla
+PLANIFICADOR = os.getenv('PLANIFICADOR', 'costo')
+
+# Tiempos por etapa mientras el proceso no tiene historial propio
+COSTOS_POR_DEFECTO = {
+    'descarga_pdf': 15.0,
+    'lectura_pdf': 10.0,
+    'descarga_html': 3.0,
+    'extraccion_html': 0.2,
+    'llm': 20.0
+}
+# Tope de texto que la extracción envía al LLM (ver extraer_con_ollama_inteligente)
+MAX_CHARS_LLM = 15000
+
+
+class EstimadorCosto:
+    """
+    Segundos esperados de un indicador según sus fuentes (PDF/HTML), si ya están
+    en el índice local (y de qué tamaño) y los tiempos históricos por etapa de
+    este proceso (metricas). Un indicador con resultado en el memo cuesta 0.
+    Los valores son relativos: sirven para ordenar, no como pronóstico.
+    """
+
+    def __init__(self):
+        self.scraper = DataScraper()
+        tiempos = metricas.instantanea()['tiempos']
+        self.etapas = {
+            etapa: tiempos[etapa]['promedio_s'] if tiempos.get(etapa, {}).get('n') else defecto
+            for etapa, defecto in COSTOS_POR_DEFECTO.items()
+        }
+        self._por_url = {}
+
+    def costo_fuente(self, url):
+        costo = self._por_url.get(url)
+        if costo is None:
+            info = indice.info_documento(url)
+            if info is not None and time.time() - info['actualizado'] <= CACHE_DOCUMENTOS_TTL:
+                costo = 0.0
+                fraccion = min(1.0, (info['caracteres'] or 0) / MAX_CHARS_LLM)
+            elif self.scraper.es_pdf_por_url(url):
+                costo = self.etapas['descarga_pdf'] + self.etapas['lectura_pdf']
+                fraccion = 1.0
+            else:
+                costo = self.etapas['descarga_html'] + self.etapas['extraccion_html']
+                fraccion = 1.0
+            # El tiempo del LLM crece con el texto del prompt
+            costo += self.etapas['llm'] * (0.5 + 0.5 * fraccion)
+            self._por_url[url] = costo
+        return costo
+
+    def estimar(self, row_data, narrativa='llm'):
+        if calculo_disponible(row_data, narrativa):
+            return 0.0
+        _, urls = self.scraper.fuentes_para(row_data.get('Indicador'))
+        # Las fuentes se consultan en paralelo: manda la más lenta
+        costo = max(self.costo_fuente(url) for url in urls)
+        if narrativa == 'llm':
+            costo += self.etapas['llm']
+        return round(costo, 2)
+
+
+def ordenar_por_costo(grupos, indicators, narrativa='llm'):
+    """
+    [(huella, filas, costo)] de agrupar_indicadores: el más barato primero
+    (orden de la planilla ante empates o con PLANIFICADOR=fifo)
+    """
+    if PLANIFICADOR != 'costo':
+        return [(huella, filas, 0.0) for huella, filas in grupos.items()]
+    estimador = EstimadorCosto()
+    plan = [
+        (huella, filas, estimador.estimar(indicators[filas[0]], narrativa))
+        for huella, filas in grupos.items()
+    ]
+    plan.sort(key=lambda p: p[2])
+    return plan
+
+
+def resumen_plan(plan):
+    if PLANIFICADOR != 'costo':
+        return "orden de la planilla"
+    costos = sorted(costo for _, _, costo in plan)
+    if not costos:
+        return "sin indicadores"
+    return (f"{sum(1 for c in costos if c == 0)} ya calculados, "
+            f"mediana ≈{costos[len(costos) // 2]:.0f}s, máximo ≈{costos[-1]:.0f}s")
@@ -0,0 +1,162 @@
+import os
+import time
+import threading
+
+import llm
+import ingesta
+from scraper import DataScraper
+from indice import indice
+from deadline import Deadline
+from metricas import metricas
+from concurrencia import analisis_en_curso
+from almacen import almacen, CACHE_DOCUMENTOS_TTL
+
+PRECARGA_ACTIVA = os.getenv('PRECARGA', '1') == '1'
+
+try:
+    PRECARGA_INTERVALO_SECONDS = float(os.getenv('PRECARGA_INTERVALO_SECONDS', '3600'))
+except ValueError:
+    PRECARGA_INTERVALO_SECONDS = 3600.0
+
+# Se renuevan los documentos con más de esta fracción de CACHE_DOCUMENTOS_TTL,
+# así una solicitud nunca encuentra uno vencido entre dos ciclos
+FRACCION_RENOVACION = 0.5
+ESPERA_INICIAL_SECONDS = 5
+# Mientras haya análisis en curso en esta máquina (cualquier proceso que comparta
+# CACHE_DIR) la precarga espera: cede la red, la CPU y Ollama
+PAUSA_OCUPADO_SECONDS = 2
+MAX_SECONDS_POR_DOCUMENTO = 300
+
+
+def _bajar_prioridad():
+    """nice 19 solo para este hilo (en Linux cada hilo tiene su propia prioridad)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+class Precargador:
+    """
+    Calienta las cachés en segundo plano, al arrancar y cada PRECARGA_INTERVALO_SECONDS:
+    - carga en memoria de Ollama los modelos de la cascada de extracción;
+    - recorre el catálogo de fuentes (DataScraper.FUENTES) y descarga/extrae/indexa
+      los documentos nuevos o que cambiaron (ETag/Last-Modified vía HEAD).
+    Un solo proceso del host ejecuta cada ciclo (candado en almacen) y se respetan
+    los turnos por host del scraper.
+    """
+
+    def __init__(self, intervalo=PRECARGA_INTERVALO_SECONDS):
+        self.intervalo = intervalo
+        self.scraper = DataScraper()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._pid = None
+        self.ultimo_ciclo = None
+
+    def iniciar(self):
+        # Tras un fork el hilo del padre no existe en el hijo
+        if self._hilo is not None and self._hilo.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name='precarga', daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+    def _bucle(self):
+        _bajar_prioridad()
+        if self._detener.wait(ESPERA_INICIAL_SECONDS):
+            return
+        while not self._detener.is_set():
+            try:
+                self.ejecutar_ciclo()
+            except Exception as e:
+                print(f"⚠️ Precarga: error en el ciclo: {e}")
+            self._detener.wait(self.intervalo)
+
+    def _ceder(self):
+        while analisis_en_curso() > 0 and not self._detener.is_set():
+            self._detener.wait(PAUSA_OCUPADO_SECONDS)
+
+    def ejecutar_ciclo(self):
+        if not almacen.adquirir_candado('precarga', ttl=max(self.intervalo, 600)):
+            return None
+        inicio = time.perf_counter()
+        resumen = {'modelo': False, 'descargados': 0, 'sin_cambios': 0, 'vigentes': 0, 'errores': 0}
+        try:
+            print(f"\n🔥 Precarga: calentando modelo y {len(self.scraper.catalogo_urls())} fuentes")
+            resumen['modelo'] = self.precargar_modelo()
+            for url in self.scraper.catalogo_urls():
+                self._ceder()
+                if self._detener.is_set():
+                    break
+                resumen[self.precargar_documento(url)] += 1
+        finally:
+            almacen.liberar_candado('precarga')
+
+        resumen['segundos'] = round(time.perf_counter() - inicio, 1)
+        resumen['hora'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.ultimo_ciclo = resumen
+        metricas.registrar_tiempo('precarga_ciclo', resumen['segundos'])
+        print(f"🔥 Precarga completada: {resumen}")
+        return resumen
+
+    def precargar_modelo(self):
+        modelos = [self.scraper.model]
+        if 'rapido' in self.scraper.niveles_cascada and llm.disponible(self.scraper.modelo_rapido):
+            modelos.insert(0, self.scraper.modelo_rapido)
+        cargados = True
+        for modelo in modelos:
+            try:
+                llm.precargar(modelo)
+            except Exception as e:
+                print(f"⚠️ Precarga: no se pudo cargar {modelo}: {e}")
+                cargados = False
+        return cargados
+
+    def precargar_documento(self, url):
+        """Devuelve 'vigentes', 'sin_cambios', 'descargados' o 'errores'"""
+        info = indice.info_documento(url)
+        if info is not None and time.time() - info['actualizado'] < CACHE_DOCUMENTOS_TTL * FRACCION_RENOVACION:
+            return 'vigentes'
+
+        try:
+            deadline = Deadline(MAX_SECONDS_POR_DOCUMENTO)
+            self.scraper.esperar_turno_host(url, deadline)
+            validadores = ingesta.validadores_remotos(url, self.scraper.headers)
+            if info is not None and validadores is not None and \
+               validadores == almacen.obtener('validadores_documento', url):
+                indice.renovar(url)
+                metricas.incrementar('precarga_sin_cambios')
+                return 'sin_cambios'
+
+            texto = self.scraper.obtener_texto_documento(url, deadline=deadline, forzar=info is not None)
+            if not texto:
+                metricas.incrementar('precarga_errores')
+                return 'errores'
+            if validadores is not None:
+                almacen.guardar('validadores_documento', url, validadores)
+            metricas.incrementar('precarga_descargados')
+            return 'descargados'
+        except Exception as e:
+            print(f"⚠️ Precarga: {url}: {e}")
+            metricas.incrementar('precarga_errores')
+            return 'errores'
+
+    def estado(self):
+        return {
+            'activa': self._hilo is not None and self._hilo.is_alive(),
+            'intervalo_s': self.intervalo,
+            'ultimo_ciclo': self.ultimo_ciclo
+        }
+
+
+precargador = Precargador()
+
+
+def iniciar_precarga():
+    if PRECARGA_ACTIVA:
+        precargador.iniciar()
@@ -0,0 +1,103 @@
+import gzip
+import hashlib
+import json
+import os
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# No vale la pena comprimir cuerpos pequeños
+MIN_BYTES_COMPRESION = 1024
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 5
+
+
+def serializar_json(payload):
+    """JSON a bytes UTF-8; usa orjson si está instalado (NaN -> null)"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def etag_de_bytes(datos):
+    return hashlib.sha256(datos).hexdigest()[:32]
+
+
+_etags_archivos = {}
+
+def etag_de_archivo(ruta):
+    """Hash del contenido de un archivo, recalculado solo si cambian mtime/tamaño"""
+    st = os.stat(ruta)
+    clave = (ruta, st.st_mtime_ns, st.st_size)
+    etag = _etags_archivos.get(clave)
+    if etag is None:
+        h = hashlib.sha256()
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(bloque)
+        etag = h.hexdigest()[:32]
+        _etags_archivos[clave] = etag
+    return etag
+
+
+def _codificacion_preferida():
+    aceptadas = request.accept_encodings
+    if brotli is not None and aceptadas['br']:
+        return 'br'
+    if aceptadas['gzip']:
+        return 'gzip'
+    return None
+
+
+def no_modificado(etag):
+    """True si el cliente ya tiene esta versión (If-None-Match), con o sin sufijo de codificación"""
+    if not etag:
+        return False
+    return any(request.if_none_match.contains(e) for e in (etag, f"{etag}-gzip", f"{etag}-br"))
+
+
+def respuesta_304(etag):
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return resp
+
+
+def respuesta_json(payload, status=200, etag=None, cache_control='no-cache', condicional=True):
+    """
+    Respuesta JSON comprimida según Accept-Encoding (br/gzip) con ETag fuerte.
+    Sin etag explícito se deriva del cuerpo serializado. Devuelve 304 si coincide
+    (solo en GET/HEAD). condicional=False: sin ETag, para respuestas que no se
+    repiten (p. ej. con texto del LLM) o cuyo trabajo ya se hizo al responder.
+    """
+    cuerpo = serializar_json(payload)
+    if not condicional:
+        etag = None
+    elif etag is None and status == 200:
+        etag = etag_de_bytes(cuerpo)
+    if status == 200 and request.method in ('GET', 'HEAD') and no_modificado(etag):
+        return respuesta_304(etag)
+
+    codificacion = _codificacion_preferida() if len(cuerpo) >= MIN_BYTES_COMPRESION else None
+    if codificacion == 'br':
+        cuerpo = brotli.compress(cuerpo, quality=CALIDAD_BROTLI)
+    elif codificacion == 'gzip':
+        cuerpo = gzip.compress(cuerpo, compresslevel=NIVEL_GZIP)
+
+    resp = Response(cuerpo, status=status, mimetype='application/json')
+    resp.headers['Vary'] = 'Accept-Encoding'
+    if codificacion:
+        resp.headers['Content-Encoding'] = codificacion
+    if etag:
+        # Cada representación comprimida lleva su propio ETag fuerte
+        resp.set_etag(f"{etag}-{codificacion}" if codificacion else etag)
+        resp.headers['Cache-Control'] = cache_control
+    return resp
@@ -1,91 +1,165 @@
 import os
 import re
-import requests
-import unicodedata
-import tempfile
-import pdfplumber
-from bs4 import BeautifulSoup
 from datetime import datetime
 import time
-import ollama
 import json
+import llm
+import ingesta
+from extraccion_html import texto_de_html
+from compactacion import compactar_texto
+from indice import indice, quitar_tildes
+from indice_numerico import indice_numerico
+from deadline import Deadline, DeadlineExceeded
+from metricas import metricas
+from almacen import almacen, CACHE_DOCUMENTOS_TTL, CACHE_LLM_TTL
+from perfilado import propagar
+from urllib.parse import urlparse
+import hashlib
+import heapq
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+
+try:
+    FUENTE_CONFIANZA_SUFICIENTE = int(os.getenv('FUENTE_CONFIANZA_SUFICIENTE', '8'))
+except ValueError:
+    FUENTE_CONFIANZA_SUFICIENTE = 8
+
+try:
+    MAX_FUENTES_CONCURRENTES = max(1, int(os.getenv('MAX_FUENTES_CONCURRENTES', '4')))
+except ValueError:
+    MAX_FUENTES_CONCURRENTES = 4
+
+# Cascada de extracción: cada nivel se intenta solo si el anterior no resolvió con confianza
+NIVELES_CASCADA = ('determinista', 'rapido', 'principal')
+CASCADA_EXTRACCION = tuple(
+    nivel for nivel in (n.strip() for n in os.getenv('CASCADA_EXTRACCION', ','.join(NIVELES_CASCADA)).split(','))
+    if nivel in NIVELES_CASCADA
+) or NIVELES_CASCADA
+
+try:
+    CASCADA_CONFIANZA_RAPIDO = int(os.getenv('CASCADA_CONFIANZA_RAPIDO', '8'))
+except ValueError:
+    CASCADA_CONFIANZA_RAPIDO = 8
+
+# Palabras del indicador que deben rodear al valor para aceptarlo sin LLM
+try:
+    CASCADA_PALABRAS_DETERMINISTA = int(os.getenv('CASCADA_PALABRAS_DETERMINISTA', '3'))
+except ValueError:
+    CASCADA_PALABRAS_DETERMINISTA = 3
+
+
+def estado_cascada():
+    """Intentos, aciertos y latencia por nivel de la cascada (para /api/metrics)"""
+    instantanea = metricas.instantanea()
+    contadores, tiempos = instantanea['contadores'], instantanea['tiempos']
+    estado = {}
+    for nivel in NIVELES_CASCADA:
+        intentos = contadores.get(f'cascada_{nivel}_intentos', 0)
+        aciertos = contadores.get(f'cascada_{nivel}_aciertos', 0)
+        t = tiempos.get(f'cascada_{nivel}', {})
+        estado[nivel] = {
+            'activo': nivel in CASCADA_EXTRACCION,
+            'intentos': intentos,
+            'aciertos': aciertos,
+            'tasa_acierto': round(aciertos / intentos, 3) if intentos else None,
+            'promedio_s': t.get('promedio_s'),
+            'total_s': round(t.get('total_s', 0.0), 2)
+        }
+    return estado
+
 
 class DataScraper:
-    def __init__(self, headers=None, rate_limit_seconds=2):
+    # Catálogo de fuentes oficiales por palabra clave del indicador (lo recorre también la precarga)
+    FUENTES = {
+        'pobreza multidimensional': [
+            'https://www.ecuadorencifras.gob.ec/documentos/web-inec/POBREZA/2024/Diciembre/202412_PobrezayDesigualdad.pdf'
+        ],
+        'pobreza extrema por ingresos': [
+            'https://www.ecuadorencifras.gob.ec/documentos/web-inec/POBREZA/2025/Junio/202506_Boletin_pobreza_ENEMDU.pdf',
+            'https://www.ecuadorencifras.gob.ec/documentos/web-inec/POBREZA/2024/Diciembre/202412_PobrezayDesigualdad.pdf'
+        ],
+        'pobreza extrema': [
+            'https://www.ecuadorencifras.gob.ec/documentos/web-inec/POBREZA/2025/Junio/202506_Boletin_pobreza_ENEMDU.pdf',
+            'https://www.ecuadorencifras.gob.ec/documentos/web-inec/POBREZA/2024/Diciembre/202412_PobrezayDesigualdad.pdf'
+        ],
+        'empleo adecuado': [
+            'https://www.ecuadorencifras.gob.ec/empleo-septiembre-2025/'
+        ],
+        'desempleo': [
+            'https://www.ecuadorencifras.gob.ec/documentos/web-inec/EMPLEO/2025/Septiembre/Trimestre_julio-septiembre_2025_Mercado_Laboral.pdf'
+        ],
+        'inversion extranjera directa': [
+            'https://www.produccion.gob.ec/wp-content/uploads/2025/08/BOLETIN-DE-CIFRAS-DE-INVERSIONES-I-TRIMESTRE-2025.pdf'
+        ],
+        'inversion extranjera': [
+            'https://www.produccion.gob.ec/wp-content/uploads/2025/08/BOLETIN-DE-CIFRAS-DE-INVERSIONES-I-TRIMESTRE-2025.pdf'
+        ],
+        'mortalidad por suicidio': [
+            'https://www.ecuadorencifras.gob.ec/documentos/web-inec/Poblacion_y_Demografia/Defunciones_Generales_2023/Boletin_tecnico_EDG_2023.pdf'
+        ],
+        'siniestros de transito': [
+            'https://confirmado.net/tema-accidentes-viales-en-ecuador-dejan-4-000-muertes-al-ano-y-sin-freno-a-la-vista/'
+        ],
+        'mortalidad': [
+            'https://www.ecuadorencifras.gob.ec/defunciones-generales/',
+            'https://www.ant.gob.ec/'
+        ],
+        'internet': [
+            'https://www.ecuadorencifras.gob.ec/documentos/web-inec/Estadisticas_Sociales/TIC/2023/230913_Boletin_Tecnico_Multiprop_TIC_2023_VF.pdf',
+            'https://www.ecuadorencifras.gob.ec/tecnologias-de-la-informacion-y-comunicacion-tic/'
+        ],
+        'fibra optica': [
+            'https://www.arcotel.gob.ec/estadisticas/',
+            'https://www.ecuadorencifras.gob.ec/tecnologias-de-la-informacion-y-comunicacion-tic/'
+        ],
+        'desnutricion': ['https://www.ecuadorencifras.gob.ec/encuesta-nacional-de-desnutricion-infantil-endi/'],
+        'homicidios': ['https://www.ministeriodelinterior.gob.ec/cifras-de-seguridad/'],
+        'seguridad': ['https://www.ministeriodelinterior.gob.ec/'],
+        'educacion': ['https://www.ecuadorencifras.gob.ec/estadisticas-educativas/'],
+        'salud': ['https://www.salud.gob.ec/estadisticas-de-salud-2/'],
+        'pib': ['https://www.bce.fin.ec/index.php/boletines-de-prensa-archivo/item/1421-la-economia-ecuatoriana-crecio']
+    }
+    FUENTE_POR_DEFECTO = 'https://www.ecuadorencifras.gob.ec'
+
+    def __init__(self, headers=None, rate_limit_seconds=2, confianza_suficiente=None, max_fuentes_concurrentes=None):
         self.headers = headers or {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
         self.rate_limit_seconds = rate_limit_seconds
         self.año_actual = 2025
-        self.model = "llama3.1:8b"
+        self.model = llm.MODELO_PRINCIPAL
+        self.modelo_rapido = llm.MODELO_RAPIDO
+        self.niveles_cascada = CASCADA_EXTRACCION
+        # Una fuente con dato del año actual y esta confianza detiene la búsqueda
+        self.confianza_suficiente = confianza_suficiente if confianza_suficiente is not None else FUENTE_CONFIANZA_SUFICIENTE
+        self.max_fuentes_concurrentes = max_fuentes_concurrentes or MAX_FUENTES_CONCURRENTES
 
     def quitar_tildes(self, texto):
-        if not isinstance(texto, str): return texto
-        return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+        return quitar_tildes(texto)
 
     def es_pdf_por_url(self, url):
         return url.lower().endswith('.pdf') if url else False
 
-    def identificar_fuentes(self, indicador):
-        """Identifica fuentes oficiales según el indicador"""
+    def fuentes_para(self, indicador):
+        """(clave del catálogo o None, urls) del indicador, sin efectos"""
         indicador_norm = self.quitar_tildes((indicador or '').lower())
         
-        fuentes = {
-            'pobreza multidimensional': [
-                'https://www.ecuadorencifras.gob.ec/documentos/web-inec/POBREZA/2024/Diciembre/202412_PobrezayDesigualdad.pdf'
-            ],
-            'pobreza extrema por ingresos': [
-                'https://www.ecuadorencifras.gob.ec/documentos/web-inec/POBREZA/2025/Junio/202506_Boletin_pobreza_ENEMDU.pdf',
-                'https://www.ecuadorencifras.gob.ec/documentos/web-inec/POBREZA/2024/Diciembre/202412_PobrezayDesigualdad.pdf'
-            ],
-            'pobreza extrema': [
-                'https://www.ecuadorencifras.gob.ec/documentos/web-inec/POBREZA/2025/Junio/202506_Boletin_pobreza_ENEMDU.pdf',
-                'https://www.ecuadorencifras.gob.ec/documentos/web-inec/POBREZA/2024/Diciembre/202412_PobrezayDesigualdad.pdf'
-            ],
-            'empleo adecuado': [
-                'https://www.ecuadorencifras.gob.ec/empleo-septiembre-2025/'
-            ],
-            'desempleo': [
-                'https://www.ecuadorencifras.gob.ec/documentos/web-inec/EMPLEO/2025/Septiembre/Trimestre_julio-septiembre_2025_Mercado_Laboral.pdf'
-            ],
-            'inversion extranjera directa': [
-                'https://www.produccion.gob.ec/wp-content/uploads/2025/08/BOLETIN-DE-CIFRAS-DE-INVERSIONES-I-TRIMESTRE-2025.pdf'
-            ],
-            'inversion extranjera': [
-                'https://www.produccion.gob.ec/wp-content/uploads/2025/08/BOLETIN-DE-CIFRAS-DE-INVERSIONES-I-TRIMESTRE-2025.pdf'
-            ],
-            'mortalidad por suicidio': [
-                'https://www.ecuadorencifras.gob.ec/documentos/web-inec/Poblacion_y_Demografia/Defunciones_Generales_2023/Boletin_tecnico_EDG_2023.pdf'
-            ],
-            'siniestros de transito': [
-                'https://confirmado.net/tema-accidentes-viales-en-ecuador-dejan-4-000-muertes-al-ano-y-sin-freno-a-la-vista/'
-            ],
-            'mortalidad': [
-                'https://www.ecuadorencifras.gob.ec/defunciones-generales/',
-                'https://www.ant.gob.ec/'
-            ],
-            'internet': [
-                'https://www.ecuadorencifras.gob.ec/documentos/web-inec/Estadisticas_Sociales/TIC/2023/230913_Boletin_Tecnico_Multiprop_TIC_2023_VF.pdf',
-                'https://www.ecuadorencifras.gob.ec/tecnologias-de-la-informacion-y-comunicacion-tic/'
-            ],
-            'fibra optica': [
-                'https://www.arcotel.gob.ec/estadisticas/',
-                'https://www.ecuadorencifras.gob.ec/tecnologias-de-la-informacion-y-comunicacion-tic/'
-            ],
-            'desnutricion': ['https://www.ecuadorencifras.gob.ec/encuesta-nacional-de-desnutricion-infantil-endi/'],
-            'homicidios': ['https://www.ministeriodelinterior.gob.ec/cifras-de-seguridad/'],
-            'seguridad': ['https://www.ministeriodelinterior.gob.ec/'],
-            'educacion': ['https://www.ecuadorencifras.gob.ec/estadisticas-educativas/'],
-            'salud': ['https://www.salud.gob.ec/estadisticas-de-salud-2/'],
-            'pib': ['https://www.bce.fin.ec/index.php/boletines-de-prensa-archivo/item/1421-la-economia-ecuatoriana-crecio']
-        }
-        
-        for clave, urls in sorted(fuentes.items(), key=lambda x: len(x[0]), reverse=True):
+        for clave, urls in sorted(self.FUENTES.items(), key=lambda x: len(x[0]), reverse=True):
             if clave in indicador_norm:
-                print(f"   ✓ Fuentes identificadas para: '{clave}'")
-                return urls
+                return clave, urls
         
-        return ['https://www.ecuadorencifras.gob.ec']
+        return None, [self.FUENTE_POR_DEFECTO]
+
+    def identificar_fuentes(self, indicador):
+        """Identifica fuentes oficiales según el indicador"""
+        clave, urls = self.fuentes_para(indicador)
+        if clave is not None:
+            print(f"   ✓ Fuentes identificadas para: '{clave}'")
+        return urls
+
+    def catalogo_urls(self):
+        """Todas las URLs que identificar_fuentes puede devolver, sin repetir"""
+        urls = [url for lista in self.FUENTES.values() for url in lista] + [self.FUENTE_POR_DEFECTO]
+        return list(dict.fromkeys(urls))
 
     def determinar_rango_esperado(self, indicador, meta):
         """
@@ -136,49 +210,42 @@ class DataScraper:
                 'excluir': [100, 1000, 10000, 100000]  # Números redondos probablemente son unidades
             }
 
-    def extraer_texto_completo_pdf(self, url, timeout=60):
-        """Extrae TODO el texto del PDF sin límites"""
+    def extraer_texto_completo_pdf(self, url, timeout=60, deadline=None):
+        """
+        Extrae el texto del PDF con memoria acotada (ver ingesta.py):
+        descarga con tope de tamaño, páginas volcadas a disco y limpieza garantizada
+        """
+        tmp_path = None
         try:
             print(f"      📥 Descargando PDF completo...")
-            resp = requests.get(url, headers=self.headers, timeout=timeout, stream=True)
-            
-            if resp.status_code != 200:
-                print(f"      ⚠️ HTTP {resp.status_code}")
+            with metricas.cronometro('descarga_pdf'):
+                tmp_path = ingesta.descargar_a_archivo(url, self.headers, timeout=timeout, deadline=deadline, sufijo='.pdf')
+            if tmp_path is None:
                 return None
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-                for chunk in resp.iter_content(chunk_size=8192):
-                    tmp.write(chunk)
-                tmp_path = tmp.name
-            
             print(f"      📖 Leyendo PDF completo...")
-            texto_completo = []
-            
-            with pdfplumber.open(tmp_path) as pdf:
-                total_pages = len(pdf.pages)
-                print(f"      📄 Total de páginas: {total_pages}")
-                
-                for i, page in enumerate(pdf.pages, 1):
-                    page_text = page.extract_text(layout=True) or ""
-                    texto_completo.append(page_text)
-                    if i % 5 == 0:
-                        print(f"         Procesadas {i}/{total_pages} páginas...")
-            
-            os.remove(tmp_path)
-            full_text = "\n".join(texto_completo)
+            with metricas.cronometro('lectura_pdf'):
+                full_text, total_pages = ingesta.extraer_texto_pdf(tmp_path, deadline=deadline)
             print(f"      ✅ Extraído: {len(full_text):,} caracteres de {total_pages} páginas")
             
             return full_text
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"      ❌ Error en PDF: {e}")
             return None
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
-    def extraer_con_ollama_inteligente(self, texto_completo, indicador, meta):
+    def extraer_con_ollama_inteligente(self, texto_completo, indicador, meta, deadline=None, model=None):
         """
         USA OLLAMA PARA LEER Y ENTENDER EL DOCUMENTO COMPLETO
         MEJORADO: Con validación de rangos y exclusión de valores de unidades
+        model: modelo de Ollama (por defecto self.model; la cascada pasa el rápido)
         """
+        model = model or self.model
         if not texto_completo or len(texto_completo) < 100:
             print("      ⚠️ Texto insuficiente para análisis con IA")
             return []
@@ -189,13 +256,18 @@ class DataScraper:
         if rango['excluir']:
             print(f"      🚫 Valores a IGNORAR (son unidades, no datos): {rango['excluir']}")
         
+        # Compactar: sin relleno de layout, cabeceras/pies repetidos ni boilerplate
+        texto_compacto, stats = compactar_texto(texto_completo, palabras_clave=indicador.lower().split())
+        print(f"      🗜️ Compactado: {stats['chars_antes']:,} → {stats['chars_despues']:,} caracteres "
+              f"(~{stats['tokens_antes']:,} → ~{stats['tokens_despues']:,} tokens)")
+        
         # Limitar texto si es muy largo
         max_chars = 15000
-        if len(texto_completo) > max_chars:
-            texto_analisis = texto_completo[:max_chars//2] + "\n...\n" + texto_completo[-max_chars//2:]
+        if len(texto_compacto) > max_chars:
+            texto_analisis = texto_compacto[:max_chars//2] + "\n...\n" + texto_compacto[-max_chars//2:]
             print(f"      📝 Texto reducido a {len(texto_analisis):,} caracteres")
         else:
-            texto_analisis = texto_completo
+            texto_analisis = texto_compacto
         
         # Construir prompt MEJORADO con instrucciones de exclusión
         prompt = f"""Eres un experto analista de datos estadísticos oficiales de Ecuador.
@@ -239,17 +311,21 @@ Si NO encuentras un valor válido:
 """
         
         try:
-            print(f"\n      🤖 OLLAMA analizando con filtros anti-confusión...")
+            print(f"\n      🤖 OLLAMA ({model}) analizando con filtros anti-confusión...")
             
-            respuesta = ollama.chat(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "Eres un analista experto. Respondes SOLO en JSON válido. NO confundes unidades con datos."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            messages = [
+                {"role": "system", "content": "Eres un analista experto. Respondes SOLO en JSON válido. NO confundes unidades con datos."},
+                {"role": "user", "content": prompt}
+            ]
             
-            respuesta_text = respuesta.get("message", {}).get("content", "").strip()
+            # Mismo modelo + mismo prompt => misma extracción (caché compartida entre procesos)
+            clave = hashlib.sha256(f"{model}\n{prompt}".encode('utf-8')).hexdigest()
+            respuesta_text = almacen.memoizar(
+                'llm_extraccion', clave, CACHE_LLM_TTL,
+                lambda: llm.chat(model=model, messages=messages, deadline=deadline).get("message", {}).get("content", ""),
+                deadline=deadline
+            ) or ""
+            respuesta_text = respuesta_text.strip()
             
             # Limpiar respuesta
             respuesta_text = re.sub(r'^```json\s*', '', respuesta_text)
@@ -292,13 +368,17 @@ Si NO encuentras un valor válido:
                     'relevancia': relevancia,
                     'confianza_ia': confianza,
                     'unidad': resultado.get('unidad', ''),
-                    'metodo': 'ollama_inteligente'
+                    'metodo': 'ollama_inteligente',
+                    'modelo': model
                 }]
             else:
                 print(f"      ⚠️ IA no encontró valor: {resultado.get('razon', 'Sin razón')}")
                 return []
                 
+        except DeadlineExceeded:
+            raise
         except json.JSONDecodeError as e:
+            almacen.eliminar('llm_extraccion', clave)
             print(f"      ❌ Error JSON: {e}")
             print(f"         Respuesta: {respuesta_text[:300]}")
             return []
@@ -311,172 +391,291 @@ Si NO encuentras un valor válido:
     def extraer_valores_fallback_regex(self, texto, indicador, meta):
         """
         Sistema de respaldo con regex MEJORADO
-        Incluye validación de rangos
+        Incluye validación de rangos. Consulta el índice numérico del documento
+        (una sola pasada, reutilizado entre indicadores) y se queda con el top 5.
         """
         print(f"      ⚙️ Usando extracción regex de respaldo...")
         
         rango = self.determinar_rango_esperado(indicador, meta)
-        resultados = []
-        indicador_lower = indicador.lower()
-        
-        # Patrones según tipo de indicador
-        if rango['tipo'] == 'tasa_por_100k':
-            # CRÍTICO: Capturar SOLO la tasa, NO los 100,000
-            patrones = [
-                (r'(?:fue|alcanzó|registró|ubicó)\s+(?:de|en)?\s*(\d+[.,]\d+)\s*(?:por\s+cada|cada)\s*100', 'tasa_por_100k'),
-                (r'(\d+[.,]\d+)\s*(?:por\s+cada|cada)\s*100[.,]?000', 'tasa_por_100k'),
-                (r'tasa\s+(?:de\s+)?(?:mortalidad|siniestros|accidentes)\s+(?:fue|es)?\s*(\d+[.,]\d+)', 'tasa_por_100k')
-            ]
-        elif rango['tipo'] == 'porcentaje':
-            patrones = [
-                (r'(?:fue|alcanzó|llegó|registró|ubicó)\s+(?:de|en)?\s*(\d+[.,]\d+)\s*%', 'porcentaje'),
-                (r'(\d+[.,]\d+)\s*%', 'porcentaje')
-            ]
-        elif rango['tipo'] == 'monetario':
-            patrones = [
-                (r'USD\s*(\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?)\s*millones?', 'monetario'),
-                (r'(\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?)\s*millones?\s*(?:de\s+)?USD', 'monetario')
-            ]
-        else:
-            patrones = [
-                (r'(\d+[.,]\d+)\s*(?:casos|personas|hogares)', 'absoluto')
-            ]
+        indice_doc = indice_numerico(texto)
+        palabras_indicador = [p for p in indicador.lower().split() if len(p) > 3]
+        validos = 0
         
-        for patron, tipo in patrones:
-            for match in re.finditer(patron, texto, re.IGNORECASE):
-                try:
-                    val_str = match.group(1).replace('.', '').replace(',', '.')
-                    val = float(val_str)
-                    
-                    # VALIDACIÓN: Rechazar valores excluidos
-                    if val in rango['excluir']:
-                        continue
-                    
-                    # VALIDACIÓN: Verificar rango
-                    if not (rango['min'] <= val <= rango['max']):
-                        continue
-                    
-                    start = max(0, match.start() - 300)
-                    end = min(len(texto), match.end() + 300)
-                    contexto = texto[start:end]
-                    
-                    año_match = re.search(r'(202[0-5])', contexto)
-                    año = int(año_match.group(1)) if año_match else None
-                    
-                    relevancia = 5
-                    if año == 2025:
-                        relevancia += 20
-                    elif año == 2024:
-                        relevancia += 10
-                    
-                    palabras_indicador = [p for p in indicador_lower.split() if len(p) > 3]
-                    for palabra in palabras_indicador:
-                        if palabra in contexto.lower():
-                            relevancia += 5
-                    
-                    resultados.append({
-                        'valor': val,
-                        'texto_raw': match.group(0),
-                        'contexto': contexto,
-                        'tipo': tipo,
-                        'año': año,
-                        'relevancia': relevancia,
-                        'metodo': 'regex_fallback'
-                    })
-                except:
+        def _candidatos():
+            nonlocal validos
+            for token in indice_doc.tokens(rango['tipo']):
+                # VALIDACIÓN: Rechazar valores excluidos y fuera de rango
+                if token.valor in rango['excluir'] or not (rango['min'] <= token.valor <= rango['max']):
                     continue
+                validos += 1
+                
+                año = indice_doc.año_cercano(token)
+                relevancia = 5
+                if año == 2025:
+                    relevancia += 20
+                elif año == 2024:
+                    relevancia += 10
+                cercanas = indice_doc.palabras_cercanas(token, palabras_indicador)
+                relevancia += 5 * cercanas
+                yield token, año, relevancia, cercanas
         
-        resultados.sort(key=lambda x: (x.get('año', 0) == 2025, x.get('relevancia', 0)), reverse=True)
+        # Top-k sin ordenar todos los candidatos (nlargest conserva el orden estable de sorted)
+        mejores = heapq.nlargest(5, _candidatos(), key=lambda c: (c[1] == 2025, c[2]))
+        resultados = [
+            {
+                'valor': token.valor,
+                'texto_raw': token.texto_raw,
+                'contexto': indice_doc.contexto(token),
+                'tipo': token.unidad,
+                'año': año,
+                'relevancia': relevancia,
+                'palabras_cercanas': cercanas,
+                'metodo': 'regex_fallback'
+            }
+            for token, año, relevancia, cercanas in mejores
+        ]
         
-        if resultados:
-            print(f"      ✅ Regex encontró {len(resultados)} candidatos válidos")
+        if validos:
+            print(f"      ✅ Regex encontró {validos} candidatos válidos")
         
-        return resultados[:5]
+        return resultados
 
-    def buscar_datos(self, indicador, meta=""):
+    def extraer_texto_html(self, url, timeout=20, deadline=None):
+        """Texto visible de una página web (sin boilerplate, tablas fila por fila)"""
+        with metricas.cronometro('descarga_html'):
+            contenido = ingesta.descargar_bytes(url, self.headers, timeout=timeout, deadline=deadline)
+        if contenido is None:
+            return None
+        
+        # lxml + poda por XPath; las tablas quedan como filas 'a | b | c'
+        texto = texto_de_html(contenido)
+        del contenido
+        return texto
+
+    def esperar_turno_host(self, url, deadline=None):
+        """Respeta rate_limit_seconds entre solicitudes al mismo host (compartido entre procesos)"""
+        espera = almacen.reservar_turno(urlparse(url).netloc, self.rate_limit_seconds)
+        if espera > 0:
+            if deadline is not None:
+                deadline.esperar(espera)
+                deadline.verificar("espera de turno")
+            else:
+                time.sleep(espera)
+
+    def obtener_texto_documento(self, url, deadline=None, forzar=False):
+        """
+        Texto de la fuente (PDF o HTML): primero el índice local de documentos;
+        si no está (o es viejo), lo descarga un solo proceso, lo indexa y el resto
+        reutiliza el resultado. Con forzar se descarga aunque esté en el índice.
+        """
+        def _leer():
+            return indice.texto_documento(url, max_edad=CACHE_DOCUMENTOS_TTL)
+        
+        def _descargar():
+            self.esperar_turno_host(url, deadline)
+            if self.es_pdf_por_url(url):
+                texto = self.extraer_texto_completo_pdf(url, deadline=deadline)
+            else:
+                texto = self.extraer_texto_html(url, deadline=deadline)
+            if texto:
+                indice.indexar_documento(url, texto)
+            return texto
+        
+        if forzar:
+            return almacen.calcular_una_vez(f"documento:{url}", lambda: None, _descargar, deadline=deadline)
+        
+        texto = _leer()
+        if texto is not None:
+            print(f"      📚 Desde índice local ({len(texto):,} caracteres)")
+            metricas.incrementar('documentos_desde_indice')
+            return texto
+        return almacen.calcular_una_vez(f"documento:{url}", _leer, _descargar, deadline=deadline)
+
+    def buscar_en_indice(self, consulta, limite=10):
+        """Consulta local: ¿dónde aparece esta cifra/término en los documentos ya ingeridos?"""
+        return indice.buscar(consulta, limite=limite)
+
+    def _resultado_fuente(self, url, valores, metodo):
+        if metodo == 'ollama':
+            fechas = [f"{v.get('mes', 'Año')} {v.get('año', '?')}" for v in valores]
+        else:
+            fechas = [f"Año {v.get('año', '?')}" for v in valores]
+        return {
+            'fuente': url,
+            'numeros_contexto': valores,
+            'fechas_encontradas': fechas,
+            'tiene_datos_2025': any(v.get('año') == 2025 for v in valores),
+            'metodo_principal': metodo
+        }
+
+    def procesar_fuente(self, url, indicador, meta="", deadline=None):
+        """Extrae valores de una fuente: IA con validación y, si no hay, regex. None si nada"""
+        texto = self.obtener_texto_documento(url, deadline=deadline)
+        
+        # Las páginas web con poco texto suelen ser portadas/errores
+        minimo = 0 if self.es_pdf_por_url(url) else 200
+        if not texto or len(texto) <= minimo:
+            return None
+        
+        valores, metodo = self.extraer_en_cascada(texto, indicador, meta, deadline=deadline)
+        if valores:
+            return self._resultado_fuente(url, valores, metodo)
+        return None
+
+    def _determinista_confiable(self, candidatos, indicador):
+        """
+        El mejor candidato regex basta si es del año actual, está rodeado por las
+        palabras del indicador y ningún candidato igual de bueno dice otra cosa
+        """
+        if not candidatos:
+            return False
+        mejor = candidatos[0]
+        requeridas = min(len([p for p in indicador.lower().split() if len(p) > 3]), CASCADA_PALABRAS_DETERMINISTA)
+        if mejor.get('año') != self.año_actual or requeridas == 0 or mejor['palabras_cercanas'] < requeridas:
+            return False
+        return not any(
+            c['valor'] != mejor['valor'] and c.get('año') == mejor['año'] and c['relevancia'] >= mejor['relevancia']
+            for c in candidatos[1:]
+        )
+
+    def extraer_en_cascada(self, texto, indicador, meta, deadline=None):
+        """
+        Extracción escalonada (niveles en self.niveles_cascada):
+        1. determinista: índice numérico/regex, sin inferencia;
+        2. rapido: modelo pequeño (self.modelo_rapido), aceptado con confianza ≥ CASCADA_CONFIANZA_RAPIDO;
+        3. principal: self.model, solo para los casos que los niveles previos no resolvieron.
+        Todos los valores pasan por determinar_rango_esperado. Si ningún nivel resuelve
+        se devuelve lo mejor disponible (IA de baja confianza, luego regex).
+        Devuelve (valores, metodo) con metodo 'ollama' | 'regex_fallback' | None.
+        """
+        valores_regex = None
+        provisional = None
+        for nivel in self.niveles_cascada:
+            if nivel == 'determinista':
+                metricas.incrementar('cascada_determinista_intentos')
+                with metricas.cronometro('cascada_determinista'):
+                    valores_regex = self.extraer_valores_fallback_regex(texto, indicador, meta)
+                    resuelto = self._determinista_confiable(valores_regex, indicador)
+                valores, metodo = valores_regex, 'regex_fallback'
+            else:
+                modelo = self.modelo_rapido if nivel == 'rapido' else self.model
+                if not llm.disponible(modelo):
+                    continue
+                metricas.incrementar(f'cascada_{nivel}_intentos')
+                with metricas.cronometro(f'cascada_{nivel}'):
+                    valores = self.extraer_con_ollama_inteligente(texto, indicador, meta, deadline=deadline, model=modelo)
+                # El modelo principal es el último recurso: cualquier valor válido resuelve
+                resuelto = bool(valores) and (
+                    nivel == 'principal' or (valores[0].get('confianza_ia') or 0) >= CASCADA_CONFIANZA_RAPIDO
+                )
+                metodo = 'ollama'
+                if valores and not resuelto:
+                    provisional = valores
+
+            if resuelto:
+                metricas.incrementar(f'cascada_{nivel}_aciertos')
+                print(f"      🪜 Cascada resuelta en nivel '{nivel}'")
+                for v in valores:
+                    v['cascada'] = nivel
+                return valores, metodo
+            print(f"      🪜 Nivel '{nivel}' sin resultado confiable: se escala")
+
+        if provisional:
+            return provisional, 'ollama'
+        if valores_regex is None:
+            valores_regex = self.extraer_valores_fallback_regex(texto, indicador, meta)
+        if valores_regex:
+            return valores_regex, 'regex_fallback'
+        return [], None
+
+    def _clave_calidad(self, resultado):
+        """Orden de preferencia de una fuente (mismo criterio que la selección de valor)"""
+        return max(
+            (
+                (v.get('año', 0) == 2025, v.get('confianza_ia', 0), v.get('relevancia', 0))
+                for v in resultado.get('numeros_contexto', [])
+            ),
+            default=(False, 0, 0)
+        )
+
+    def es_resultado_suficiente(self, resultado):
+        """
+        Criterio de parada: un valor de IA del año actual con confianza ≥ confianza_suficiente,
+        o uno que la cascada aceptó sin LLM (ya exige año actual y contexto del indicador)
+        """
+        return any(
+            v.get('cascada') == 'determinista'
+            or (v.get('metodo') == 'ollama_inteligente'
+                and v.get('año') == self.año_actual
+                and (v.get('confianza_ia') or 0) >= self.confianza_suficiente)
+            for v in resultado.get('numeros_contexto', [])
+        )
+
+    def buscar_datos(self, indicador, meta="", deadline=None):
         """
         Búsqueda inteligente con validación de rangos
+        Las fuentes se consultan en paralelo y se ordenan por calidad al llegar;
+        en cuanto una es suficiente (ver es_resultado_suficiente) se cancela el resto.
+        Con deadline: devuelve los resultados parciales obtenidos hasta agotarse el tiempo
         """
         fuentes = self.identificar_fuentes(indicador)
         
         print(f"\n{'='*70}")
         print(f"🔍 BÚSQUEDA: {indicador}")
         print(f"🎯 Meta: {meta}")
+        print(f"⚡ Fuentes en paralelo: {min(len(fuentes), self.max_fuentes_concurrentes)}")
         print(f"{'='*70}")
         
         resultados_finales = []
+        # Deadline propio de la búsqueda: cancelarlo detiene las fuentes restantes sin afectar la solicitud
+        busqueda = deadline.derivar() if deadline is not None else Deadline()
+        inicio = time.perf_counter()
         
-        for idx, url in enumerate(fuentes, 1):
-            print(f"\n[{idx}/{len(fuentes)}] 🌐 {url}")
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, min(len(fuentes), self.max_fuentes_concurrentes)),
+            thread_name_prefix='fuente'
+        )
+        try:
+            futures = {
+                executor.submit(propagar(self.procesar_fuente), url, indicador, meta, busqueda): (idx, url)
+                for idx, url in enumerate(fuentes, 1)
+            }
             
-            try:
-                if self.es_pdf_por_url(url):
-                    texto_completo = self.extraer_texto_completo_pdf(url)
-                    
-                    if texto_completo:
-                        # Método 1: IA con validación
-                        valores_ia = self.extraer_con_ollama_inteligente(texto_completo, indicador, meta)
-                        
-                        if valores_ia:
-                            resultados_finales.append({
-                                'fuente': url,
-                                'numeros_contexto': valores_ia,
-                                'fechas_encontradas': [f"{v.get('mes', 'Año')} {v.get('año', '?')}" for v in valores_ia],
-                                'tiene_datos_2025': any(v.get('año') == 2025 for v in valores_ia),
-                                'metodo_principal': 'ollama'
-                            })
-                        else:
-                            # Método 2: Regex con validación
-                            valores_regex = self.extraer_valores_fallback_regex(texto_completo, indicador, meta)
-                            
-                            if valores_regex:
-                                resultados_finales.append({
-                                    'fuente': url,
-                                    'numeros_contexto': valores_regex,
-                                    'fechas_encontradas': [f"Año {v.get('año', '?')}" for v in valores_regex],
-                                    'tiene_datos_2025': any(v.get('año') == 2025 for v in valores_regex),
-                                    'metodo_principal': 'regex_fallback'
-                                })
-                else:
-                    # Páginas web
-                    resp = requests.get(url, headers=self.headers, timeout=20)
-                    soup = BeautifulSoup(resp.content, 'html.parser')
-                    
-                    for script in soup(["script", "style", "nav", "footer"]):
-                        script.decompose()
-                    
-                    texto = soup.get_text(separator=' ', strip=True)
-                    
-                    if texto and len(texto) > 200:
-                        valores_ia = self.extraer_con_ollama_inteligente(texto, indicador, meta)
-                        
-                        if valores_ia:
-                            resultados_finales.append({
-                                'fuente': url,
-                                'numeros_contexto': valores_ia,
-                                'fechas_encontradas': [f"{v.get('mes', 'Año')} {v.get('año', '?')}" for v in valores_ia],
-                                'tiene_datos_2025': any(v.get('año') == 2025 for v in valores_ia),
-                                'metodo_principal': 'ollama'
-                            })
-                        else:
-                            valores_regex = self.extraer_valores_fallback_regex(texto, indicador, meta)
-                            if valores_regex:
-                                resultados_finales.append({
-                                    'fuente': url,
-                                    'numeros_contexto': valores_regex,
-                                    'fechas_encontradas': [f"Año {v.get('año', '?')}" for v in valores_regex],
-                                    'tiene_datos_2025': any(v.get('año') == 2025 for v in valores_regex),
-                                    'metodo_principal': 'regex_fallback'
-                                })
+            for future in as_completed(futures, timeout=busqueda.restante()):
+                idx, url = futures[future]
+                try:
+                    resultado = future.result()
+                except DeadlineExceeded as e:
+                    print(f"      ⏱️ [{idx}/{len(fuentes)}] {url}: {e}")
+                    continue
+                except Exception as e:
+                    print(f"      ❌ [{idx}/{len(fuentes)}] {url}: {e}")
+                    continue
                 
-                time.sleep(self.rate_limit_seconds)
+                if not resultado:
+                    print(f"      ∅ [{idx}/{len(fuentes)}] {url}: sin datos válidos")
+                    continue
                 
-            except Exception as e:
-                print(f"      ❌ Error: {e}")
-                continue
+                resultados_finales.append(resultado)
+                resultados_finales.sort(key=self._clave_calidad, reverse=True)
+                print(f"      ✓ [{idx}/{len(fuentes)}] {url}: {len(resultado['numeros_contexto'])} valores ({resultado['metodo_principal']})")
+                
+                if self.es_resultado_suficiente(resultado):
+                    restantes = sum(1 for f in futures if not f.done())
+                    if restantes:
+                        print(f"      🏁 Fuente suficiente: se cancelan {restantes} fuentes restantes")
+                        metricas.incrementar('fuentes_canceladas_por_suficiente', restantes)
+                    break
+        except FuturesTimeout:
+            print(f"\n⏱️ Deadline agotado: se devuelven resultados parciales")
+        finally:
+            busqueda.cancelar("búsqueda finalizada")
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        metricas.registrar_tiempo('buscar_datos', time.perf_counter() - inicio)
         
         print(f"\n{'='*70}")
         print(f"✅ BÚSQUEDA COMPLETADA: {len(resultados_finales)} fuentes con datos válidos")
         print(f"{'='*70}\n")
         
-        return resultados_finales
\ No newline at end of file
+        return resultados_finales
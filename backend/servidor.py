@@ -0,0 +1,82 @@
+"""
+Entrada de producción: la API bajo gunicorn (pre-fork) con varios procesos.
+
+    python servidor.py                      # API_WORKERS procesos en 0.0.0.0:5050
+    python servidor.py --workers 4 --threads 8 --bind 127.0.0.1:5050
+
+Los procesos comparten cachés (documentos, extracciones IA), narrativas
+diferidas y turnos por host a través de almacen.py (SQLite en CACHE_DIR),
+así que no repiten descargas ni llamadas a Ollama entre ellos.
+"""
+import os
+import argparse
+from gunicorn.app.base import BaseApplication
+
+from almacen import almacen, CACHE_DIR
+
+
+def _int_env(nombre, defecto):
+    try:
+        return int(os.getenv(nombre, str(defecto)))
+    except ValueError:
+        return defecto
+
+
+class ServidorAPI(BaseApplication):
+    def __init__(self, opciones):
+        self.opciones = opciones
+        super().__init__()
+
+    def load_config(self):
+        for clave, valor in self.opciones.items():
+            if clave in self.cfg.settings and valor is not None:
+                self.cfg.set(clave, valor)
+
+    def load(self):
+        from app import app
+        return app
+
+
+def _post_fork(server, worker):
+    # Cada proceso abre su propia conexión SQLite (no se heredan del padre)
+    almacen._conexion()
+    # Los hilos de fondo se crean tras el fork; la precarga corre en un solo proceso a la vez
+    from app import iniciar_tareas_de_fondo
+    iniciar_tareas_de_fondo()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API Plan de Gobierno - servidor de producción")
+    parser.add_argument('--bind', default=os.getenv('API_BIND', '0.0.0.0:5050'))
+    parser.add_argument('--workers', type=int, default=_int_env('API_WORKERS', 2),
+                        help="Procesos de la API (cada uno con su pool de análisis)")
+    parser.add_argument('--threads', type=int, default=_int_env('API_THREADS', 4),
+                        help="Hilos por proceso para atender solicitudes concurrentes")
+    parser.add_argument('--timeout', type=int, default=_int_env('API_TIMEOUT', 900),
+                        help="Segundos antes de reiniciar un worker bloqueado (> ANALYSIS_DEADLINE_SECONDS)")
+    args = parser.parse_args()
+
+    print("\n" + "="*80)
+    print("🚀 SERVIDOR DE PRODUCCIÓN - PLAN DE GOBIERNO ECUADOR")
+    print("="*80)
+    print(f"   Dirección: {args.bind}")
+    print(f"   Procesos: {args.workers} | Hilos por proceso: {args.threads}")
+    print(f"   Estado compartido: {CACHE_DIR}")
+    print("="*80 + "\n")
+
+    almacen.limpiar_expirados()
+
+    ServidorAPI({
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'graceful_timeout': 30,
+        'post_fork': _post_fork,
+        'accesslog': '-',
+    }).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Worker de análisis: toma indicadores de la cola compartida (cola.py), los procesa
+con el pipeline local (scraping + Ollama de esta máquina) y escribe el resultado.
+
+    python worker.py                      # WORKER_HILOS hilos, nombre = host:pid
+    python worker.py --hilos 3 --nombre gpu-1
+
+Para repartir entre máquinas, todas (API y workers) deben apuntar al mismo
+COLA_DB en un volumen compartido (con COLA_JOURNAL=DELETE) y la API debe
+correr con ANALYSIS_MODE=cola.
+"""
+import os
+import time
+import socket
+import signal
+import argparse
+import threading
+
+# Un worker siempre atiende la cola: sus narrativas diferidas van a COLA_DB, donde
+# la API las encuentra (ver pipeline.NARRATIVAS_EN_COLA)
+os.environ['ANALYSIS_MODE'] = 'cola'
+
+from cola import cola, COLA_DB
+from deadline import Deadline
+from concurrencia import ANALYSIS_WORKERS_INICIAL
+from pipeline import procesar_indicador_compartido
+from precarga import iniciar_precarga
+
+
+def _int_env(nombre, defecto):
+    try:
+        return int(os.getenv(nombre, str(defecto)))
+    except ValueError:
+        return defecto
+
+
+# Espera entre consultas a la cola cuando está vacía
+ESPERA_COLA_VACIA = 1.0
+# Cada cuánto se eliminan las tareas terminadas viejas (cualquier worker puede hacerlo)
+INTERVALO_PURGA_SECONDS = 3600
+
+
+class Worker:
+    def __init__(self, nombre, hilos):
+        self.nombre = nombre
+        self.hilos = hilos
+        self._detener = threading.Event()
+        self._activas = {}      # tarea_id -> (dueno, deadline)
+        self._lock = threading.Lock()
+
+    def detener(self, *_):
+        print(f"\n🛑 Worker {self.nombre}: terminando las tareas en curso...")
+        self._detener.set()
+
+    def _latidos(self):
+        """
+        Renueva los leases de las tareas activas; cancela las que ya no son nuestras.
+        De paso purga las tareas terminadas hace más de COLA_RETENCION_SECONDS.
+        """
+        ultima_purga = 0.0
+        while not self._detener.wait(cola.lease / 3):
+            self._latir_activas()
+            if time.monotonic() - ultima_purga >= INTERVALO_PURGA_SECONDS:
+                ultima_purga = time.monotonic()
+                try:
+                    purgadas = cola.purgar()
+                    if purgadas:
+                        print(f"🧹 Cola: {purgadas} tareas terminadas eliminadas")
+                except Exception as e:
+                    print(f"⚠️ Error purgando la cola: {e}")
+        self._latir_activas()
+
+    def _latir_activas(self):
+        with self._lock:
+            activas = list(self._activas.items())
+        for tarea_id, (dueno, deadline) in activas:
+            try:
+                if not cola.latido(tarea_id, dueno):
+                    deadline.cancelar("tarea cancelada o reasignada")
+            except Exception as e:
+                print(f"⚠️ Error de latido en tarea {tarea_id}: {e}")
+
+    def _procesar(self, tarea, dueno):
+        carga = tarea['carga']
+        restante = tarea['vence'] - time.time() if tarea['vence'] else None
+        deadline = Deadline(restante)
+        with self._lock:
+            self._activas[tarea['id']] = (dueno, deadline)
+        try:
+            print(f"📥 {dueno}: tarea {tarea['id']} (trabajo {tarea['trabajo'][:8]}, intento {tarea['intento']})")
+            _, resultado = procesar_indicador_compartido(
+                carga['idx'], carga['total'], carga['fila'], carga['narrativa'], deadline, carga.get('costo', 0.0)
+            )
+            if not cola.completar(tarea['id'], dueno, resultado):
+                print(f"⚠️ Tarea {tarea['id']} ya no pertenece a {dueno}: resultado descartado")
+        except Exception as e:
+            print(f"❌ Tarea {tarea['id']} falló: {e}")
+            cola.fallar(tarea['id'], dueno, f"Error: {e}")
+        finally:
+            with self._lock:
+                self._activas.pop(tarea['id'], None)
+
+    def _bucle(self, numero):
+        dueno = f"{self.nombre}#{numero}"
+        while not self._detener.is_set():
+            try:
+                tarea = cola.tomar(dueno)
+            except Exception as e:
+                print(f"⚠️ {dueno}: error leyendo la cola: {e}")
+                tarea = None
+            if tarea is None:
+                self._detener.wait(ESPERA_COLA_VACIA)
+                continue
+            self._procesar(tarea, dueno)
+
+    def ejecutar(self):
+        latidos = threading.Thread(target=self._latidos, name='latidos', daemon=True)
+        latidos.start()
+        hilos = [
+            threading.Thread(target=self._bucle, args=(i,), name=f'worker-{i}')
+            for i in range(1, self.hilos + 1)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de análisis - Plan de Gobierno")
+    parser.add_argument('--hilos', type=int, default=_int_env('WORKER_HILOS', ANALYSIS_WORKERS_INICIAL),
+                        help="Indicadores en paralelo en este proceso (además acotados por el control adaptativo)")
+    parser.add_argument('--nombre', default=os.getenv('WORKER_NOMBRE', f"{socket.gethostname()}:{os.getpid()}"))
+    args = parser.parse_args()
+
+    print("\n" + "="*80)
+    print("🛠️ WORKER DE ANÁLISIS - PLAN DE GOBIERNO ECUADOR")
+    print("="*80)
+    print(f"   Nombre: {args.nombre} | Hilos: {args.hilos}")
+    print(f"   Cola: {COLA_DB} (lease {cola.lease:.0f}s, {cola.max_intentos} intentos)")
+    print("="*80 + "\n")
+
+    # Este nodo calienta su modelo y su índice local de documentos
+    iniciar_precarga()
+    worker = Worker(args.nombre, max(1, args.hilos))
+    signal.signal(signal.SIGTERM, worker.detener)
+    signal.signal(signal.SIGINT, worker.detener)
+    worker.ejecutar()
+
+
+if __name__ == '__main__':
+    main()